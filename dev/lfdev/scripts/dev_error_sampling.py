@@ -44,13 +44,7 @@ def main() -> None:
 
     n_samples = int(1e5)
 
-    m_shape = tc_array.get_measurement_shape()
-    measurements = np.zeros((n_samples,
-                             m_shape[0],
-                             m_shape[1],
-                             m_shape[2]))
-    for nn in range(n_samples):
-        measurements[nn,:,:,:] = tc_array.calc_measurements()
+    measurements = tc_array.calc_measurements_batch(n_samples)
 
     end_time = time.perf_counter()
 
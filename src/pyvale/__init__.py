@@ -11,14 +11,23 @@ from pyvale.pyvale import *
 from pyvale.imagesim import *
 
 from pyvale.physics.field import *
+from pyvale.physics.elemtypes import *
+from pyvale.physics.cellindex import *
+from pyvale.physics.fieldsampler import *
+from pyvale.physics.fieldmesh import *
+from pyvale.physics.timeinterp import *
 from pyvale.physics.scalarfield import *
 from pyvale.physics.vectorfield import *
 from pyvale.physics.tensorfield import *
+from pyvale.physics.lazyfield import *
+from pyvale.physics.exodusstream import *
 
 from pyvale.sensors.sensordescriptor import *
 from pyvale.sensors.sensortools import *
 from pyvale.sensors.sensorarrayfactory import *
+from pyvale.sensors.truthcache import *
 from pyvale.sensors.pointsensorarray import *
+from pyvale.sensors.sweepevaluator import *
 
 from pyvale.uncertainty.errorintegrator import *
 from pyvale.uncertainty.randerrors import *
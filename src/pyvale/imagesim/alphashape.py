@@ -1,9 +1,12 @@
 # Original from:
 # https://stackoverflow.com/questions/23073170/calculate-bounding-polygon-of-alpha-shape-from-the-delaunay-triangulation
 # Added conversion to shapely polygon
+# Vectorised over the triangles with edges found by sorting and counting
 
-from scipy.spatial.qhull import Delaunay
+import hashlib
+from scipy.spatial import Delaunay
 import numpy as np
+import shapely
 from shapely.ops import polygonize_full
 
 def alphashape(points, alpha, only_outer=True):
@@ -13,66 +16,88 @@ def alphashape(points, alpha, only_outer=True):
     :param alpha: alpha value.
     :param only_outer: boolean value to specify if we keep only the outer border
     or also inner edges.
-    :return: set of (i,j) pairs representing edges of the alpha-shape. (i,j) are
-    the indices in the points array.
+    :return: shapely polygon with the largest area formed by the edges of the
+    alpha-shape.
     """
     assert points.shape[0] > 3, "Need at least four points"
 
-    def add_edge(edges, i, j):
-        """
-        Add a line between the i-th and j-th points,
-        if not in the list already
-        """
-        if (i, j) in edges or (j, i) in edges:
-            # already added
-            assert (j, i) in edges, "Can't go twice over same directed edge right?"
-            if only_outer:
-                # if both neighboring triangles are in shape, it is not a boundary edge
-                edges.remove((j, i))
-            return
-        edges.add((i, j))
-
     tri = Delaunay(points)
-    edges = set()
-    # Loop over triangles:
-    # ia, ib, ic = indices of corner points of the triangle
-    for ia, ib, ic in tri.simplices:
-        pa = points[ia]
-        pb = points[ib]
-        pc = points[ic]
-        # Computing radius of triangle circumcircle
-        # www.mathalino.com/reviewer/derivation-of-formulas/derivation-of-formula-for-radius-of-circumcircle
-        a = np.sqrt((pa[0] - pb[0]) ** 2 + (pa[1] - pb[1]) ** 2)
-        b = np.sqrt((pb[0] - pc[0]) ** 2 + (pb[1] - pc[1]) ** 2)
-        c = np.sqrt((pc[0] - pa[0]) ** 2 + (pc[1] - pa[1]) ** 2)
-        s = (a + b + c) / 2.0
+    simplices = tri.simplices
+
+    # Computing radius of all triangle circumcircles at once
+    # www.mathalino.com/reviewer/derivation-of-formulas/derivation-of-formula-for-radius-of-circumcircle
+    pa = points[simplices[:,0]]
+    pb = points[simplices[:,1]]
+    pc = points[simplices[:,2]]
+    a = np.sqrt((pa[:,0] - pb[:,0]) ** 2 + (pa[:,1] - pb[:,1]) ** 2)
+    b = np.sqrt((pb[:,0] - pc[:,0]) ** 2 + (pb[:,1] - pc[:,1]) ** 2)
+    c = np.sqrt((pc[:,0] - pa[:,0]) ** 2 + (pc[:,1] - pa[:,1]) ** 2)
+    s = (a + b + c) / 2.0
+    # Degenerate triangles give an infinite or nan radius and are left out
+    with np.errstate(divide='ignore',invalid='ignore'):
         area = np.sqrt(s * (s - a) * (s - b) * (s - c))
         circum_r = a * b * c / (4.0 * area)
-        if circum_r < alpha:
-            add_edge(edges, ia, ib)
-            add_edge(edges, ib, ic)
-            add_edge(edges, ic, ia)
 
-    #return edges
+    in_shape = simplices[circum_r < alpha]
+
+    # Directed edges (ia,ib),(ib,ic),(ic,ia) of every triangle in the shape
+    edges = np.vstack((in_shape[:,(0,1)],
+                       in_shape[:,(1,2)],
+                       in_shape[:,(2,0)]))
+
+    # Edges shared by two triangles in the shape are inside it, with only_outer
+    # these are removed and every other edge is kept once
+    sorted_edges = np.sort(edges,axis=1).astype(np.int64)
+    edge_keys = sorted_edges[:,0]*points.shape[0] + sorted_edges[:,1]
+    (_,first_inds,edge_counts) = np.unique(edge_keys,
+                                           return_index=True,
+                                           return_counts=True)
+    if only_outer:
+        first_inds = first_inds[edge_counts == 1]
+    edges = edges[np.sort(first_inds)]
+
     #--------------------------------------------------------------------------
     # ADDED
-    # Create a point list of lines to turn into a polygon
-    lines = list()
-    for ii, jj in edges:
-        lines.append(
-            ((points[ii, 0],points[ii, 1]),
-             (points[jj, 0],points[jj, 1])))
+    # Create the lines to turn into a polygon
+    lines = shapely.linestrings(np.stack((points[edges[:,0],:2],
+                                          points[edges[:,1],:2]),axis=1))
 
     # Get the polygons from the line set
     [polys, dangles, cuts, invalids] = polygonize_full(lines)
 
     # Which polygon has the largest area
-    largest_area = 0.0
-    main_poly = polys.geoms[0]
-    for pp in polys.geoms:
-        if pp.area > largest_area:
-            largest_area = pp.area
-            main_poly = pp
-
-    return main_poly
+    return polys.geoms[int(np.argmax(shapely.area(polys.geoms)))]
     #--------------------------------------------------------------------------
+
+# NOTE: alpha shapes of recent meshes, a camera setup repeated on one
+# simulation reuses the shape instead of triangulating the mesh again
+_alphashape_cache = dict()
+_ALPHASHAPE_CACHE_SIZE = 8
+
+def alphashape_cached(points, alpha, only_outer=True):
+    """
+    Same as alphashape but the result is kept for the last few point sets,
+    keyed on a hash of the point coordinates, alpha and only_outer.
+    """
+    points = np.ascontiguousarray(points)
+    key = (hashlib.sha1(points.view(np.uint8)).hexdigest(),
+           points.shape,
+           points.dtype.str,
+           float(alpha),
+           bool(only_outer))
+
+    if key in _alphashape_cache:
+        # Move to the end so the least recently used shape is dropped first
+        _alphashape_cache[key] = _alphashape_cache.pop(key)
+        return _alphashape_cache[key]
+
+    a_shape = alphashape(points, alpha, only_outer)
+
+    _alphashape_cache[key] = a_shape
+    while len(_alphashape_cache) > _ALPHASHAPE_CACHE_SIZE:
+        _alphashape_cache.pop(next(iter(_alphashape_cache)))
+
+    return a_shape
+
+def clear_alphashape_cache():
+    _alphashape_cache.clear()
@@ -7,6 +7,9 @@ Copyright (C) 2024 The Computer Aided Validation Team
 ================================================================================
 '''
 import os
+from concurrent.futures import (ProcessPoolExecutor,
+                                ThreadPoolExecutor,
+                                as_completed)
 import numpy as np
 import pyvale.imagesim.textreader as tr
 
@@ -38,6 +41,15 @@ class Options:
         self.flag_load_strain_fields = False
         self.flag_load_node_force = True
 
+        # Frame files are parsed by this many workers, 'thread' or 'process'
+        self.load_workers = 1
+        self.load_backend = 'thread'
+        # Opt in to saving parsed frames as a .npz that is loaded while the
+        # text files are unchanged, in cache_path or next to the text files
+        # if cache_path is empty
+        self.flag_cache_frames = False
+        self.cache_path = ''
+
     #-------------------------------------------------------------------------
     def set_path(self,in_path):
         self.path = in_path
@@ -80,6 +92,20 @@ class Options:
                                     ('_'+tensor_str+'_'),
                                     frame)
 
+    def get_vector_frame_files(self,vector_str):
+        return self._find_frame_files(self.disp_loc,('_'+vector_str+'_'))
+
+    def get_tensor2_frame_files(self,tensor_str):
+        return self._find_frame_files(self.stress_strain_loc,
+                                      ('_'+tensor_str+'_'))
+
+    def get_vector_cache_file(self,vector_str):
+        return self._cache_file_str(self.disp_loc,('_'+vector_str+'_'))
+
+    def get_tensor2_cache_file(self,tensor_str):
+        return self._cache_file_str(self.stress_strain_loc,
+                                    ('_'+tensor_str+'_'))
+
     #-------------------------------------------------------------------------
     # Internal Methods
     def _file_str(self,in_str):
@@ -98,6 +124,39 @@ class Options:
                 + str(int(frame))
                 + self.ext)
 
+    def _cache_file_str(self,loc_str,data_str):
+        cache_path = self.cache_path if self.cache_path else self.path
+        return (cache_path
+                + loc_str
+                + data_str
+                + str(int(self.sim_num))
+                + '.npz')
+
+    def _find_frame_files(self,loc_str,data_str):
+        # One scan of the directory for all frame numbers, frames are then
+        # taken from 1 until the first missing frame
+        file_start = self._frame_file_str(loc_str,data_str,0)[:-len('0'+self.ext)]
+        dir_path = os.path.dirname(file_start)
+        name_start = os.path.basename(file_start)
+
+        found = dict()
+        with os.scandir(dir_path if dir_path else '.') as dir_entries:
+            for ee in dir_entries:
+                if (ee.name.startswith(name_start)
+                    and ee.name.endswith(self.ext)):
+                    frame_str = ee.name[len(name_start):len(ee.name)-len(self.ext)]
+                    if frame_str.isdigit() and frame_str == str(int(frame_str)):
+                        found[int(frame_str)] = (os.path.join(dir_path,ee.name)
+                                                 if dir_path else ee.name)
+
+        frame_files = []
+        ff = 1
+        while ff in found:
+            frame_files.append(found[ff])
+            ff += 1
+
+        return frame_files
+
 # End Class: Options
 #-----------------------------------------------------------------------------
 
@@ -258,7 +317,7 @@ def read_nodes(fe_opts):
     max_len = 20 # ANSYS max characters per number in node file e.g.: -0.450000000000E-001
 
     # Read the numeric data from the file into an array
-    data_array = np.array(tr.read_data_by_spec(file_path,val_spec,max_len))
+    data_array = tr.read_array_by_spec(file_path,val_spec,max_len)
 
     # Push the data columns into the struct fields
     fe_nodes.nums = data_array[:,0]
@@ -291,6 +350,119 @@ def read_elems(fe_opts):
 
     return fe_elems
 '''
+#------------------------------------------------------------------------------
+# READ ALL FRAMES OF A FIELD
+# Returns a (n_vals,n_nodes,n_frames) array so each value is a contiguous
+# (n_nodes,n_frames) block, the first value being the node numbers.
+def read_frames(fe_opts,frame_files,cache_file,val_spec,max_len):
+    n_vals = sum(val_spec)
+    file_stats = get_file_stats(frame_files)
+
+    if fe_opts.flag_cache_frames:
+        frame_data = load_frame_cache(cache_file,file_stats,val_spec,max_len)
+        if frame_data is not None:
+            return frame_data
+
+    if not frame_files:
+        return np.zeros((n_vals,0,0))
+
+    # The first frame gives the number of nodes for preallocating all frames
+    first_frame = tr.read_array_by_spec(frame_files[0],val_spec,max_len)
+    frame_data = np.zeros((n_vals,first_frame.shape[0],len(frame_files)))
+
+    def insert_frame(ff,data_array):
+        if data_array.shape[0] != frame_data.shape[1]:
+            raise ValueError(f'Frame file {frame_files[ff]} has '
+                             + f'{data_array.shape[0]} rows of data, expected '
+                             + f'{frame_data.shape[1]} from the first frame.')
+        frame_data[:,:,ff] = data_array.T
+
+    insert_frame(0,first_frame)
+
+    num_workers = min(fe_opts.load_workers,len(frame_files)-1)
+    if num_workers <= 1:
+        for ff in range(1,len(frame_files)):
+            insert_frame(ff,tr.read_array_by_spec(frame_files[ff],
+                                                  val_spec,
+                                                  max_len))
+    else:
+        if fe_opts.load_backend == 'thread':
+            executor = ThreadPoolExecutor(max_workers=num_workers)
+        elif fe_opts.load_backend == 'process':
+            executor = ProcessPoolExecutor(max_workers=num_workers)
+        else:
+            raise ValueError(f"Load backend '{fe_opts.load_backend}' is not "
+                             + "supported, use 'thread' or 'process'.")
+
+        with executor:
+            futures = {executor.submit(tr.read_array_by_spec,
+                                       frame_files[ff],
+                                       val_spec,
+                                       max_len): ff
+                       for ff in range(1,len(frame_files))}
+            for future in as_completed(futures):
+                insert_frame(futures[future],future.result())
+
+    if fe_opts.flag_cache_frames:
+        save_frame_cache(cache_file,frame_data,file_stats,val_spec,max_len)
+
+    return frame_data
+
+# Names, sizes and modification times of the frame files, the cache is only
+# used while all of these match
+def get_file_stats(frame_files):
+    names = [os.path.basename(ff) for ff in frame_files]
+    sizes = np.zeros(len(frame_files),dtype=np.int64)
+    mtimes = np.zeros(len(frame_files),dtype=np.int64)
+    for ii,ff in enumerate(frame_files):
+        file_stat = os.stat(ff)
+        sizes[ii] = file_stat.st_size
+        mtimes[ii] = file_stat.st_mtime_ns
+
+    return {'names': np.array(names,dtype=np.str_),
+            'sizes': sizes,
+            'mtimes': mtimes}
+
+def load_frame_cache(cache_file,file_stats,val_spec,max_len):
+    if not file_stats['names'].shape[0] or not os.path.exists(cache_file):
+        return None
+
+    try:
+        with np.load(cache_file) as cache:
+            if (not np.array_equal(cache['names'],file_stats['names'])
+                or not np.array_equal(cache['sizes'],file_stats['sizes'])
+                or not np.array_equal(cache['mtimes'],file_stats['mtimes'])
+                or not np.array_equal(cache['val_spec'],val_spec)
+                or int(cache['max_len']) != max_len):
+                return None
+            return cache['frame_data']
+    except (OSError,ValueError,KeyError):
+        # NOTE: a corrupt or old cache is read from the text files again
+        return None
+
+def save_frame_cache(cache_file,frame_data,file_stats,val_spec,max_len):
+    if frame_data.shape[2] == 0:
+        return
+
+    # Written to a temporary file first so an interrupted save never leaves a
+    # partial cache that looks valid
+    temp_file = cache_file + '.tmp'
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir,exist_ok=True)
+        with open(temp_file,'wb') as cache:
+            np.savez(cache,
+                     frame_data=frame_data,
+                     val_spec=np.array(val_spec),
+                     max_len=np.array(max_len),
+                     **file_stats)
+        os.replace(temp_file,cache_file)
+    except OSError:
+        # NOTE: the cache is optional so a read only data directory is fine
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
 #------------------------------------------------------------------------------
 # READ NODAL FORCE VECTOR FILE
 def read_node_force(fe_opts):
@@ -306,30 +478,20 @@ def read_node_force(fe_opts):
 
     max_len = 11 # ANSYS max characters per number in node force file e.g.: -0.2271E-10
 
-    # If the next displacement file exists we should read it in
-    ff = 1
-    file_path = fe_opts.get_vector_frame_file(vector_str,ff)
-    while os.path.exists(file_path):
-        data_array = np.array(tr.read_data_by_spec(file_path,val_spec,max_len))
+    frame_data = read_frames(fe_opts,
+                             fe_opts.get_vector_frame_files(vector_str),
+                             fe_opts.get_vector_cache_file(vector_str),
+                             val_spec,
+                             max_len)
 
-        # Node numbers don't change so grab them once
-        if ff == 1:
-            fe_vector.node_nums = data_array[:,0].transpose()
+    # Node numbers don't change so grab them from the first frame
+    if frame_data.shape[2] > 0:
+        fe_vector.node_nums = frame_data[0,:,0]
 
-        # Append all displacement components as flat arrays
-        fe_vector.x.append(data_array[:,1])
-        fe_vector.y.append(data_array[:,2])
-        if fe_opts.dims == 3:
-            fe_vector.z.append(data_array[:,3])
-
-        # Update file name for next iteration
-        ff += 1
-        file_path = fe_opts.get_vector_frame_file(vector_str,ff)
-
-    fe_vector.x = np.array(fe_vector.x).transpose()
-    fe_vector.y = np.array(fe_vector.y).transpose()
+    fe_vector.x = frame_data[1]
+    fe_vector.y = frame_data[2]
     if fe_opts.dims == 3:
-        fe_vector.z = np.array(fe_vector.z).transpose()
+        fe_vector.z = frame_data[3]
 
     fe_vector.sum_x = np.sum(fe_vector.x,axis=0)
     fe_vector.sum_y = np.sum(fe_vector.y,axis=0)
@@ -348,28 +510,19 @@ def read_vector(fe_opts,in_vector,vector_str):
     val_spec = [1]*5 # [NodeNum,Ux,Uy,Uz,Usum]
     max_len = 13 # ANSYS max characters per number in disp file e.g.: -0.47336E-006
 
-    # If the next displacement file exists we should read it in
-    ff = 1
-    file_path = fe_opts.get_vector_frame_file(vector_str,ff)
-    while os.path.exists(file_path):
-        data_array = np.array(tr.read_data_by_spec(file_path,val_spec,max_len))
-
-        # Node numbers don't change so grab them once
-        if ff == 1:
-            fe_vector.node_nums = data_array[:,0].transpose()
-
-        # Append all displacement components as flat arrays
-        fe_vector.x.append(data_array[:,1])
-        fe_vector.y.append(data_array[:,2])
-        fe_vector.z.append(data_array[:,3])
+    frame_data = read_frames(fe_opts,
+                             fe_opts.get_vector_frame_files(vector_str),
+                             fe_opts.get_vector_cache_file(vector_str),
+                             val_spec,
+                             max_len)
 
-        # Update file name for next iteration
-        ff += 1
-        file_path = fe_opts.get_vector_frame_file(vector_str,ff)
+    # Node numbers don't change so grab them from the first frame
+    if frame_data.shape[2] > 0:
+        fe_vector.node_nums = frame_data[0,:,0]
 
-    fe_vector.x = np.array(fe_vector.x).transpose()
-    fe_vector.y = np.array(fe_vector.y).transpose()
-    fe_vector.z = np.array(fe_vector.z).transpose()
+    fe_vector.x = frame_data[1]
+    fe_vector.y = frame_data[2]
+    fe_vector.z = frame_data[3]
 
     return fe_vector
 
@@ -392,34 +545,22 @@ def read_tensor2(fe_opts,in_tensor,tensor_str):
     val_spec = [1]*7 # [NodeNum,xx,yy,zz,xy,yz,xz]
     max_len = 13 # ANSYS max characters per number in tensor file e.g.: -0.32339E-006
 
-    # If the next file exists we should read it in
-    ff = 1
-    file_path = fe_opts.get_tensor2_frame_file(tensor_str,ff)
-    while os.path.exists(file_path):
-        data_array = np.array(tr.read_data_by_spec(file_path,val_spec,max_len))
-
-        # Node numbers don't change so grab them once
-        if ff == 1:
-            fe_tensor.node_nums = data_array[:,0].transpose()
-
-        # Append all displacement components as flat arrays
-        fe_tensor.xx.append(data_array[:,1])
-        fe_tensor.yy.append(data_array[:,2])
-        fe_tensor.zz.append(data_array[:,3])
-        fe_tensor.xy.append(data_array[:,4])
-        fe_tensor.yz.append(data_array[:,5])
-        fe_tensor.xz.append(data_array[:,6])
-
-        # Update file name for next iteration
-        ff += 1
-        file_path = fe_opts.get_tensor2_frame_file(tensor_str,ff)
-
-    fe_tensor.xx = np.array(fe_tensor.xx).transpose()
-    fe_tensor.yy = np.array(fe_tensor.yy).transpose()
-    fe_tensor.zz = np.array(fe_tensor.zz).transpose()
-    fe_tensor.xy = np.array(fe_tensor.xy).transpose()
-    fe_tensor.yz = np.array(fe_tensor.yz).transpose()
-    fe_tensor.xz = np.array(fe_tensor.xz).transpose()
+    frame_data = read_frames(fe_opts,
+                             fe_opts.get_tensor2_frame_files(tensor_str),
+                             fe_opts.get_tensor2_cache_file(tensor_str),
+                             val_spec,
+                             max_len)
+
+    # Node numbers don't change so grab them from the first frame
+    if frame_data.shape[2] > 0:
+        fe_tensor.node_nums = frame_data[0,:,0]
+
+    fe_tensor.xx = frame_data[1]
+    fe_tensor.yy = frame_data[2]
+    fe_tensor.zz = frame_data[3]
+    fe_tensor.xy = frame_data[4]
+    fe_tensor.yz = frame_data[5]
+    fe_tensor.xz = frame_data[6]
 
     return fe_tensor
 
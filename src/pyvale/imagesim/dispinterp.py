@@ -0,0 +1,477 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import numpy as np
+import matplotlib.tri as mtri
+from scipy.spatial import Delaunay, cKDTree
+
+(XI,YI) = (0,1)
+
+
+class TriDispInterp:
+    """Linear interpolation of nodal displacements onto the subpixel grid
+    using a single triangulation of the deformed nodes per frame. Both
+    displacement components share the point location and are evaluated from
+    the affine coefficients of each triangle.
+
+    The triangles are either the Delaunay triangulation of the deformed nodes,
+    matching scipy griddata, or the triangulated FE mesh connectivity. With
+    reuse_tri the triangles and point location are kept between frames. Each
+    subpixel stores a lower bound on its distance to the edges of its triangle
+    (or to the mesh boundary if it is outside) which is reduced by the largest
+    node movement every frame. Only subpixels with no margin left are located
+    again, which suits small strain cases. The FE mesh triangles are always
+    reused.
+    """
+    def __init__(self,
+                 subpx_grid_xm: np.ndarray,
+                 subpx_grid_ym: np.ndarray,
+                 triangles: np.ndarray | None = None,
+                 rescale: bool = True,
+                 reuse_tri: bool = False,
+                 max_relocate: float = 0.25) -> None:
+
+        self._subpx_shape = subpx_grid_xm.shape
+        self._subpx_x = subpx_grid_xm.ravel()
+        self._subpx_y = subpx_grid_ym.ravel()
+
+        self._mesh_tris = triangles
+        self._rescale = rescale
+        self._reuse_tri = reuse_tri or (triangles is not None)
+        self._max_relocate = max_relocate
+
+        # NOTE: margins are capped at this distance so subpixels far outside the
+        # mesh do not need an exact boundary distance
+        subpx_step = np.max(np.abs(np.diff(subpx_grid_xm[0,:2])))
+        self._margin_cap = 16*subpx_step
+
+        self._tris = None
+        self._tri_signs = None
+        self._ref_nodes = None
+        self._subpx_tri = None
+        self._subpx_margin = None
+        self._in_inds = None
+        self._in_coords = None
+
+    def interp_disp(self,
+                    def_nodes: np.ndarray,
+                    disp: np.ndarray) -> tuple[np.ndarray,np.ndarray]:
+        # NOTE: def_nodes are the (n_nodes,2) deformed nodal coords in the
+        # camera frame, subpixels outside the triangulation are set to nan
+        if self._tris is None or not self._reuse_tri:
+            self._locate_all(def_nodes)
+        else:
+            self._update_location(def_nodes)
+
+        in_tris = self._subpx_tri[self._in_inds] # type: ignore
+        (in_x,in_y) = self._in_coords # type: ignore
+
+        subpx_disp = list()
+        for cc in (XI,YI):
+            coeffs = calc_tri_affine_coeffs(def_nodes,
+                                            self._tris, # type: ignore
+                                            disp[:,cc])
+            comp_disp = np.full(self._subpx_x.shape[0],np.nan)
+            comp_disp[self._in_inds] = (coeffs[in_tris,0]
+                                        + coeffs[in_tris,1]*in_x
+                                        + coeffs[in_tris,2]*in_y)
+            subpx_disp.append(comp_disp.reshape(self._subpx_shape))
+
+        return (subpx_disp[XI],subpx_disp[YI])
+
+    def _locate_all(self, def_nodes: np.ndarray) -> None:
+        if self._mesh_tris is not None:
+            self._tris = self._mesh_tris
+            tri_finder = mtri.Triangulation(def_nodes[:,XI],
+                                            def_nodes[:,YI],
+                                            self._tris).get_trifinder()
+            self._subpx_tri = tri_finder(self._subpx_x,self._subpx_y)
+        else:
+            # NOTE: same scaling of the points as griddata with rescale=True
+            (offset,scale) = (np.zeros(2),np.ones(2))
+            if self._rescale:
+                offset = np.mean(def_nodes,axis=0)
+                scale = np.ptp(def_nodes,axis=0)
+                scale[scale == 0.0] = 1.0
+
+            delaunay = Delaunay((def_nodes - offset)/scale)
+            self._tris = delaunay.simplices
+            subpx = np.column_stack(((self._subpx_x - offset[XI])/scale[XI],
+                                     (self._subpx_y - offset[YI])/scale[YI]))
+            self._subpx_tri = delaunay.find_simplex(subpx)
+
+        self._set_in_inds()
+
+        if self._reuse_tri:
+            self._ref_nodes = np.copy(def_nodes)
+            self._tri_signs = np.sign(calc_tri_areas(def_nodes,self._tris))
+            self._subpx_margin = self._calc_margins(
+                def_nodes,np.arange(self._subpx_x.shape[0]))
+
+    def _update_location(self, def_nodes: np.ndarray) -> None:
+        node_move = np.max(np.linalg.norm(def_nodes - self._ref_nodes,axis=1))
+        if node_move == 0.0:
+            return
+
+        # Inverted triangles mean the mesh has folded so start again
+        tri_signs = np.sign(calc_tri_areas(def_nodes,self._tris)) # type: ignore
+        if np.any(tri_signs != self._tri_signs):
+            self._locate_all(def_nodes)
+            return
+
+        # A subpixel further from its triangle edges (or the mesh boundary)
+        # than the largest node movement cannot have changed triangle, so the
+        # margins shrink by the movement and only those used up are located
+        self._subpx_margin -= node_move # type: ignore
+        relocate = np.flatnonzero(self._subpx_margin <= 0.0) # type: ignore
+        self._ref_nodes = np.copy(def_nodes)
+        if relocate.shape[0] == 0:
+            return
+        if relocate.shape[0] > self._max_relocate*self._subpx_x.shape[0]:
+            self._locate_all(def_nodes)
+            return
+
+        try:
+            tri_finder = mtri.Triangulation(def_nodes[:,XI],
+                                            def_nodes[:,YI],
+                                            self._tris).get_trifinder()
+        except (RuntimeError,ValueError):
+            self._locate_all(def_nodes)
+            return
+
+        self._subpx_tri[relocate] = tri_finder(self._subpx_x[relocate], # type: ignore
+                                               self._subpx_y[relocate])
+        self._set_in_inds()
+        self._subpx_margin[relocate] = self._calc_margins(def_nodes,relocate) # type: ignore
+
+    def _set_in_inds(self) -> None:
+        self._in_inds = np.flatnonzero(self._subpx_tri >= 0) # type: ignore
+        self._in_coords = (self._subpx_x[self._in_inds],
+                           self._subpx_y[self._in_inds])
+
+    def _calc_margins(self,
+                      def_nodes: np.ndarray,
+                      subpx_inds: np.ndarray) -> np.ndarray:
+        margins = np.full(subpx_inds.shape[0],self._margin_cap,
+                          dtype=np.float32)
+        subpx_tri = self._subpx_tri[subpx_inds] # type: ignore
+        in_tri = subpx_tri >= 0
+
+        # Inside: distance to the closest edge of the containing triangle, the
+        # edge distances are affine in x,y so they are evaluated from per
+        # triangle coefficients in chunks to bound the temporary memory
+        edge_coeffs = calc_tri_edge_dist_coeffs(def_nodes,self._tris) # type: ignore
+        in_inds = subpx_inds[in_tri]
+        in_tris = subpx_tri[in_tri]
+        in_margins = np.empty(in_inds.shape[0],dtype=np.float32)
+        chunk = 2**20
+        for cc in range(0,in_inds.shape[0],chunk):
+            tri_chunk = in_tris[cc:cc+chunk]
+            x_chunk = self._subpx_x[in_inds[cc:cc+chunk]]
+            y_chunk = self._subpx_y[in_inds[cc:cc+chunk]]
+            in_margins[cc:cc+chunk] = np.minimum.reduce(
+                [edge_coeffs[tri_chunk,ee,0]
+                 + edge_coeffs[tri_chunk,ee,1]*x_chunk
+                 + edge_coeffs[tri_chunk,ee,2]*y_chunk for ee in range(3)])
+
+        margins[in_tri] = in_margins
+
+        # Outside: distance to the closest boundary edge midpoint less half
+        # the longest boundary edge is a lower bound on the boundary distance
+        out_inds = subpx_inds[~in_tri]
+        if out_inds.shape[0] > 0:
+            bound_edges = find_boundary_edges(self._tris) # type: ignore
+            edge_mids = 0.5*(def_nodes[bound_edges[:,0],:]
+                             + def_nodes[bound_edges[:,1],:])
+            half_edge = 0.5*np.max(np.linalg.norm(
+                def_nodes[bound_edges[:,1],:] - def_nodes[bound_edges[:,0],:],
+                axis=1))
+
+            (mid_dist,_) = cKDTree(edge_mids).query(
+                np.column_stack((self._subpx_x[out_inds],
+                                 self._subpx_y[out_inds])),
+                distance_upper_bound=self._margin_cap+half_edge)
+            margins[~in_tri] = np.minimum(mid_dist - half_edge,
+                                          self._margin_cap)
+
+        return margins
+
+
+class MeshRasterDispInterp:
+    """Rasterises each FE element of the deformed mesh directly onto the
+    subpixel grid. The subpixels in the bounding box of each element are
+    tested and the displacements are evaluated with the element shape
+    functions, linear for triangles and bilinear for quads (corner nodes only
+    for higher order elements). No Delaunay triangulation is needed so there
+    is no interpolation across holes and notches, and the cost scales with the
+    number of subpixels covered by the mesh.
+    """
+    def __init__(self,
+                 subpx_grid_xm: np.ndarray,
+                 subpx_grid_ym: np.ndarray,
+                 connect: dict[str,np.ndarray],
+                 chunk_subpx: int = 2**21) -> None:
+
+        self._subpx_shape = subpx_grid_xm.shape
+        # NOTE: the subpixel grid is regular with Y decreasing down the rows
+        self._x_start = subpx_grid_xm[0,0]
+        self._y_start = subpx_grid_ym[0,0]
+        self._subpx_step = np.array((subpx_grid_xm[0,1] - subpx_grid_xm[0,0],
+                                     subpx_grid_ym[0,0] - subpx_grid_ym[1,0]))
+
+        self._elems = conv_connect_to_elems(connect)
+        self._chunk_subpx = chunk_subpx
+
+    def interp_disp(self,
+                    def_nodes: np.ndarray,
+                    disp: np.ndarray) -> tuple[np.ndarray,np.ndarray]:
+        # NOTE: def_nodes are the (n_nodes,2) deformed nodal coords in the
+        # camera frame, subpixels outside the mesh are set to nan
+        subpx_disp_x = np.full(self._subpx_shape,np.nan)
+        subpx_disp_y = np.full(self._subpx_shape,np.nan)
+
+        for elems in self._elems.values():
+            for (chunk_elems,elem_inds,rows,cols) in self._iter_bbox_subpx(
+                                                            def_nodes,elems):
+                x = self._x_start + cols*self._subpx_step[XI]
+                y = self._y_start - rows*self._subpx_step[YI]
+
+                if elems.shape[1] == 3:
+                    (inside,vals) = raster_tris(def_nodes,disp,chunk_elems,
+                                                elem_inds,x,y)
+                else:
+                    (inside,vals) = raster_quads(def_nodes,disp,chunk_elems,
+                                                 elem_inds,x,y)
+
+                subpx_disp_x[rows[inside],cols[inside]] = vals[inside,XI]
+                subpx_disp_y[rows[inside],cols[inside]] = vals[inside,YI]
+
+        return (subpx_disp_x,subpx_disp_y)
+
+    def _iter_bbox_subpx(self, def_nodes: np.ndarray, elems: np.ndarray):
+        # Subpixel index ranges covered by the bounding box of each element
+        # NOTE: the tolerance keeps subpixels lying on an element edge in the
+        # bounding box, the inside tests decide which element they belong to
+        tol = 1e-6
+        elem_nodes = def_nodes[elems]
+        col_lo = np.ceil((np.min(elem_nodes[:,:,XI],axis=1) - self._x_start)
+                         / self._subpx_step[XI] - tol).astype(np.int64)
+        col_hi = np.floor((np.max(elem_nodes[:,:,XI],axis=1) - self._x_start)
+                          / self._subpx_step[XI] + tol).astype(np.int64)
+        row_lo = np.ceil((self._y_start - np.max(elem_nodes[:,:,YI],axis=1))
+                         / self._subpx_step[YI] - tol).astype(np.int64)
+        row_hi = np.floor((self._y_start - np.min(elem_nodes[:,:,YI],axis=1))
+                          / self._subpx_step[YI] + tol).astype(np.int64)
+
+        col_lo = np.maximum(col_lo,0)
+        col_hi = np.minimum(col_hi,self._subpx_shape[1]-1)
+        row_lo = np.maximum(row_lo,0)
+        row_hi = np.minimum(row_hi,self._subpx_shape[0]-1)
+
+        n_cols = np.maximum(col_hi - col_lo + 1,0)
+        n_rows = np.maximum(row_hi - row_lo + 1,0)
+        n_subpx = n_cols*n_rows
+
+        # Group elements so each chunk tests a bounded number of subpixels
+        subpx_cum = np.cumsum(n_subpx)
+        chunk_ids = subpx_cum // self._chunk_subpx
+        chunk_bounds = np.flatnonzero(np.diff(chunk_ids)) + 1
+        for elem_chunk in np.split(np.arange(elems.shape[0]),chunk_bounds):
+            counts = n_subpx[elem_chunk]
+            n_tot = np.sum(counts)
+            if n_tot == 0:
+                continue
+
+            # NOTE: elem_inds index into the elements of this chunk
+            elem_inds = np.repeat(np.arange(elem_chunk.shape[0]),counts)
+            starts = np.cumsum(counts) - counts
+            local = np.arange(n_tot) - np.repeat(starts,counts)
+            glob_inds = elem_chunk[elem_inds]
+            widths = n_cols[glob_inds]
+            rows = row_lo[glob_inds] + local // widths
+            cols = col_lo[glob_inds] + local % widths
+            yield (elems[elem_chunk],elem_inds,rows,cols)
+
+
+def calc_tri_areas(nodes: np.ndarray, tris: np.ndarray) -> np.ndarray:
+    v1 = nodes[tris[:,1],:] - nodes[tris[:,0],:]
+    v2 = nodes[tris[:,2],:] - nodes[tris[:,0],:]
+    return 0.5*(v1[:,XI]*v2[:,YI] - v2[:,XI]*v1[:,YI])
+
+
+def calc_tri_affine_coeffs(nodes: np.ndarray,
+                           tris: np.ndarray,
+                           node_vals: np.ndarray) -> np.ndarray:
+    # NOTE: returns (n_tris,3) coeffs (c,a_x,a_y) so inside each triangle the
+    # linear interpolant is c + a_x*x + a_y*y
+    x0 = nodes[tris[:,0],:]
+    v1 = nodes[tris[:,1],:] - x0
+    v2 = nodes[tris[:,2],:] - x0
+    du1 = node_vals[tris[:,1]] - node_vals[tris[:,0]]
+    du2 = node_vals[tris[:,2]] - node_vals[tris[:,0]]
+
+    det = v1[:,XI]*v2[:,YI] - v2[:,XI]*v1[:,YI]
+    det[det == 0.0] = np.inf # degenerate triangles contain no subpixels
+
+    a_x = (du1*v2[:,YI] - du2*v1[:,YI]) / det
+    a_y = (du2*v1[:,XI] - du1*v2[:,XI]) / det
+    c = node_vals[tris[:,0]] - a_x*x0[:,XI] - a_y*x0[:,YI]
+    return np.column_stack((c,a_x,a_y))
+
+
+def calc_tri_edge_dist_coeffs(nodes: np.ndarray,
+                              tris: np.ndarray) -> np.ndarray:
+    # NOTE: returns (n_tris,3,3) coeffs (c,a_x,a_y) for each edge so the
+    # distance of a point inside the triangle to the edge is c + a_x*x + a_y*y
+    tri_signs = np.sign(calc_tri_areas(nodes,tris))
+    tri_signs[tri_signs == 0.0] = 1.0
+
+    coeffs = np.empty((tris.shape[0],3,3))
+    for ee,(n0,n1) in enumerate(((1,2),(2,0),(0,1))):
+        x0 = nodes[tris[:,n0],:]
+        edge = nodes[tris[:,n1],:] - x0
+        edge_len = np.sqrt(edge[:,XI]**2 + edge[:,YI]**2)
+        edge_len[edge_len == 0.0] = np.inf
+        scale = tri_signs/edge_len
+
+        coeffs[:,ee,0] = scale*(edge[:,YI]*x0[:,XI] - edge[:,XI]*x0[:,YI])
+        coeffs[:,ee,1] = -scale*edge[:,YI]
+        coeffs[:,ee,2] = scale*edge[:,XI]
+
+    return coeffs
+
+
+def find_boundary_edges(tris: np.ndarray) -> np.ndarray:
+    # Boundary edges belong to only one triangle
+    edges = np.vstack((tris[:,(0,1)],tris[:,(1,2)],tris[:,(2,0)]))
+    edges = np.sort(edges,axis=1)
+    (uniq_edges,edge_counts) = np.unique(edges,axis=0,return_counts=True)
+    return uniq_edges[edge_counts == 1]
+
+
+def raster_tris(nodes: np.ndarray,
+                node_vals: np.ndarray,
+                tris: np.ndarray,
+                tri_inds: np.ndarray,
+                x: np.ndarray,
+                y: np.ndarray) -> tuple[np.ndarray,np.ndarray]:
+    # NOTE: tri_inds gives the triangle tested for each point, returns the
+    # inside mask and (n_points,2) interpolated values
+    edge_coeffs = calc_tri_edge_dist_coeffs(nodes,tris)[tri_inds]
+    edge_tol = -1e-9*np.sqrt(np.abs(calc_tri_areas(nodes,tris)))[tri_inds]
+    inside = np.ones(x.shape[0],dtype=bool)
+    for ee in range(3):
+        inside &= (edge_coeffs[:,ee,0] + edge_coeffs[:,ee,1]*x
+                   + edge_coeffs[:,ee,2]*y) >= edge_tol
+
+    vals = np.empty((x.shape[0],2))
+    for cc in (XI,YI):
+        coeffs = calc_tri_affine_coeffs(nodes,tris,node_vals[:,cc])[tri_inds]
+        vals[:,cc] = coeffs[:,0] + coeffs[:,1]*x + coeffs[:,2]*y
+
+    return (inside,vals)
+
+
+def raster_quads(nodes: np.ndarray,
+                 node_vals: np.ndarray,
+                 quads: np.ndarray,
+                 quad_inds: np.ndarray,
+                 x: np.ndarray,
+                 y: np.ndarray,
+                 max_iters: int = 10) -> tuple[np.ndarray,np.ndarray]:
+    # NOTE: quad_inds gives the quad tested for each point, the bilinear map
+    # x = a0 + a1*xi + a2*eta + a3*xi*eta is inverted with Newton iterations
+    geom = calc_bilinear_coeffs(nodes[quads])
+    (a0_x,a1_x,a2_x,a3_x) = geom[:,:,XI][:,quad_inds]
+    (a0_y,a1_y,a2_y,a3_y) = geom[:,:,YI][:,quad_inds]
+    a0_x = a0_x - x
+    a0_y = a0_y - y
+
+    (xi,eta) = (np.zeros(x.shape[0]),np.zeros(x.shape[0]))
+    for _ in range(max_iters):
+        j_11 = a1_x + a3_x*eta
+        j_12 = a2_x + a3_x*xi
+        j_21 = a1_y + a3_y*eta
+        j_22 = a2_y + a3_y*xi
+        res_x = a0_x + j_11*xi + a2_x*eta
+        res_y = a0_y + j_21*xi + a2_y*eta
+        det = j_11*j_22 - j_12*j_21
+        det[det == 0.0] = np.inf
+
+        d_xi = (j_22*res_x - j_12*res_y) / det
+        d_eta = (j_11*res_y - j_21*res_x) / det
+        xi -= d_xi
+        eta -= d_eta
+
+        if max(np.max(np.abs(d_xi)),np.max(np.abs(d_eta))) < 1e-12:
+            break
+
+    inside = (np.abs(xi) <= 1.0 + 1e-9) & (np.abs(eta) <= 1.0 + 1e-9)
+
+    vals = calc_bilinear_coeffs(node_vals[quads])[:,quad_inds]
+    vals = vals[0] + vals[1]*xi[:,np.newaxis] + vals[2]*eta[:,np.newaxis] \
+           + vals[3]*(xi*eta)[:,np.newaxis]
+    return (inside,vals)
+
+
+def calc_bilinear_coeffs(quad_vals: np.ndarray) -> np.ndarray:
+    # NOTE: quad_vals is (n_quads,4,n_comps) with the nodes in counter
+    # clockwise order from (-1,-1), returns (4,n_quads,n_comps)
+    (v0,v1,v2,v3) = (quad_vals[:,0],quad_vals[:,1],quad_vals[:,2],quad_vals[:,3])
+    return 0.25*np.array((v0 + v1 + v2 + v3,
+                          -v0 + v1 + v2 - v3,
+                          -v0 - v1 + v2 + v3,
+                          v0 - v1 + v2 - v3))
+
+
+def conv_connect_to_elems(connect: dict[str,np.ndarray]
+                          ) -> dict[int,np.ndarray]:
+    # NOTE: returns zero based (n_elems,n_corners) arrays of triangles (3) and
+    # quads (4) using only the corner nodes of higher order elements
+    elems = {3: list(), 4: list()}
+    for cc in connect:
+        block_connect = connect[cc].T - 1
+        if block_connect.shape[1] in (4,8,9):
+            elems[4].append(block_connect[:,:4])
+        elif block_connect.shape[1] in (3,6,7):
+            elems[3].append(block_connect[:,:3])
+        else:
+            raise ValueError('Converting the connectivity only supports 2D '+
+                             'triangle and quad elements, got '+
+                             f'{block_connect.shape[1]} nodes per element.')
+
+    return {kk: np.vstack(vv) for kk,vv in elems.items() if len(vv) > 0}
+
+
+def conv_connect_to_tris(connect: dict[str,np.ndarray]) -> np.ndarray:
+    # Quads are split into 2 triangles
+    elems = conv_connect_to_elems(connect)
+    tris = list()
+    if 3 in elems:
+        tris.append(elems[3])
+    if 4 in elems:
+        tris.append(elems[4][:,(0,1,2)])
+        tris.append(elems[4][:,(0,2,3)])
+
+    return np.vstack(tris)
+
+
+def crop_connect_to_box(connect: dict[str,np.ndarray],
+                        nodes: np.ndarray,
+                        box_min: np.ndarray,
+                        box_max: np.ndarray) -> dict[str,np.ndarray]:
+    # Keeps the elements with a bounding box overlapping the box, connectivity
+    # blocks with no elements left are dropped
+    cropped = dict()
+    for cc in connect:
+        elem_nodes = nodes[connect[cc]-1]
+        overlap = (np.all(np.min(elem_nodes,axis=0) <= box_max,axis=1)
+                   & np.all(np.max(elem_nodes,axis=0) >= box_min,axis=1))
+        if np.any(overlap):
+            cropped[cc] = connect[cc][:,overlap]
+
+    return cropped
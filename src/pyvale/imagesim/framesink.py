@@ -0,0 +1,284 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from abc import ABC, abstractmethod
+from pathlib import Path
+import queue
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+class IFrameSink(ABC):
+    """Destination for deformed images. Frames are given ready to save, in
+    image coords with Y down and the integer type of the camera bit depth.
+    Frames deformed in parallel can be written out of order. Closing with
+    aborted=True releases the sink after a failure without raising its own
+    errors, e.g. for frames that were never written.
+    """
+    @abstractmethod
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        pass
+
+    @abstractmethod
+    def write(self, frame: int, image: np.ndarray) -> None:
+        pass
+
+    @abstractmethod
+    def close(self, aborted: bool = False) -> None:
+        pass
+
+
+class TiffFrameSink(IFrameSink):
+    """One TIFF file per frame, named with the save tag and frame number."""
+    def __init__(self, save_path: Path, save_tag: str = 'defimage') -> None:
+        self._save_path = save_path
+        self._save_tag = save_tag
+
+    def get_frame_file(self, frame: int) -> Path:
+        return self._save_path / f'{self._save_tag}_{str(frame).zfill(4)}.tiff'
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        self._save_path.mkdir(parents=True,exist_ok=True)
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        Image.fromarray(image).save(self.get_frame_file(frame))
+
+    def close(self, aborted: bool = False) -> None:
+        pass
+
+
+class MultiTiffFrameSink(IFrameSink):
+    """All frames as the pages of one BigTIFF file, read back as a single
+    (n_frames,n_rows,n_cols) series, optionally with lossless zlib
+    compression. tifffile only writes a compressed series from an iterator of
+    pages so the pages are passed to a writer thread in frame order, frames
+    arriving early are held until the frames before them are written.
+    Requires the tifffile package.
+    """
+    def __init__(self,
+                 save_file: Path,
+                 compress: bool = False,
+                 bigtiff: bool = True) -> None:
+        self._save_file = save_file
+        self._compress = compress
+        self._bigtiff = bigtiff
+        self._num_frames = 0
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._aborted = False
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        import tifffile
+
+        self._save_file.parent.mkdir(parents=True,exist_ok=True)
+        self._num_frames = num_frames
+        self._queue = queue.Queue()
+        self._error = None
+        self._aborted = False
+
+        def write_pages() -> None:
+            try:
+                with tifffile.TiffWriter(self._save_file,
+                                         bigtiff=self._bigtiff) as writer:
+                    writer.write(self._iter_pages(),
+                                 shape=(num_frames,*frame_shape),
+                                 dtype=dtype,
+                                 photometric='minisblack',
+                                 compression='zlib' if self._compress else None)
+            except Exception as err:
+                self._error = err
+
+        self._thread = threading.Thread(target=write_pages,daemon=True)
+        self._thread.start()
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame,image)) # type: ignore
+
+    def close(self, aborted: bool = False) -> None:
+        # NOTE: the writer thread is always joined so the file is closed, if
+        # aborted the file is left incomplete and no error is raised
+        self._aborted = aborted
+        if self._thread is not None:
+            self._queue.put(None) # type: ignore
+            self._thread.join()
+            self._thread = None
+
+        if self._error is not None and not aborted:
+            raise self._error
+
+    def _iter_pages(self):
+        held_frames = dict()
+        for ff in range(self._num_frames):
+            while ff not in held_frames:
+                item = self._queue.get() # type: ignore
+                if item is None and self._aborted:
+                    return
+                if item is None:
+                    raise ValueError("Multi-page TIFF closed before frame "+
+                                     f"{ff} of {self._num_frames} was written.")
+                held_frames[item[0]] = item[1]
+
+            yield held_frames.pop(ff)
+
+
+class HDF5FrameSink(IFrameSink):
+    """All frames in one (n_frames,n_rows,n_cols) HDF5 dataset, chunked by
+    frame with optional lossless gzip compression. Requires the h5py package.
+    """
+    def __init__(self,
+                 save_file: Path,
+                 dataset: str = 'images',
+                 compress: bool = False,
+                 chunk_frames: int = 1) -> None:
+        self._save_file = save_file
+        self._dataset_key = dataset
+        self._compress = compress
+        self._chunk_frames = chunk_frames
+        self._file = None
+        self._dataset = None
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        import h5py
+
+        self._save_file.parent.mkdir(parents=True,exist_ok=True)
+        self._file = h5py.File(self._save_file,'w')
+        self._dataset = self._file.create_dataset(
+            self._dataset_key,
+            shape=(num_frames,*frame_shape),
+            dtype=dtype,
+            chunks=(min(self._chunk_frames,max(num_frames,1)),*frame_shape),
+            compression='gzip' if self._compress else None)
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        self._dataset[frame,:,:] = image # type: ignore
+
+    def close(self, aborted: bool = False) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ZarrFrameSink(IFrameSink):
+    """All frames in one (n_frames,n_rows,n_cols) zarr array chunked by frame,
+    compressed with the zarr default compressor. Requires the zarr package.
+    """
+    def __init__(self, save_path: Path, chunk_frames: int = 1) -> None:
+        self._save_path = save_path
+        self._chunk_frames = chunk_frames
+        self._array = None
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        import zarr
+
+        self._array = zarr.open_array(
+            store=str(self._save_path),
+            mode='w',
+            shape=(num_frames,*frame_shape),
+            chunks=(min(self._chunk_frames,max(num_frames,1)),*frame_shape),
+            dtype=dtype)
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        self._array[frame,:,:] = image # type: ignore
+
+    def close(self, aborted: bool = False) -> None:
+        self._array = None
+
+
+class MemoryFrameSink(IFrameSink):
+    """Keeps all frames in a (n_frames,n_rows,n_cols) array so they can be
+    passed straight to DIC without going through files.
+    """
+    def __init__(self) -> None:
+        self._frames = None
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        self._frames = np.zeros((num_frames,*frame_shape),dtype=dtype)
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        self._frames[frame,:,:] = image # type: ignore
+
+    def close(self, aborted: bool = False) -> None:
+        pass
+
+    def get_frames(self) -> np.ndarray | None:
+        return self._frames
+
+
+class BackgroundFrameWriter(IFrameSink):
+    """Writes frames to another sink on a background thread so deforming the
+    next frame overlaps with writing the last one. At most max_queued frames
+    wait to be written, errors in the writer are raised on the next write or
+    on close.
+    """
+    def __init__(self, sink: IFrameSink, max_queued: int = 4) -> None:
+        self._sink = sink
+        self._max_queued = max_queued
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+    def open(self,
+             num_frames: int,
+             frame_shape: tuple[int,int],
+             dtype: np.dtype) -> None:
+        self._sink.open(num_frames,frame_shape,dtype)
+        self._error = None
+        self._queue = queue.Queue(maxsize=max(self._max_queued,1))
+        self._thread = threading.Thread(target=self._write_queued,daemon=True)
+        self._thread.start()
+
+    def write(self, frame: int, image: np.ndarray) -> None:
+        self._raise_error()
+        self._queue.put((frame,image)) # type: ignore
+
+    def close(self, aborted: bool = False) -> None:
+        if self._thread is not None:
+            self._queue.put(None) # type: ignore
+            self._thread.join()
+            self._thread = None
+
+        self._sink.close(aborted)
+        if not aborted:
+            self._raise_error()
+
+    def _write_queued(self) -> None:
+        while True:
+            item = self._queue.get() # type: ignore
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    self._sink.write(*item)
+                except Exception as err:
+                    self._error = err
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
@@ -8,20 +8,42 @@ Copyright (C) 2024 The Computer Aided Validation Team
 
 import time
 import warnings
+from dataclasses import replace
 from pathlib import Path
+from concurrent.futures import (ProcessPoolExecutor,
+                                ThreadPoolExecutor,
+                                as_completed)
+from multiprocessing import shared_memory
 
 import numpy as np
-from shapely.geometry import Point
-from scipy.signal import convolve2d
+import shapely
+import shapely.affinity
 from scipy.interpolate import griddata
-from scipy.interpolate import interp2d
+from scipy.interpolate import RectBivariateSpline
+from scipy.interpolate import (LinearNDInterpolator,
+                               NearestNDInterpolator,
+                               CloughTocher2DInterpolator)
 from scipy import ndimage
 import matplotlib.image as mplim
+import matplotlib.tri as mtri
 from PIL import Image
 
 from pyvale.imagesim.imagedefopts import ImageDefOpts
 from pyvale.imagesim.cameradata import CameraData
-from pyvale.imagesim.alphashape import alphashape
+from pyvale.imagesim.alphashape import alphashape_cached
+from pyvale.imagesim.framesink import (IFrameSink,
+                                       TiffFrameSink,
+                                       MultiTiffFrameSink,
+                                       HDF5FrameSink,
+                                       ZarrFrameSink,
+                                       BackgroundFrameWriter)
+from pyvale.imagesim.splinecoeffs import (SplineCoeffs,
+                                          calc_spline_coeffs,
+                                          map_coords_spline)
+from pyvale.imagesim.dispinterp import (TriDispInterp,
+                                        MeshRasterDispInterp,
+                                        conv_connect_to_tris,
+                                        crop_connect_to_box)
 
 (XI,YI) = (0,1)
 
@@ -41,15 +63,19 @@ def save_image(save_file: Path,
                image: np.ndarray,
                n_bits: int = 16) -> None:
 
-    # Need to flip image so coords are top left with Y down
-    image = image[::-1,:]
+    im = Image.fromarray(conv_image_to_save(image,n_bits))
+    im.save(save_file)
+
 
+def get_save_dtype(n_bits: int) -> type:
     if n_bits > 8:
-        im = Image.fromarray(image.astype(np.uint16))
-    else:
-        im = Image.fromarray(image.astype(np.uint8))
+        return np.uint16
+    return np.uint8
 
-    im.save(save_file)
+
+def conv_image_to_save(image: np.ndarray, n_bits: int = 16) -> np.ndarray:
+    # Need to flip image so coords are top left with Y down
+    return image[::-1,:].astype(get_save_dtype(n_bits))
 
 
 def get_pixel_vec_in_m(camera: CameraData) -> tuple[np.ndarray,np.ndarray]:
@@ -197,7 +223,8 @@ def rectangle_crop_image(camera: CameraData,
 
 def get_im_mask_from_sim(camera: CameraData,
                             image: np.ndarray,
-                            nodes: np.ndarray
+                            nodes: np.ndarray,
+                            connect: dict[str,np.ndarray] | None = None
                             ) -> tuple[np.ndarray,np.ndarray]:
 
     # Create a mesh of pixel centroid locations
@@ -207,32 +234,31 @@ def get_im_mask_from_sim(camera: CameraData,
     points = np.array((nodes[:,XI]+camera.roi_loc[XI],
                        nodes[:,YI]+camera.roi_loc[YI])).T
 
-    # Calculate the element edge length to use as the alpha radius
-    elem_edge = 2*np.max(np.diff(np.sort(nodes[:,XI])))
-    alpha = elem_edge
-
-    # Find the alpha shape based on the list of nodal points
-    # Returns a shapely polygon - use 'within' to find points inside
-    a_shape = alphashape(points, alpha, only_outer=True)
-
-    # Create an array of nans to fill as the specimen image
-    masked_im = np.empty(image.shape)
-    masked_im[:] = np.nan
-    im_mask = np.zeros([camera.num_px[YI],camera.num_px[XI]])
+    if connect is None:
+        # Calculate the element edge length to use as the alpha radius
+        elem_edge = 2*np.max(np.diff(np.sort(nodes[:,XI])))
+        alpha = elem_edge
+
+        # Find the alpha shape based on the list of nodal points
+        # Returns a shapely polygon - test all pixel centroids at once. The
+        # shape is found for the untranslated nodes so it is cached per mesh
+        # and then moved to the camera region of interest
+        a_shape = alphashape_cached(nodes[:,(XI,YI)], alpha, only_outer=True)
+        a_shape = shapely.affinity.translate(a_shape,
+                                             xoff=camera.roi_loc[XI],
+                                             yoff=camera.roi_loc[YI])
+        shapely.prepare(a_shape)
+        px_in_spec = shapely.contains_xy(a_shape,px_x_m,px_y_m)
+    else:
+        # Pixels are inside the specimen if they are inside any element
+        px_in_spec = calc_px_in_elems(points,connect,px_x_m,px_y_m)
 
-    # Fill the image based on the pixel being within the polygon (alpha-shape)
     # If pixel is not within the specimen set to background default colour
-    for yy in range(masked_im.shape[0]):
-        for xx in range(masked_im.shape[1]):
-            if a_shape.contains(Point(px_x_m[yy,xx],px_y_m[yy,xx])):
-                masked_im[yy,xx] = image[yy,xx]
-                im_mask[yy,xx] = 1
-            else:
-                masked_im[yy,xx] = camera.background
-                im_mask[yy,xx] = 0
+    masked_im = np.where(px_in_spec,image,camera.background)
+    im_mask = px_in_spec.astype(np.float64)
 
-    # Because arrays fill from top down the loop above effectively flips the
-    # image, so need to flip it back
+    # The pixel grid has Y flipped relative to the image arrays, so need to flip
+    # it back
     masked_im = masked_im[::-1,:]
     im_mask = im_mask[::-1,:]
 
@@ -240,35 +266,150 @@ def get_im_mask_from_sim(camera: CameraData,
     return (masked_im,im_mask)
 
 
+def calc_px_in_elems(points: np.ndarray,
+                     connect: dict[str,np.ndarray],
+                     px_x_m: np.ndarray,
+                     px_y_m: np.ndarray) -> np.ndarray:
+
+    triangulation = mtri.Triangulation(points[:,XI],
+                                       points[:,YI],
+                                       conv_connect_to_tris(connect))
+    tri_finder = triangulation.get_trifinder()
+    return tri_finder(px_x_m,px_y_m) >= 0
+
+
 def upsample_image(camera: CameraData,
                    id_opts: ImageDefOpts,
-                   input_im: np.ndarray):
+                   input_im: np.ndarray) -> np.ndarray:
     # Get grid of pixel centroid locations
     (px_vec_xm,px_vec_ym) = get_pixel_vec_in_m(camera)
 
     # Get grid of sub-pixel centroid locations
     (subpx_vec_xm,subpx_vec_ym) = get_subpixel_vec(camera, id_opts.subsample)
 
-    upsampled_image_interp = interp2d(px_vec_xm, px_vec_ym, input_im,
-                                      kind=id_opts.image_upsamp_interp)
-    # This function will flip the image regardless of the y vector input so flip it
-    # back to FE coords
-    upsampled_image = upsampled_image_interp(subpx_vec_xm,subpx_vec_ym)
-    upsampled_image = upsampled_image[::-1,:]
+    spline_order = get_upsamp_spline_order(id_opts.image_upsamp_interp)
+
+    if id_opts.image_upsamp_tile_px <= 0:
+        return upsample_spline(px_vec_xm,
+                               px_vec_ym,
+                               input_im,
+                               subpx_vec_xm,
+                               subpx_vec_ym,
+                               spline_order)
+
+    return upsample_spline_tiled(px_vec_xm,
+                                 px_vec_ym,
+                                 input_im,
+                                 subpx_vec_xm,
+                                 subpx_vec_ym,
+                                 spline_order,
+                                 id_opts.subsample,
+                                 id_opts.image_upsamp_tile_px)
+
+
+def get_upsamp_spline_order(interp: str) -> int:
+    # NOTE: same interpolation kinds as the removed scipy interp2d
+    spline_orders = {'linear': 1, 'cubic': 3, 'quintic': 5}
+    if interp not in spline_orders:
+        raise ValueError(f"Image upsampling interpolation '{interp}' is not "+
+                         "supported, use 'linear', 'cubic' or 'quintic'.")
+
+    return spline_orders[interp]
+
+
+def upsample_spline(px_vec_xm: np.ndarray,
+                    px_vec_ym: np.ndarray,
+                    input_im: np.ndarray,
+                    subpx_vec_xm: np.ndarray,
+                    subpx_vec_ym: np.ndarray,
+                    spline_order: int) -> np.ndarray:
+
+    # NOTE: this is the interpolating spline (s=0) that interp2d fitted on a
+    # rectangular grid. Points outside the pixel centroids are clamped to the
+    # edge of the spline as they were with interp2d.
+    # The Y pixel vectors are flipped so they need to be reversed for fitting
+    # and the result flipped back to image coords
+    upsamp_spline = RectBivariateSpline(px_vec_ym[::-1],
+                                        px_vec_xm,
+                                        input_im[::-1,:],
+                                        kx=spline_order,
+                                        ky=spline_order,
+                                        s=0)
+
+    upsampled_image = upsamp_spline(subpx_vec_ym[::-1],subpx_vec_xm)
+    return upsampled_image[::-1,:]
+
+
+def upsample_spline_tiled(px_vec_xm: np.ndarray,
+                          px_vec_ym: np.ndarray,
+                          input_im: np.ndarray,
+                          subpx_vec_xm: np.ndarray,
+                          subpx_vec_ym: np.ndarray,
+                          spline_order: int,
+                          subsample: int,
+                          tile_px: int,
+                          halo_px: int = 32) -> np.ndarray:
+
+    # NOTE: each tile is fitted with a halo of input pixels around it so the
+    # tiled spline matches the full image spline to ~1e-9 of the dynamic range
+    # for cubic interpolation, only one tile of spline coefficients is held
+    upsampled_image = np.empty((subpx_vec_ym.shape[0],subpx_vec_xm.shape[0]))
+    (n_rows,n_cols) = input_im.shape
+
+    for r0 in range(0,n_rows,tile_px):
+        r1 = min(r0+tile_px,n_rows)
+        (h_r0,h_r1) = (max(r0-halo_px,0),min(r1+halo_px,n_rows))
+        sub_rows = slice(r0*subsample,r1*subsample if r1 < n_rows else None)
+
+        for c0 in range(0,n_cols,tile_px):
+            c1 = min(c0+tile_px,n_cols)
+            (h_c0,h_c1) = (max(c0-halo_px,0),min(c1+halo_px,n_cols))
+            sub_cols = slice(c0*subsample,c1*subsample if c1 < n_cols else None)
+
+            upsampled_image[sub_rows,sub_cols] = upsample_spline(
+                px_vec_xm[h_c0:h_c1],
+                px_vec_ym[h_r0:h_r1],
+                input_im[h_r0:h_r1,h_c0:h_c1],
+                subpx_vec_xm[sub_cols],
+                subpx_vec_ym[sub_rows],
+                spline_order)
 
     return upsampled_image
 
 
-def average_subpixel_image(subpx_image,subsample):
-    conv_mask = np.ones((subsample,subsample))/(subsample**2)
-    if subsample > 1:
-        subpx_image_conv = convolve2d(subpx_image,conv_mask,mode='same')
-        avg_image = subpx_image_conv[round(subsample/2)-1::subsample,
-                                     round(subsample/2)-1::subsample]
-    else:
-        subpx_image_conv = subpx_image
-        avg_image = subpx_image
-
+def average_subpixel_image(subpx_image: np.ndarray,
+                           subsample: int) -> np.ndarray:
+    # NOTE: each pixel is the mean of its subsample x subsample block of
+    # subpixels, calculated with block sums over reshaped views so there is no
+    # convolution. If the subpixel image is not a whole number of blocks the
+    # bottom/right pixels are the mean of the subpixels they contain.
+    if subsample <= 1:
+        return subpx_image
+
+    (n_rows,n_cols) = subpx_image.shape
+    (n_full_rows,n_full_cols) = (n_rows//subsample,n_cols//subsample)
+    n_px_rows = -(-n_rows//subsample)
+    n_px_cols = -(-n_cols//subsample)
+
+    # Sum the blocks down the rows then across the columns
+    row_sums = np.empty((n_px_rows,n_cols))
+    row_sums[:n_full_rows,:] = subpx_image[:n_full_rows*subsample,:].reshape(
+        n_full_rows,subsample,n_cols).sum(axis=1)
+    if n_px_rows > n_full_rows:
+        row_sums[-1,:] = subpx_image[n_full_rows*subsample:,:].sum(axis=0)
+
+    block_sums = np.empty((n_px_rows,n_px_cols))
+    block_sums[:,:n_full_cols] = row_sums[:,:n_full_cols*subsample].reshape(
+        n_px_rows,n_full_cols,subsample).sum(axis=2)
+    if n_px_cols > n_full_cols:
+        block_sums[:,-1] = row_sums[:,n_full_cols*subsample:].sum(axis=1)
+
+    row_counts = np.full(n_px_rows,subsample)
+    row_counts[-1] = n_rows - (n_px_rows-1)*subsample
+    col_counts = np.full(n_px_cols,subsample)
+    col_counts[-1] = n_cols - (n_px_cols-1)*subsample
+
+    avg_image = block_sums / np.outer(row_counts,col_counts)
     return avg_image
 
 
@@ -278,7 +419,8 @@ def preprocess(input_im: np.ndarray,
                 disp_y: np.ndarray,
                 camera: CameraData,
                 id_opts: ImageDefOpts,
-                print_on: bool = False
+                print_on: bool = False,
+                connect: dict[str,np.ndarray] | None = None
                 ) -> tuple[np.ndarray,
                            np.ndarray|None,
                            np.ndarray,
@@ -314,7 +456,8 @@ def preprocess(input_im: np.ndarray,
 
         (masked_im,image_mask) = get_im_mask_from_sim(camera,
                                                 input_im,
-                                                coords) # type: ignore
+                                                coords, # type: ignore
+                                                connect)
         if id_opts.mask_input_image:
             input_im = masked_im
         del masked_im
@@ -336,24 +479,98 @@ def preprocess(input_im: np.ndarray,
 
     if print_on:
         toc = time.perf_counter()
-        print(f'Upsampling image with I2D took {toc-tic:.4f} seconds')
+        print(f'Upsampling image took {toc-tic:.4f} seconds')
 
     return (upsampled_image,image_mask,input_im,disp_x,disp_y)
 
 
-def deform_one_image(upsampled_image: np.ndarray,
+def create_disp_interp(camera: CameraData,
+                       id_opts: ImageDefOpts,
+                       connect: dict[str,np.ndarray] | None = None
+                       ) -> TriDispInterp | MeshRasterDispInterp | None:
+
+    # NOTE: returns None if griddata should be used for the interpolation
+    if id_opts.fe_interp != 'linear' or id_opts.fe_interp_engine == 'griddata':
+        return None
+
+    (subpx_grid_xm,subpx_grid_ym) = get_subpixel_grid(camera, id_opts.subsample)
+    return create_disp_interp_on_grid(subpx_grid_xm,
+                                      subpx_grid_ym,
+                                      id_opts,
+                                      connect)
+
+
+def create_disp_interp_on_grid(subpx_grid_xm: np.ndarray,
+                               subpx_grid_ym: np.ndarray,
+                               id_opts: ImageDefOpts,
+                               connect: dict[str,np.ndarray] | None = None
+                               ) -> TriDispInterp | MeshRasterDispInterp:
+
+    if id_opts.fe_interp_engine == 'raster':
+        if connect is None:
+            raise ValueError("The 'raster' displacement interpolation engine "+
+                             "requires the FE connectivity.")
+        return MeshRasterDispInterp(subpx_grid_xm,subpx_grid_ym,connect)
+
+    if id_opts.fe_interp_engine == 'tri':
+        triangles = None
+    elif id_opts.fe_interp_engine == 'mesh':
+        if connect is None:
+            raise ValueError("The 'mesh' displacement interpolation engine "+
+                             "requires the FE connectivity.")
+        triangles = conv_connect_to_tris(connect)
+    else:
+        raise ValueError("Displacement interpolation engine "+
+                         f"'{id_opts.fe_interp_engine}' is not supported, use "+
+                         "'tri', 'mesh', 'raster' or 'griddata'.")
+
+    return TriDispInterp(subpx_grid_xm,
+                         subpx_grid_ym,
+                         triangles,
+                         id_opts.fe_rescale,
+                         id_opts.fe_interp_reuse_tri)
+
+
+def calc_image_coeffs(upsampled_image: np.ndarray,
+                      image_mask: np.ndarray | None,
+                      id_opts: ImageDefOpts
+                      ) -> tuple[SplineCoeffs,SplineCoeffs | None]:
+
+    # NOTE: the spline prefilter of the upsampled image and mask only depends
+    # on the reference image so it is calculated once for all frames
+    image_coeffs = calc_spline_coeffs(upsampled_image,
+                                      id_opts.image_def_order,
+                                      id_opts.image_def_extrap,
+                                      id_opts.image_def_extval)
+
+    mask_coeffs = None
+    if image_mask is not None and id_opts.def_complex_geom:
+        mask_coeffs = calc_mask_coeffs(image_mask)
+
+    return (image_coeffs,mask_coeffs)
+
+
+def calc_mask_coeffs(image_mask: np.ndarray) -> SplineCoeffs:
+    return calc_spline_coeffs(image_mask,order=2,mode='constant',cval=0.0)
+
+
+def deform_one_image(upsampled_image: np.ndarray | None,
                  camera: CameraData,
                  id_opts: ImageDefOpts,
                  coords: np.ndarray,
                  disp: np.ndarray,
                  image_mask: np.ndarray | None = None,
-                 print_on: bool = True
+                 print_on: bool = True,
+                 disp_interp: TriDispInterp | MeshRasterDispInterp | None = None,
+                 image_coeffs: SplineCoeffs | None = None,
+                 mask_coeffs: SplineCoeffs | None = None
                  ) -> tuple[np.ndarray,
                             np.ndarray,
                             np.ndarray,
                             np.ndarray,
                             np.ndarray | None]:
-
+    # NOTE: the spline coefficients from calc_image_coeffs are the same for
+    # every frame, if they are given the upsampled image is not used
     if image_mask is not None:
         if (image_mask.shape[0] != camera.num_px[YI]) or (image_mask.shape[1] != camera.num_px[XI]):
             if image_mask.size == 0:
@@ -361,6 +578,7 @@ def deform_one_image(upsampled_image: np.ndarray,
             else:
                 warnings.warn('Image mask size does not match camera, using default mask of ones.')
             image_mask = np.ones([camera.num_px[YI],camera.num_px[XI]])
+            mask_coeffs = None
 
     # Get grid of pixel centroid locations
     (px_grid_xm,px_grid_ym) = get_pixel_grid_in_m(camera)
@@ -373,22 +591,30 @@ def deform_one_image(upsampled_image: np.ndarray,
         print('Interpolating displacement onto sub-pixel grid.')
         tic = time.perf_counter()
 
+    if disp_interp is None:
+        disp_interp = create_disp_interp(camera,id_opts)
+
     # Interpolate displacements onto sub-pixel locations - nan extrapolation
-    subpx_disp_x = griddata((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
-                             coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]),
-                            disp[:,XI],
-                            (subpx_grid_xm,subpx_grid_ym),
-                            method=id_opts.fe_interp,
-                            fill_value=np.nan,
-                            rescale=id_opts.fe_rescale)
-
-    subpx_disp_y = griddata((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
-                             coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]),
-                            disp[:,YI],
-                            (subpx_grid_xm,subpx_grid_ym),
-                            method=id_opts.fe_interp,
-                            fill_value=np.nan,
-                            rescale=id_opts.fe_rescale)
+    if disp_interp is not None:
+        def_nodes = np.column_stack((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
+                                     coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]))
+        (subpx_disp_x,subpx_disp_y) = disp_interp.interp_disp(def_nodes,disp)
+    else:
+        subpx_disp_x = griddata((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
+                                 coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]),
+                                disp[:,XI],
+                                (subpx_grid_xm,subpx_grid_ym),
+                                method=id_opts.fe_interp,
+                                fill_value=np.nan,
+                                rescale=id_opts.fe_rescale)
+
+        subpx_disp_y = griddata((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
+                                 coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]),
+                                disp[:,YI],
+                                (subpx_grid_xm,subpx_grid_ym),
+                                method=id_opts.fe_interp,
+                                fill_value=np.nan,
+                                rescale=id_opts.fe_rescale)
 
     # Ndimage interp can't handle nans so force everything outside the specimen
     # to extrapolate outside the FOV - then use ndimage opts to control
@@ -424,16 +650,17 @@ def deform_one_image(upsampled_image: np.ndarray,
     def_subpx_x_in_px = def_subpx_x*(id_opts.subsample/camera.m_per_px)-0.5
     def_subpx_y_in_px = def_subpx_y*(id_opts.subsample/camera.m_per_px)-0.5
     # NOTE: prefilter needs to be on to match griddata and interp2D!
-    # with prefilter on this exactly matches I2D but 10x faster!
-    def_image_subpx = ndimage.map_coordinates(upsampled_image,
-                                            [[def_subpx_y_in_px],
-                                             [def_subpx_x_in_px]],
-                                            prefilter=True,
-                                            order= id_opts.image_def_order,
-                                            mode= id_opts.image_def_extrap,
-                                            cval= id_opts.image_def_extval)
-
-    def_image_subpx = def_image_subpx[0,:,:].squeeze()
+    # with prefilter on this exactly matches I2D but 10x faster! The prefilter
+    # is the spline coefficients which are sampled with prefilter off.
+    if image_coeffs is None:
+        image_coeffs = calc_spline_coeffs(upsampled_image, # type: ignore
+                                          id_opts.image_def_order,
+                                          id_opts.image_def_extrap,
+                                          id_opts.image_def_extval)
+
+    def_image_subpx = map_coords_spline(image_coeffs,
+                                        def_subpx_y_in_px,
+                                        def_subpx_x_in_px)
     if print_on:
         toc = time.perf_counter()
         print('Deforming sub-pixel image with ndimage took {:.4f} seconds'.format(toc-tic))
@@ -457,10 +684,11 @@ def deform_one_image(upsampled_image: np.ndarray,
             print('Deforming image mask.')
             tic = time.perf_counter()
 
-        px_disp_x = subpx_disp_x[round(id_opts.subsample/2)-1::id_opts.subsample,
-                                 round(id_opts.subsample/2)-1::id_opts.subsample]
-        px_disp_y = subpx_disp_y[round(id_opts.subsample/2)-1::id_opts.subsample,
-                                 round(id_opts.subsample/2)-1::id_opts.subsample]
+        px_offset = get_mask_px_offset(id_opts.subsample)
+        px_disp_x = subpx_disp_x[px_offset::id_opts.subsample,
+                                 px_offset::id_opts.subsample]
+        px_disp_y = subpx_disp_y[px_offset::id_opts.subsample,
+                                 px_offset::id_opts.subsample]
         def_px_x = px_grid_xm-px_disp_x
         def_px_y = px_grid_ym-px_disp_y
         # Flip needed to be consistent with pixel coords of ndimage
@@ -474,15 +702,12 @@ def deform_one_image(upsampled_image: np.ndarray,
         def_px_y_in_px = def_px_y*(1/camera.m_per_px)-0.5
         # NOTE: prefilter needs to be on to match griddata and interp2D!
         # with prefilter on this exactly matches I2D but 10x faster!
-        def_mask = ndimage.map_coordinates(image_mask,
-                                            [[def_px_y_in_px],
-                                             [def_px_x_in_px]],
-                                            prefilter=True,
-                                            order=2,
-                                            mode='constant',
-                                            cval=0)
-
-        def_mask = def_mask[0,:,:].squeeze()
+        if mask_coeffs is None:
+            mask_coeffs = calc_mask_coeffs(image_mask) # type: ignore
+
+        def_mask = map_coords_spline(mask_coeffs,
+                                     def_px_y_in_px,
+                                     def_px_x_in_px)
         # Use the deformed image mask to mask the deformed image
         # Mask is 0-1 with 1 being definitely inside the sample 0 outside
         def_image[def_mask<0.51] = camera.background # type: ignore
@@ -497,13 +722,312 @@ def deform_one_image(upsampled_image: np.ndarray,
     return (def_image,def_image_subpx,subpx_disp_x,subpx_disp_y,def_mask)
 
 
+def get_mask_px_offset(subsample: int) -> int:
+    # NOTE: index of the subpixel in each pixel whose displacement is used to
+    # deform the image mask
+    return max(round(subsample/2)-1,0)
+
+
+def deform_one_image_tiled(upsampled_image: np.ndarray,
+                           camera: CameraData,
+                           id_opts: ImageDefOpts,
+                           coords: np.ndarray,
+                           disp: np.ndarray,
+                           image_mask: np.ndarray | None = None,
+                           connect: dict[str,np.ndarray] | None = None
+                           ) -> tuple[np.ndarray,np.ndarray | None]:
+
+    # NOTE: same result as deform_one_image but the frame is deformed in square
+    # tiles of def_tile_px pixels. Only one tile of subpixel coordinates,
+    # displacements and deformed subpixels is held at a time and each tile of
+    # pixels is written straight into the output frame. The upsampled image
+    # and mask are only prefiltered over a window around the coordinates each
+    # tile samples, see map_coords_window.
+    if image_mask is not None:
+        if (image_mask.shape[0] != camera.num_px[YI]) or (image_mask.shape[1] != camera.num_px[XI]):
+            if image_mask.size == 0:
+                warnings.warn('Image mask not specified, using default mask of ones.')
+            else:
+                warnings.warn('Image mask size does not match camera, using default mask of ones.')
+            image_mask = np.ones([camera.num_px[YI],camera.num_px[XI]])
+
+    subsample = id_opts.subsample
+    tile_subpx = id_opts.def_tile_px*subsample
+    (px_vec_xm,px_vec_ym) = get_pixel_vec_in_m(camera)
+    (subpx_vec_xm,subpx_vec_ym) = get_subpixel_vec(camera,subsample)
+    (n_subpx_rows,n_subpx_cols) = (subpx_vec_ym.shape[0],subpx_vec_xm.shape[0])
+    n_px_rows = px_vec_ym.shape[0]
+
+    def_nodes = np.column_stack((coords[:,XI] + disp[:,XI] + camera.roi_loc[XI],
+                                 coords[:,YI] + disp[:,YI] + camera.roi_loc[YI]))
+    frame_interp = create_frame_disp_interp(def_nodes,disp,id_opts,connect)
+
+    if id_opts.fe_extrap_outside_fov:
+        subpx_disp_ext_vals = 2*camera.fov
+    else:
+        subpx_disp_ext_vals = (0.0,0.0)
+
+    mask_on = id_opts.def_complex_geom and image_mask is not None
+    mask_px_offset = get_mask_px_offset(subsample)
+
+    # NOTE: output rows run up the image (flipped from the subpixel grid) and
+    # tiles are aligned to whole pixels so the subpixel averaging is unchanged
+    def_image = np.empty((-(-n_subpx_rows//subsample),-(-n_subpx_cols//subsample)))
+    def_mask = np.empty(def_image.shape) if mask_on else None
+
+    for (o_r0,o_r1) in get_tile_bounds(n_subpx_rows,tile_subpx):
+        (g_r0,g_r1) = (n_subpx_rows-o_r1,n_subpx_rows-o_r0)
+        (p_r0,p_r1) = (o_r0//subsample,-(-o_r1//subsample))
+
+        for (o_c0,o_c1) in get_tile_bounds(n_subpx_cols,tile_subpx):
+            (p_c0,p_c1) = (o_c0//subsample,-(-o_c1//subsample))
+
+            (tile_grid_xm,tile_grid_ym) = np.meshgrid(subpx_vec_xm[o_c0:o_c1],
+                                                      subpx_vec_ym[g_r0:g_r1])
+
+            (tile_disp_x,tile_disp_y) = interp_disp_tile(tile_grid_xm,
+                                                         tile_grid_ym,
+                                                         def_nodes,
+                                                         disp,
+                                                         id_opts,
+                                                         frame_interp,
+                                                         connect)
+            tile_disp_x[np.isnan(tile_disp_x)] = subpx_disp_ext_vals[XI]
+            tile_disp_y[np.isnan(tile_disp_y)] = subpx_disp_ext_vals[YI]
+
+            # Flip needed to be consistent with pixel coords of ndimage
+            def_subpx_x = (tile_grid_xm-tile_disp_x)[::-1,:]
+            def_subpx_y = (tile_grid_ym-tile_disp_y)[::-1,:]
+            def_subpx_x_in_px = def_subpx_x*(subsample/camera.m_per_px)-0.5
+            def_subpx_y_in_px = def_subpx_y*(subsample/camera.m_per_px)-0.5
+
+            def_tile_subpx = map_coords_window(upsampled_image,
+                                               def_subpx_y_in_px,
+                                               def_subpx_x_in_px,
+                                               id_opts.image_def_order,
+                                               id_opts.image_def_extrap,
+                                               id_opts.image_def_extval)
+
+            def_tile = average_subpixel_image(def_tile_subpx,subsample)
+
+            if mask_on:
+                # Pixel displacements are taken from the same subpixels as
+                # deform_one_image, indexed from the top of the subpixel grid
+                px_rows = np.arange(n_px_rows-p_r1,n_px_rows-p_r0)
+                px_cols = np.arange(p_c0,p_c1)
+                tile_rows = np.clip(mask_px_offset + px_rows*subsample - g_r0,
+                                    0,tile_grid_xm.shape[0]-1)
+                tile_cols = np.clip(mask_px_offset + px_cols*subsample - o_c0,
+                                    0,tile_grid_xm.shape[1]-1)
+
+                (px_grid_xm,px_grid_ym) = np.meshgrid(px_vec_xm[px_cols],
+                                                      px_vec_ym[px_rows])
+                def_px_x = (px_grid_xm
+                            - tile_disp_x[np.ix_(tile_rows,tile_cols)])[::-1,:]
+                def_px_y = (px_grid_ym
+                            - tile_disp_y[np.ix_(tile_rows,tile_cols)])[::-1,:]
+
+                def_tile_mask = map_coords_window(image_mask, # type: ignore
+                                                  def_px_y*(1/camera.m_per_px)-0.5,
+                                                  def_px_x*(1/camera.m_per_px)-0.5,
+                                                  order=2,
+                                                  mode='constant',
+                                                  cval=0)
+
+                def_tile[def_tile_mask<0.51] = camera.background # type: ignore
+                def_mask[p_r0:p_r1,p_c0:p_c1] = def_tile_mask # type: ignore
+
+            def_image[p_r0:p_r1,p_c0:p_c1] = def_tile
+
+    return (def_image,def_mask)
+
+
+def get_tile_bounds(n_subpx: int, tile_subpx: int) -> list[tuple[int,int]]:
+    # NOTE: a last tile narrower than 2 subpixels is merged into the one before
+    # it so every tile has a subpixel grid spacing
+    tile_starts = list(range(0,n_subpx,tile_subpx))
+    if len(tile_starts) > 1 and n_subpx - tile_starts[-1] < 2:
+        tile_starts.pop()
+
+    tile_ends = tile_starts[1:] + [n_subpx]
+    return list(zip(tile_starts,tile_ends))
+
+
+def create_frame_disp_interp(def_nodes: np.ndarray,
+                             disp: np.ndarray,
+                             id_opts: ImageDefOpts,
+                             connect: dict[str,np.ndarray] | None = None
+                             ) -> (LinearNDInterpolator
+                                   | NearestNDInterpolator
+                                   | CloughTocher2DInterpolator
+                                   | None):
+
+    # NOTE: interpolator of both displacement components over the whole frame
+    # that tiles are evaluated from, these are the interpolators griddata
+    # builds. Returns None if the mesh engines rasterise each tile instead.
+    if id_opts.fe_interp == 'linear':
+        if id_opts.fe_interp_engine in ('mesh','raster'):
+            if connect is None:
+                raise ValueError(f"The '{id_opts.fe_interp_engine}' "+
+                                 "displacement interpolation engine requires "+
+                                 "the FE connectivity.")
+            return None
+
+        if id_opts.fe_interp_engine not in ('tri','griddata'):
+            raise ValueError("Displacement interpolation engine "+
+                             f"'{id_opts.fe_interp_engine}' is not supported, "+
+                             "use 'tri', 'mesh', 'raster' or 'griddata'.")
+
+        return LinearNDInterpolator(def_nodes,
+                                    disp,
+                                    fill_value=np.nan,
+                                    rescale=id_opts.fe_rescale)
+
+    if id_opts.fe_interp == 'nearest':
+        return NearestNDInterpolator(def_nodes,
+                                     disp,
+                                     rescale=id_opts.fe_rescale)
+
+    if id_opts.fe_interp == 'cubic':
+        return CloughTocher2DInterpolator(def_nodes,
+                                          disp,
+                                          fill_value=np.nan,
+                                          rescale=id_opts.fe_rescale)
+
+    raise ValueError(f"FE interpolation '{id_opts.fe_interp}' is not "+
+                     "supported, use 'linear', 'nearest' or 'cubic'.")
+
+
+def interp_disp_tile(tile_grid_xm: np.ndarray,
+                     tile_grid_ym: np.ndarray,
+                     def_nodes: np.ndarray,
+                     disp: np.ndarray,
+                     id_opts: ImageDefOpts,
+                     frame_interp: (LinearNDInterpolator
+                                    | NearestNDInterpolator
+                                    | CloughTocher2DInterpolator
+                                    | None),
+                     connect: dict[str,np.ndarray] | None = None
+                     ) -> tuple[np.ndarray,np.ndarray]:
+
+    if frame_interp is not None:
+        tile_disp = frame_interp((tile_grid_xm,tile_grid_ym))
+        return (tile_disp[:,:,XI],tile_disp[:,:,YI])
+
+    # NOTE: only the elements overlapping the tile can contain its subpixels
+    # so the mesh engines give the same result on the cropped connectivity
+    subpx_step = np.abs(tile_grid_xm[0,1]-tile_grid_xm[0,0])
+    box_min = np.array((np.min(tile_grid_xm),np.min(tile_grid_ym))) - subpx_step
+    box_max = np.array((np.max(tile_grid_xm),np.max(tile_grid_ym))) + subpx_step
+    tile_connect = crop_connect_to_box(connect,def_nodes,box_min,box_max) # type: ignore
+
+    if len(tile_connect) == 0:
+        return (np.full(tile_grid_xm.shape,np.nan),
+                np.full(tile_grid_xm.shape,np.nan))
+
+    disp_interp = create_disp_interp_on_grid(tile_grid_xm,
+                                             tile_grid_ym,
+                                             id_opts,
+                                             tile_connect)
+    return disp_interp.interp_disp(def_nodes,disp)
+
+
+def get_spline_halo_px(order: int) -> int:
+    # NOTE: prefiltering a window instead of the whole image changes the spline
+    # coefficients by the largest pole of the prefilter raised to the distance
+    # from the window edge, the halo keeps this below 1e-13 of the range
+    spline_poles = {2: 0.171573, 3: 0.267949, 4: 0.361341, 5: 0.430575}
+    if order not in spline_poles:
+        return order+1
+
+    return int(np.ceil(np.log(1e-13)/np.log(spline_poles[order]))) + order+1
+
+
+def map_coords_window(image: np.ndarray,
+                      coords_row: np.ndarray,
+                      coords_col: np.ndarray,
+                      order: int,
+                      mode: str,
+                      cval: float) -> np.ndarray:
+
+    # NOTE: same as ndimage.map_coordinates with prefilter on but only the
+    # window of the image around the coordinates, plus a halo for the spline
+    # prefilter, is filtered. For 'nearest' and 'constant' modes coordinates
+    # far outside the image are clamped, which does not change the value, and
+    # sampled with their own window on the image edge. For the other modes
+    # coordinates outside the image can map anywhere so the window covers the
+    # whole image along that axis.
+    clamp_modes = ('nearest','constant','grid-constant')
+    if mode not in clamp_modes:
+        return _map_coords_window(image,coords_row,coords_col,order,mode,cval)
+
+    clamp_px = 16 + order
+    coords = list()
+    sides = list()
+    for (cc,nn) in zip((coords_row,coords_col),image.shape):
+        coords.append(np.clip(cc,-clamp_px,nn-1+clamp_px))
+        sides.append(np.where(cc < -clamp_px,0,
+                              np.where(cc > nn-1+clamp_px,2,1)))
+
+    window_groups = 3*sides[0] + sides[1]
+    group_ids = np.unique(window_groups)
+    if group_ids.shape[0] == 1:
+        return _map_coords_window(image,coords[0],coords[1],order,mode,cval)
+
+    sampled = np.empty(coords_row.shape)
+    for gg in group_ids:
+        in_group = window_groups == gg
+        sampled[in_group] = _map_coords_window(image,
+                                               coords[0][in_group],
+                                               coords[1][in_group],
+                                               order,
+                                               mode,
+                                               cval)
+    return sampled
+
+
+def _map_coords_window(image: np.ndarray,
+                       coords_row: np.ndarray,
+                       coords_col: np.ndarray,
+                       order: int,
+                       mode: str,
+                       cval: float) -> np.ndarray:
+
+    halo_px = get_spline_halo_px(order)
+    window = list()
+    for (cc,nn) in zip((coords_row,coords_col),image.shape):
+        if mode not in ('nearest','constant','grid-constant') and \
+            (np.min(cc) < 0 or np.max(cc) > nn-1):
+            window.append((0,nn))
+            continue
+
+        # The window always keeps a halo next to the image edge it is closest
+        # to so coordinates clamped to the edge see the same boundary
+        lo = max(min(int(np.floor(np.min(cc)))-halo_px,nn-1-halo_px),0)
+        hi = min(max(int(np.ceil(np.max(cc)))+halo_px+1,halo_px+1),nn)
+        window.append((lo,hi))
+
+    ((r0,r1),(c0,c1)) = window
+    return ndimage.map_coordinates(image[r0:r1,c0:c1],
+                                   [coords_row-r0,coords_col-c0],
+                                   prefilter=True,
+                                   order=order,
+                                   mode=mode,
+                                   cval=cval)
+
+
 def deform_images(input_im: np.ndarray,
                  camera: CameraData,
                  id_opts: ImageDefOpts,
                  coords: np.ndarray,
                  disp_x: np.ndarray,
                  disp_y: np.ndarray,
-                 print_on: bool = False) -> None:
+                 print_on: bool = False,
+                 connect: dict[str,np.ndarray] | None = None,
+                 frame_sink: IFrameSink | None = None) -> None:
+    # NOTE: if the connectivity table is given the image mask is built from the
+    # mesh elements instead of an alpha shape of the nodes. Frames are written
+    # to the frame sink if one is given, otherwise to the save_format file(s).
     #---------------------------------------------------------------------------
     # Image Pre-Processing
     (upsampled_image,
@@ -516,7 +1040,8 @@ def deform_images(input_im: np.ndarray,
                             disp_y,
                             camera,
                             id_opts,
-                            print_on = print_on)
+                            print_on = print_on,
+                            connect = connect)
 
     #---------------------------------------------------------------------------
     # Image Deformation Loop
@@ -527,27 +1052,42 @@ def deform_images(input_im: np.ndarray,
     num_frames = disp_x.shape[1]
     ticl = time.perf_counter()
 
-    for ff in range(num_frames):
-        if print_on:
-            ticf = time.perf_counter()
-            print(f'\nDEFORMING FRAME: {ff}')
-
-        (def_image,_,_,_,_) = deform_one_image(upsampled_image,
-                                            camera,
-                                            id_opts,
-                                            coords, # type: ignore
-                                            np.array((disp_x[:,ff],disp_y[:,ff])).T,
-                                            image_mask=image_mask,
-                                            print_on=print_on)
-
-        save_file = id_opts.save_path / str(f'{id_opts.save_tag}_'+
-                f'{get_image_num_str(im_num=ff,width=4)}'+
-                '.tiff')
-        save_image(save_file,def_image,camera.bits)
-
-        if print_on:
-            tocf = time.perf_counter()
-            print(f'DEFORMING FRAME: {ff} took {tocf-ticf:.4f} seconds')
+    # NOTE: tiled deformation prefilters a window for each tile instead so it
+    # does not hold the coefficients for the whole image
+    (image_coeffs,mask_coeffs) = (None,None)
+    if id_opts.def_tile_px <= 0:
+        (image_coeffs,mask_coeffs) = calc_image_coeffs(upsampled_image,
+                                                       image_mask,
+                                                       id_opts)
+
+    if frame_sink is None:
+        frame_sink = create_frame_sink(id_opts)
+    if id_opts.save_queue_frames > 0:
+        frame_sink = BackgroundFrameWriter(frame_sink,id_opts.save_queue_frames)
+
+    frame_sink.open(num_frames,
+                    get_def_image_shape(camera,id_opts.subsample),
+                    np.dtype(get_save_dtype(camera.bits)))
+    try:
+        _deform_write_frames(upsampled_image,
+                             camera,
+                             id_opts,
+                             coords,
+                             disp_x,
+                             disp_y,
+                             image_mask,
+                             print_on,
+                             connect,
+                             image_coeffs,
+                             mask_coeffs,
+                             frame_sink)
+    except BaseException:
+        # NOTE: closed as aborted so an error from the sink for the frames
+        # that were not written does not hide the error from deforming them
+        frame_sink.close(aborted=True)
+        raise
+
+    frame_sink.close()
 
     if print_on:
         tocl = time.perf_counter()
@@ -558,3 +1098,291 @@ def deform_images(input_im: np.ndarray,
         print('\n'+'='*80)
         print('COMPLETE\n')
 
+
+def _deform_write_frames(upsampled_image: np.ndarray,
+                         camera: CameraData,
+                         id_opts: ImageDefOpts,
+                         coords: np.ndarray,
+                         disp_x: np.ndarray,
+                         disp_y: np.ndarray,
+                         image_mask: np.ndarray | None,
+                         print_on: bool,
+                         connect: dict[str,np.ndarray] | None,
+                         image_coeffs: SplineCoeffs | None,
+                         mask_coeffs: SplineCoeffs | None,
+                         frame_sink: IFrameSink) -> None:
+
+    num_frames = disp_x.shape[1]
+    if id_opts.def_workers > 1:
+        deform_images_parallel(upsampled_image,
+                               camera,
+                               id_opts,
+                               coords,
+                               disp_x,
+                               disp_y,
+                               frame_sink,
+                               image_mask,
+                               print_on,
+                               connect,
+                               image_coeffs,
+                               mask_coeffs)
+    else:
+        disp_interp = None
+        if id_opts.def_tile_px <= 0:
+            disp_interp = create_disp_interp(camera,id_opts,connect)
+
+        for ff in range(num_frames):
+            if print_on:
+                ticf = time.perf_counter()
+                print(f'\nDEFORMING FRAME: {ff}')
+
+            if id_opts.def_tile_px > 0:
+                (def_image,_) = deform_one_image_tiled(upsampled_image,
+                                                    camera,
+                                                    id_opts,
+                                                    coords, # type: ignore
+                                                    np.array((disp_x[:,ff],disp_y[:,ff])).T,
+                                                    image_mask=image_mask,
+                                                    connect=connect)
+            else:
+                (def_image,_,_,_,_) = deform_one_image(upsampled_image,
+                                                    camera,
+                                                    id_opts,
+                                                    coords, # type: ignore
+                                                    np.array((disp_x[:,ff],disp_y[:,ff])).T,
+                                                    image_mask=image_mask,
+                                                    print_on=print_on,
+                                                    disp_interp=disp_interp,
+                                                    image_coeffs=image_coeffs,
+                                                    mask_coeffs=mask_coeffs)
+
+            frame_sink.write(ff,conv_image_to_save(def_image,camera.bits))
+
+            if print_on:
+                tocf = time.perf_counter()
+                print(f'DEFORMING FRAME: {ff} took {tocf-ticf:.4f} seconds')
+
+
+def create_frame_sink(id_opts: ImageDefOpts) -> IFrameSink:
+
+    if id_opts.save_format == 'tiff':
+        return TiffFrameSink(id_opts.save_path,id_opts.save_tag)
+    if id_opts.save_format == 'multitiff':
+        return MultiTiffFrameSink(id_opts.save_path / f'{id_opts.save_tag}.tiff',
+                                  id_opts.save_compress)
+    if id_opts.save_format == 'hdf5':
+        return HDF5FrameSink(id_opts.save_path / f'{id_opts.save_tag}.h5',
+                             compress=id_opts.save_compress)
+    if id_opts.save_format == 'zarr':
+        return ZarrFrameSink(id_opts.save_path / f'{id_opts.save_tag}.zarr')
+
+    raise ValueError(f"Save format '{id_opts.save_format}' is not supported, "+
+                     "use 'tiff', 'multitiff', 'hdf5' or 'zarr'.")
+
+
+def get_def_image_shape(camera: CameraData, subsample: int) -> tuple[int,int]:
+    # NOTE: the deformed image is averaged from the subpixel grid
+    (subpx_vec_xm,subpx_vec_ym) = get_subpixel_vec(camera,subsample)
+    return (-(-subpx_vec_ym.shape[0]//subsample),
+            -(-subpx_vec_xm.shape[0]//subsample))
+
+
+def deform_frame(frame: int,
+                 disp: np.ndarray,
+                 upsampled_image: np.ndarray | None,
+                 camera: CameraData,
+                 id_opts: ImageDefOpts,
+                 coords: np.ndarray,
+                 image_mask: np.ndarray | None = None,
+                 connect: dict[str,np.ndarray] | None = None,
+                 disp_interp: TriDispInterp | MeshRasterDispInterp | None = None,
+                 image_coeffs: SplineCoeffs | None = None,
+                 mask_coeffs: SplineCoeffs | None = None
+                 ) -> tuple[int,np.ndarray]:
+    # NOTE: returns the frame number and the deformed image ready to save, the
+    # smaller integer image is what is sent back from process workers
+    if id_opts.def_tile_px > 0:
+        (def_image,_) = deform_one_image_tiled(upsampled_image, # type: ignore
+                                               camera,
+                                               id_opts,
+                                               coords,
+                                               disp,
+                                               image_mask=image_mask,
+                                               connect=connect)
+        return (frame,conv_image_to_save(def_image,camera.bits))
+
+    if disp_interp is None:
+        disp_interp = create_disp_interp(camera,id_opts,connect)
+
+    (def_image,_,_,_,_) = deform_one_image(upsampled_image,
+                                           camera,
+                                           id_opts,
+                                           coords,
+                                           disp,
+                                           image_mask=image_mask,
+                                           print_on=False,
+                                           disp_interp=disp_interp,
+                                           image_coeffs=image_coeffs,
+                                           mask_coeffs=mask_coeffs)
+
+    return (frame,conv_image_to_save(def_image,camera.bits))
+
+
+def deform_images_parallel(upsampled_image: np.ndarray,
+                           camera: CameraData,
+                           id_opts: ImageDefOpts,
+                           coords: np.ndarray,
+                           disp_x: np.ndarray,
+                           disp_y: np.ndarray,
+                           frame_sink: IFrameSink,
+                           image_mask: np.ndarray | None = None,
+                           print_on: bool = False,
+                           connect: dict[str,np.ndarray] | None = None,
+                           image_coeffs: SplineCoeffs | None = None,
+                           mask_coeffs: SplineCoeffs | None = None) -> None:
+
+    # NOTE: frames are written to the sink as they finish so they arrive out
+    # of order, the sink places them using the frame number
+    num_frames = disp_x.shape[1]
+    num_workers = min(id_opts.def_workers,num_frames)
+
+    if id_opts.def_backend == 'thread':
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        shared_arrays = []
+        def submit_frame(ff: int, disp: np.ndarray):
+            return executor.submit(deform_frame,
+                                   ff,
+                                   disp,
+                                   upsampled_image,
+                                   camera,
+                                   id_opts,
+                                   coords,
+                                   image_mask,
+                                   connect,
+                                   image_coeffs=image_coeffs,
+                                   mask_coeffs=mask_coeffs)
+
+    elif id_opts.def_backend == 'process':
+        # NOTE: the large images are placed in shared memory so they are not
+        # pickled for every frame, workers attach to them read only. If the
+        # spline coefficients are given they are shared instead of the image
+        # and the workers are sent the rest of the coefficient data.
+        coeffs_data = None
+        if image_coeffs is None:
+            (image_shm,image_spec) = create_shared_array(upsampled_image)
+        else:
+            (image_shm,image_spec) = create_shared_array(image_coeffs.coeffs)
+            coeffs_data = replace(image_coeffs,coeffs=np.empty(0))
+        shared_arrays = [image_shm]
+        mask_spec = None
+        if image_mask is not None:
+            (mask_shm,mask_spec) = create_shared_array(image_mask)
+            shared_arrays.append(mask_shm)
+
+        executor = ProcessPoolExecutor(max_workers=num_workers,
+                                       initializer=_init_frame_worker,
+                                       initargs=(image_spec,
+                                                 mask_spec,
+                                                 camera,
+                                                 id_opts,
+                                                 coords,
+                                                 connect,
+                                                 coeffs_data))
+        def submit_frame(ff: int, disp: np.ndarray):
+            return executor.submit(_deform_frame_shared,ff,disp)
+
+    else:
+        raise ValueError(f"Parallel backend '{id_opts.def_backend}' is not "+
+                         "supported, use 'process' or 'thread'.")
+
+    try:
+        with executor:
+            futures = [submit_frame(ff,np.array((disp_x[:,ff],disp_y[:,ff])).T)
+                       for ff in range(num_frames)]
+
+            for fut in as_completed(futures):
+                (ff,def_image) = fut.result()
+                frame_sink.write(ff,def_image)
+                if print_on:
+                    print(f'DEFORMED FRAME: {ff}')
+    finally:
+        for shm in shared_arrays:
+            shm.close()
+            shm.unlink()
+
+
+SharedArraySpec = tuple[str,tuple[int,...],str]
+
+def create_shared_array(array: np.ndarray
+                        ) -> tuple[shared_memory.SharedMemory,SharedArraySpec]:
+
+    shm = shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+    shared = np.ndarray(array.shape,dtype=array.dtype,buffer=shm.buf)
+    shared[...] = array
+    return (shm,(shm.name,array.shape,array.dtype.str))
+
+
+def attach_shared_array(spec: SharedArraySpec
+                        ) -> tuple[shared_memory.SharedMemory,np.ndarray]:
+
+    shm = shared_memory.SharedMemory(name=spec[0])
+    array = np.ndarray(spec[1],dtype=np.dtype(spec[2]),buffer=shm.buf)
+    array.flags.writeable = False
+    return (shm,array)
+
+
+# NOTE: state of a deformation process worker, set once by the pool initialiser
+_frame_worker = dict()
+
+def _init_frame_worker(image_spec: SharedArraySpec,
+                       mask_spec: SharedArraySpec | None,
+                       camera: CameraData,
+                       id_opts: ImageDefOpts,
+                       coords: np.ndarray,
+                       connect: dict[str,np.ndarray] | None = None,
+                       coeffs_data: SplineCoeffs | None = None) -> None:
+
+    (_frame_worker['image_shm'],
+     shared_image) = attach_shared_array(image_spec)
+
+    _frame_worker['image_mask'] = None
+    if mask_spec is not None:
+        (_frame_worker['mask_shm'],
+         _frame_worker['image_mask']) = attach_shared_array(mask_spec)
+
+    _frame_worker['upsampled_image'] = shared_image
+    _frame_worker['image_coeffs'] = None
+    _frame_worker['mask_coeffs'] = None
+    if coeffs_data is not None:
+        # NOTE: the shared array is the image spline coefficients, the mask is
+        # only pixel resolution so each worker filters its own
+        _frame_worker['upsampled_image'] = None
+        _frame_worker['image_coeffs'] = replace(coeffs_data,coeffs=shared_image)
+        if _frame_worker['image_mask'] is not None and id_opts.def_complex_geom:
+            _frame_worker['mask_coeffs'] = calc_mask_coeffs(
+                _frame_worker['image_mask'])
+
+    _frame_worker['camera'] = camera
+    _frame_worker['id_opts'] = id_opts
+    _frame_worker['coords'] = coords
+    _frame_worker['connect'] = connect
+    # NOTE: each worker keeps its own interpolator so it can reuse triangles,
+    # tiled deformation interpolates each tile separately
+    _frame_worker['disp_interp'] = None
+    if id_opts.def_tile_px <= 0:
+        _frame_worker['disp_interp'] = create_disp_interp(camera,id_opts,connect)
+
+
+def _deform_frame_shared(frame: int, disp: np.ndarray
+                         ) -> tuple[int,np.ndarray]:
+    return deform_frame(frame,
+                        disp,
+                        _frame_worker['upsampled_image'],
+                        _frame_worker['camera'],
+                        _frame_worker['id_opts'],
+                        _frame_worker['coords'],
+                        _frame_worker['image_mask'],
+                        connect=_frame_worker['connect'],
+                        disp_interp=_frame_worker['disp_interp'],
+                        image_coeffs=_frame_worker['image_coeffs'],
+                        mask_coeffs=_frame_worker['mask_coeffs'])
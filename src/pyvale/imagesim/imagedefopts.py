@@ -21,6 +21,17 @@ class ImageDefOpts:
     save_path: Path = Path.cwd() / 'deformed_images'
     save_tag: str = 'defimage'
 
+    # Output for the deformed images: 'tiff' one file per frame, 'multitiff' a
+    # multi-page BigTIFF (needs tifffile), 'hdf5' (needs h5py) or 'zarr'
+    # (needs zarr) a (frames,rows,cols) stack chunked by frame. A frame sink
+    # passed to deform_images is used instead, e.g. MemoryFrameSink.
+    save_format: str = 'tiff'
+    # Lossless compression for 'multitiff' and 'hdf5', zarr always compresses
+    save_compress: bool = False
+    # Frames waiting to be written by the background writer thread so
+    # deformation and writing overlap, 0 writes in the deformation loop
+    save_queue_frames: int = 4
+
     # Use this if starting with a full speckle or grid to create an
     # an artificial image with just the specimen geom
     mask_input_image: bool = True
@@ -53,17 +64,42 @@ class ImageDefOpts:
     fe_extrap_outside_fov: bool = True # forces displacements outside the
     # specimen area to be padded with border values
 
+    # Engine for 'linear' displacement interpolation: 'tri' triangulates the
+    # deformed nodes once per frame and shares the weights between both
+    # displacement components (same result as griddata), 'mesh' uses the FE
+    # connectivity passed to deform_images as the triangles, 'raster' evaluates
+    # the FE shape functions of each element directly on the subpixel grid so
+    # nothing is interpolated across holes, 'griddata' calls scipy griddata
+    # for each component
+    fe_interp_engine: str = 'tri'
+
+    # Keep the triangles and subpixel locations between frames and only locate
+    # subpixels that leave their triangle, useful for small strains. The 'mesh'
+    # engine always does this.
+    fe_interp_reuse_tri: bool = False
+
     # Subsampling used to split each pixel in the input image
     subsample: int = 3
 
-    # Interpolation used to upsample the input image: scipy-interp2d
+    # Interpolation used to upsample the input image: 'linear', 'cubic' or
+    # 'quintic' interpolating spline, scipy-RectBivariateSpline
     image_upsamp_interp: str = 'cubic'
 
+    # Upsample the input image in square tiles with this many pixels per side
+    # to bound memory for large images, 0 upsamples the whole image at once
+    image_upsamp_tile_px: int = 0
+
     # Order of interpolant used to deform the image: scipy.ndimage.map_coords
     image_def_order: int = 3
     image_def_extrap: str = 'nearest'
     image_def_extval: float = 0.0 # only used if above is 'constant'
 
+    # Deform each frame in square tiles with this many pixels per side so
+    # peak memory is set by the tile rather than the sensor size, 0 deforms
+    # the whole frame at once. Displacements are interpolated for each tile
+    # and fe_interp_reuse_tri is not used.
+    def_tile_px: int = 0
+
     # Used to deal with holes and notches - if the specimen is just a
     # rectangle this can be set to false. Allows for an image mask which is
     # also deformed and applied to the deformed image
@@ -71,5 +107,10 @@ class ImageDefOpts:
 
     #----------------------------------------------------------------------
     # PARALLELISATION OPTIONS
+    # Number of frames deformed at the same time, 1 deforms the frames
+    # sequentially in the calling process
+    def_workers: int = 1
 
-
+    # Pool used when def_workers > 1: 'process' or 'thread'. The upsampled
+    # image and mask are shared with process workers through shared memory
+    def_backend: str = 'process'
@@ -0,0 +1,59 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from dataclasses import dataclass
+import numpy as np
+from scipy import ndimage
+
+
+@dataclass
+class SplineCoeffs:
+    """Spline prefilter coefficients of an image for ndimage.map_coordinates,
+    calculated once so every frame samples them with prefilter off.
+    """
+    coeffs: np.ndarray
+    order: int
+    mode: str
+    cval: float = 0.0
+    npad: int = 0
+
+
+def calc_spline_coeffs(image: np.ndarray,
+                       order: int,
+                       mode: str,
+                       cval: float = 0.0) -> SplineCoeffs:
+
+    # NOTE: same prefilter as map_coordinates so sampling the coefficients
+    # gives an identical result, scipy pads the 'nearest' and 'grid-constant'
+    # modes before filtering so the same is done here
+    if order <= 1:
+        return SplineCoeffs(image,order,mode,cval)
+
+    npad = 0
+    padded = image
+    if mode == 'nearest':
+        npad = 12
+        padded = np.pad(image,npad,mode='edge')
+    elif mode == 'grid-constant':
+        npad = 12
+        padded = np.pad(image,npad,mode='constant',constant_values=cval)
+
+    coeffs = ndimage.spline_filter(padded,order,output=np.float64,mode=mode)
+    return SplineCoeffs(coeffs,order,mode,cval,npad)
+
+
+def map_coords_spline(spline_coeffs: SplineCoeffs,
+                      coords_row: np.ndarray,
+                      coords_col: np.ndarray) -> np.ndarray:
+
+    return ndimage.map_coordinates(spline_coeffs.coeffs,
+                                   [coords_row + spline_coeffs.npad,
+                                    coords_col + spline_coeffs.npad],
+                                   prefilter=False,
+                                   order=spline_coeffs.order,
+                                   mode=spline_coeffs.mode,
+                                   cval=spline_coeffs.cval)
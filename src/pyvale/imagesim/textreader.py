@@ -6,6 +6,14 @@ License: MIT
 Copyright (C) 2024 The Computer Aided Validation Team
 ================================================================================
 '''
+import numpy as np
+
+# Lookup of bytes that cannot be part of a plain decimal or exponent number
+# such as -0.47336E-006, anything else such as nan or inf is left to float()
+# in the tolerant reader
+_NOT_NUM_CHAR = np.ones(256,dtype=np.bool_)
+_NOT_NUM_CHAR[np.frombuffer(b'0123456789+-.eE \t\r\n',dtype=np.uint8)] = False
+
 
 def is_float(value):
     try:
@@ -95,87 +103,158 @@ def read_data_by_spec(file_path,val_spec,max_len):
         all_lines = data_file.readlines()
 
         data_array = []
-        line_num = 0
         for ss in all_lines:
-            ss = ss.strip()
-            # If the string isn't empty it could be the data we want to read in
-            if ss:
-                split_line = ss.split()
-
-                # Count the number of strings in the split that can be converted
-                # to floats and the lengths of the strings
-                check_float = check_list_float(split_line)
-                check_len = check_list_len(split_line,max_len)
-
-                missing_vals = sum(val_spec) - sum(check_float)
-
-                # If the line matches the number and position of floats we are
-                # expecting per line then we can read in the data.
-                if check_float == val_spec:
-                    data_row = []
-                    # Go through the split line and extract the values based on the
-                    # val_spec flags
-                    for ii in range(len(split_line)):
-                        if val_spec[ii]:
-                            data_row.append(float(split_line[ii]))
-
-                    # Append the row of data to the overall data array
-                    data_array.append(data_row)
-
-                # If there is a numeric value and one of the strings is longer than
-                # expected there might be numeric data to partition
-                elif missing_vals > 0 and sum(check_len) > 0:
-                    data_row = []
-
-                    # Based on how many long strings we have try to split all of
-                    # them and put the whole thing into a list
-                    temp_line = []
-                    for sl in split_line:
-                        # If the string is too long there is a problem to fix
-                        if len(sl) > max_len:
-                            # Split the string into equal parts
-                            if (len(sl)/max_len).is_integer():
-                                str_parts = [sl[pp:pp+max_len] for pp in range(0, len(sl), max_len)]
-                                for sp in str_parts:
-                                    temp_line.append(sp)
-                            else:
-                                temp_str = sl
-                                str_parts = []
-                                prev_split = 0
-                                for cc in range(len(temp_str)-1):
-                                    # if the next character is a minus then this
-                                    # might have replaced whitespace between numbers
-                                    # but we need to ignore '-' with 'e'
-                                    if temp_str[cc+1] == '-' and is_float(temp_str[cc]):
-                                        str_parts.append(temp_str[prev_split:cc+1])
-                                        prev_split = cc+1
-
-                                # At the end of the loop we grab the last string
-                                if prev_split != len(temp_str):
-                                    str_parts.append(temp_str[prev_split:len(temp_str)])
-
-                                # Push all split strings onto the data line
-                                for sp in str_parts:
-                                    temp_line.append(sp)
-
-                        # If there isn't a problem put the string onto the line
-                        else:
-                            temp_line.append(sl)
-
-                    # Go through separated strings and check if we can convert
-                    check_float_again =  check_list_float(temp_line)
-                    if check_float_again == val_spec:
-                        for tl in temp_line:
-                            if is_float(tl):
-                                data_row.append(float(tl))
-
-                    # Check that the data row has the expected number of values,
-                    # if so append it to the data array
-                    if len(data_row) == sum(val_spec):
-                        data_array.append(data_row)
-
-            # Increment the line number for error checking
-            line_num += 1
+            data_row = read_line_by_spec(ss,val_spec,max_len)
+            if data_row is not None:
+                data_array.append(data_row)
 
         # Send back the data list we have read in
-        return data_array
\ No newline at end of file
+        return data_array
+
+
+def read_line_by_spec(ss,val_spec,max_len):
+    ss = ss.strip()
+    # If the string is empty there is no data to read in
+    if not ss:
+        return None
+
+    split_line = ss.split()
+
+    # Count the number of strings in the split that can be converted
+    # to floats and the lengths of the strings
+    check_float = check_list_float(split_line)
+    check_len = check_list_len(split_line,max_len)
+
+    missing_vals = sum(val_spec) - sum(check_float)
+
+    # If the line matches the number and position of floats we are
+    # expecting per line then we can read in the data.
+    if check_float == val_spec:
+        data_row = []
+        # Go through the split line and extract the values based on the
+        # val_spec flags
+        for ii in range(len(split_line)):
+            if val_spec[ii]:
+                data_row.append(float(split_line[ii]))
+
+        return data_row
+
+    # If there is a numeric value and one of the strings is longer than
+    # expected there might be numeric data to partition
+    if missing_vals > 0 and sum(check_len) > 0:
+        data_row = []
+
+        # Based on how many long strings we have try to split all of
+        # them and put the whole thing into a list
+        temp_line = []
+        for sl in split_line:
+            # If the string is too long there is a problem to fix
+            if len(sl) > max_len:
+                # Split the string into equal parts
+                if (len(sl)/max_len).is_integer():
+                    str_parts = [sl[pp:pp+max_len] for pp in range(0, len(sl), max_len)]
+                    for sp in str_parts:
+                        temp_line.append(sp)
+                else:
+                    temp_str = sl
+                    str_parts = []
+                    prev_split = 0
+                    for cc in range(len(temp_str)-1):
+                        # if the next character is a minus then this
+                        # might have replaced whitespace between numbers
+                        # but we need to ignore '-' with 'e'
+                        if temp_str[cc+1] == '-' and is_float(temp_str[cc]):
+                            str_parts.append(temp_str[prev_split:cc+1])
+                            prev_split = cc+1
+
+                    # At the end of the loop we grab the last string
+                    if prev_split != len(temp_str):
+                        str_parts.append(temp_str[prev_split:len(temp_str)])
+
+                    # Push all split strings onto the data line
+                    for sp in str_parts:
+                        temp_line.append(sp)
+
+            # If there isn't a problem put the string onto the line
+            else:
+                temp_line.append(sl)
+
+        # Go through separated strings and check if we can convert
+        check_float_again =  check_list_float(temp_line)
+        if check_float_again == val_spec:
+            for tl in temp_line:
+                if is_float(tl):
+                    data_row.append(float(tl))
+
+        # Check that the data row has the expected number of values,
+        # if so return it as a row of data
+        if len(data_row) == sum(val_spec):
+            return data_row
+
+    return None
+
+
+def read_array_by_spec(file_path,val_spec,max_len):
+    """Same result as read_data_by_spec as a (n_rows,n_vals) array. Every line
+    of the file is classified at once on the raw bytes: lines holding only
+    number characters with one token per value, nearly every line of a well
+    formed ANSYS file, are converted to floats in bulk. Only headers and lines
+    where ANSYS has run numbers together go through the tolerant line by line
+    reader.
+    """
+    n_vals = sum(val_spec)
+    # NOTE: the bulk path can only keep every value on the line
+    if not all(val_spec):
+        return np.array(read_data_by_spec(file_path,val_spec,max_len),
+                        dtype=np.float64).reshape(-1,n_vals)
+
+    with open(file_path,'rb') as data_file:
+        raw = data_file.read()
+    if not raw.endswith(b'\n'):
+        raw = raw + b'\n'
+    data = np.frombuffer(raw,dtype=np.uint8)
+
+    # Carriage returns end a line as they do for a file opened in text mode
+    is_newline = (data == ord('\n')) | (data == ord('\r'))
+    line_ends = np.flatnonzero(is_newline)
+    line_starts = np.concatenate(([0],line_ends[:-1]+1))
+
+    is_space = is_newline | (data == ord(' ')) | (data == ord('\t'))
+    tok_starts = ~is_space
+    tok_starts[1:] &= is_space[:-1]
+
+    n_bad = _count_in_lines(_NOT_NUM_CHAR[data],line_ends)
+    n_toks = _count_in_lines(tok_starts,line_ends)
+    bulk_lines = (n_bad == 0) & (n_toks == n_vals)
+
+    try:
+        in_bulk = np.repeat(bulk_lines,line_ends - line_starts + 1)
+        bulk_data = np.array(data[in_bulk].tobytes().split(),
+                             dtype=np.float64).reshape(-1,n_vals)
+    except ValueError:
+        # Number characters that are not a number, e.g. '1-2' or '--1'
+        bulk_lines[:] = False
+        bulk_data = np.zeros((0,n_vals),dtype=np.float64)
+
+    tol_inds = []
+    tol_rows = []
+    for ii in np.flatnonzero(~bulk_lines & (n_toks > 0)):
+        ss = raw[line_starts[ii]:line_ends[ii]].decode()
+        data_row = read_line_by_spec(ss,val_spec,max_len)
+        if data_row is not None:
+            tol_inds.append(ii)
+            tol_rows.append(data_row)
+
+    if not tol_rows:
+        return bulk_data
+
+    # Put the rows from the tolerant reader back in file order
+    tol_data = np.array(tol_rows,dtype=np.float64).reshape(-1,n_vals)
+    order = np.argsort(np.concatenate((np.flatnonzero(bulk_lines),tol_inds)),
+                       kind='stable')
+    return np.concatenate((bulk_data,tol_data),axis=0)[order,:]
+
+
+def _count_in_lines(flags,line_ends):
+    flag_lines = np.searchsorted(line_ends,np.flatnonzero(flags))
+    return np.bincount(flag_lines,minlength=line_ends.shape[0])
@@ -0,0 +1,193 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import hashlib
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pyvista as pv
+from scipy.spatial import cKDTree
+
+# NOTE: points within this fraction of the cell size of a cell are taken to be
+# in it, same as the vtk probe filter, so points on surface meshes that are
+# not axis aligned are found despite round off out of the surface
+CELL_TOL = 1e-3
+
+
+class CellIndex:
+    """Spatial index over the cell bounding boxes of an unstructured mesh for
+    locating any batch of points without the vtk cell locator. Cells are put
+    in levels by the size of their bounding box and each level has a KD-tree
+    of the box centres, so a query only returns cells whose box is near the
+    point even on strongly graded meshes. A KD-tree of the nodes gives the
+    nearest node for points just outside the mesh. The index can be saved to
+    disk and loaded for the same mesh.
+    """
+    def __init__(self,
+                 pyvista_grid: pv.UnstructuredGrid,
+                 query_near: int = 16) -> None:
+
+        self._query_near = query_near
+        self._mesh_key = grid_hash(pyvista_grid)
+        self._n_nodes = pyvista_grid.n_points
+        self._bounds = calc_cell_bounds(pyvista_grid)
+
+        centres = 0.5*(self._bounds[:,:,0] + self._bounds[:,:,1])
+        half_diags = 0.5*np.linalg.norm(self._bounds[:,:,1]
+                                        - self._bounds[:,:,0],axis=1)
+
+        # NOTE: level radius is at most twice the box size of any cell in it,
+        # widened to include the tolerance on the boxes
+        min_half_diag = np.min(half_diags[half_diags > 0.0],initial=1.0)
+        cell_levels = np.ceil(np.log2(np.maximum(half_diags/min_half_diag,1.0)))
+        cell_levels = cell_levels.astype(np.int64)
+
+        self._level_cells = list()
+        self._level_radii = list()
+        self._level_trees = list()
+        for ll in np.unique(cell_levels):
+            level_cells = np.flatnonzero(cell_levels == ll)
+            self._level_cells.append(level_cells)
+            self._level_radii.append((1.0 + 4.0*CELL_TOL)
+                                     *float(np.max(half_diags[level_cells])))
+            self._level_trees.append(cKDTree(centres[level_cells]))
+
+        self._node_tree = cKDTree(np.asarray(pyvista_grid.points))
+
+    def get_mesh_key(self) -> str:
+        return self._mesh_key
+
+    def get_num_cells(self) -> int:
+        return self._bounds.shape[0]
+
+    def get_num_nodes(self) -> int:
+        return self._n_nodes
+
+    def get_cell_bounds(self) -> np.ndarray:
+        return self._bounds
+
+    def find_candidate_cells(self, points: np.ndarray
+                             ) -> tuple[np.ndarray,np.ndarray]:
+        # NOTE: returns (point,cell) index pairs sorted by point for every cell
+        # with a bounding box containing the point, boxes are widened by
+        # CELL_TOL of their diagonal so flat boxes of surface cells have depth
+        point_inds = list()
+        cell_inds = list()
+        for (cells,radius,tree) in zip(self._level_cells,
+                                       self._level_radii,
+                                       self._level_trees):
+            # Nearest box centres in one vectorised query, points with more
+            # boxes in range than were returned are searched again in full
+            n_near = min(self._query_near,cells.shape[0])
+            (_,near_inds) = tree.query(points,
+                                       k=n_near,
+                                       distance_upper_bound=radius)
+            near_inds = near_inds.reshape(points.shape[0],n_near)
+            in_range = near_inds < cells.shape[0]
+            (near_points,near_cols) = np.nonzero(in_range)
+            point_inds.append(near_points)
+            cell_inds.append(cells[near_inds[near_points,near_cols]])
+
+            full_points = np.flatnonzero(in_range[:,-1])
+            if full_points.shape[0] == 0 or n_near == cells.shape[0]:
+                continue
+
+            near_lists = tree.query_ball_point(points[full_points],radius)
+            near_counts = np.fromiter((len(nn) for nn in near_lists),
+                                      dtype=np.int64,
+                                      count=full_points.shape[0])
+            point_inds[-1] = np.concatenate(
+                (near_points[~in_range[near_points,-1]],
+                 np.repeat(full_points,near_counts)))
+            cell_inds[-1] = np.concatenate(
+                (cell_inds[-1][~in_range[near_points,-1]],
+                 cells[np.concatenate(near_lists).astype(np.int64)]))
+
+        point_inds = np.concatenate(point_inds)
+        cell_inds = np.concatenate(cell_inds)
+
+        bounds = self._bounds[cell_inds]
+        box_tol = CELL_TOL*np.linalg.norm(bounds[:,:,1] - bounds[:,:,0],
+                                          axis=1)[:,np.newaxis]
+        cand_points = points[point_inds]
+        in_box = np.all((cand_points >= bounds[:,:,0] - box_tol)
+                        & (cand_points <= bounds[:,:,1] + box_tol),axis=1)
+
+        point_inds = point_inds[in_box]
+        cell_inds = cell_inds[in_box]
+        order = np.lexsort((cell_inds,point_inds))
+        return (point_inds[order],cell_inds[order])
+
+    def find_nearest_nodes(self, points: np.ndarray
+                           ) -> tuple[np.ndarray,np.ndarray]:
+        (dists,nodes) = self._node_tree.query(points)
+        return (dists,nodes)
+
+    def save(self, save_file: Path) -> None:
+        with open(save_file,'wb') as index_file:
+            pickle.dump(self,index_file,protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_cell_index(load_file: Path,
+                    pyvista_grid: pv.UnstructuredGrid) -> CellIndex | None:
+    # NOTE: returns None if the saved index was built for a different mesh
+    with open(load_file,'rb') as index_file:
+        cell_index = pickle.load(index_file)
+
+    if (not isinstance(cell_index,CellIndex)
+        or cell_index.get_mesh_key() != grid_hash(pyvista_grid)):
+        return None
+
+    return cell_index
+
+
+def create_cell_index(pyvista_grid: pv.UnstructuredGrid,
+                      index_file: Path | None = None) -> CellIndex:
+    # Loads the index if it has been saved for this mesh, otherwise builds it
+    # and saves it for next time
+    if index_file is not None and index_file.is_file():
+        cell_index = load_cell_index(index_file,pyvista_grid)
+        if cell_index is not None:
+            return cell_index
+
+    cell_index = CellIndex(pyvista_grid)
+    if index_file is not None:
+        cell_index.save(index_file)
+
+    return cell_index
+
+
+def calc_cell_bounds(pyvista_grid: pv.UnstructuredGrid) -> np.ndarray:
+    # NOTE: returns (n_cells,3,2) with the min and max coordinate of each cell
+    points = np.asarray(pyvista_grid.points,dtype=np.float64)
+    connectivity = np.asarray(pyvista_grid.cell_connectivity)
+    offsets = get_cell_offsets(pyvista_grid)[:-1]
+
+    cell_points = points[connectivity]
+    bounds = np.empty((offsets.shape[0],3,2),dtype=np.float64)
+    bounds[:,:,0] = np.minimum.reduceat(cell_points,offsets,axis=0)
+    bounds[:,:,1] = np.maximum.reduceat(cell_points,offsets,axis=0)
+    return bounds
+
+
+def grid_hash(pyvista_grid: pv.UnstructuredGrid) -> str:
+    grid_hasher = hashlib.sha1()
+    for arr in (pyvista_grid.points,
+                pyvista_grid.cell_connectivity,
+                get_cell_offsets(pyvista_grid),
+                pyvista_grid.celltypes):
+        arr = np.ascontiguousarray(arr)
+        grid_hasher.update(f'{arr.dtype.str}{arr.shape}'.encode())
+        grid_hasher.update(arr.tobytes())
+
+    return grid_hasher.hexdigest()
+
+
+def get_cell_offsets(pyvista_grid: pv.UnstructuredGrid) -> np.ndarray:
+    # NOTE: read from vtk as the pyvista name for the offsets has changed
+    return np.asarray(pv.convert_array(pyvista_grid.GetCells().GetOffsetsArray()))
@@ -0,0 +1,130 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import netCDF4 as nc
+from pyvista import CellType
+
+
+@dataclass(frozen=True)
+class ElemType:
+    cell_type: int
+    n_corners: int
+    corner_cell_type: int
+    # Maps exodus node ordering to vtk node ordering, None if they are the same
+    node_order: tuple[int,...] | None = None
+
+
+# NOTE: higher order exodus hex and wedge elements list the vertical edge nodes
+# before the top face edge nodes, vtk has the top face edges first. Exodus
+# HEX27 then has the centre node and the z-,z+,x-,x+,y-,y+ face nodes, vtk has
+# the x-,x+,y-,y+,z-,z+ face nodes then the centre node.
+ELEM_TYPE_TABLE: dict[tuple[str,int],ElemType] = {
+    ('BAR',2): ElemType(CellType.LINE,2,CellType.LINE),
+    ('BAR',3): ElemType(CellType.QUADRATIC_EDGE,2,CellType.LINE),
+    ('TRI',3): ElemType(CellType.TRIANGLE,3,CellType.TRIANGLE),
+    ('TRI',6): ElemType(CellType.QUADRATIC_TRIANGLE,3,CellType.TRIANGLE),
+    ('TRI',7): ElemType(CellType.BIQUADRATIC_TRIANGLE,3,CellType.TRIANGLE),
+    ('QUAD',4): ElemType(CellType.QUAD,4,CellType.QUAD),
+    ('QUAD',8): ElemType(CellType.QUADRATIC_QUAD,4,CellType.QUAD),
+    ('QUAD',9): ElemType(CellType.BIQUADRATIC_QUAD,4,CellType.QUAD),
+    ('TET',4): ElemType(CellType.TETRA,4,CellType.TETRA),
+    ('TET',10): ElemType(CellType.QUADRATIC_TETRA,4,CellType.TETRA),
+    ('PYRAMID',5): ElemType(CellType.PYRAMID,5,CellType.PYRAMID),
+    ('PYRAMID',13): ElemType(CellType.QUADRATIC_PYRAMID,5,CellType.PYRAMID),
+    ('WEDGE',6): ElemType(CellType.WEDGE,6,CellType.WEDGE),
+    ('WEDGE',15): ElemType(CellType.QUADRATIC_WEDGE,6,CellType.WEDGE,
+                           (0,1,2,3,4,5,6,7,8,12,13,14,9,10,11)),
+    ('HEX',8): ElemType(CellType.HEXAHEDRON,8,CellType.HEXAHEDRON),
+    ('HEX',20): ElemType(CellType.QUADRATIC_HEXAHEDRON,8,CellType.HEXAHEDRON,
+                         (0,1,2,3,4,5,6,7,8,9,10,11,16,17,18,19,12,13,14,15)),
+    ('HEX',27): ElemType(CellType.TRIQUADRATIC_HEXAHEDRON,8,CellType.HEXAHEDRON,
+                         (0,1,2,3,4,5,6,7,8,9,10,11,16,17,18,19,12,13,14,15,
+                          23,24,25,26,21,22,20)),
+}
+
+ELEM_FAMILIES: dict[str,str] = {
+    'BAR': 'BAR',
+    'BEAM': 'BAR',
+    'TRUSS': 'BAR',
+    'EDGE': 'BAR',
+    'TRI': 'TRI',
+    'TRIANGLE': 'TRI',
+    'TRISHELL': 'TRI',
+    'QUAD': 'QUAD',
+    'SHELL': 'QUAD',
+    'TET': 'TET',
+    'TETRA': 'TET',
+    'PYRAMID': 'PYRAMID',
+    'WEDGE': 'WEDGE',
+    'HEX': 'HEX',
+    'HEXAHEDRON': 'HEX',
+}
+
+# Element families assumed when the exodus element name is not known
+ELEM_FAMILY_BY_NODES: dict[tuple[int,int],str] = {
+    (2,2): 'BAR',
+    (2,3): 'TRI',
+    (2,4): 'QUAD',
+    (2,6): 'TRI',
+    (2,7): 'TRI',
+    (2,8): 'QUAD',
+    (2,9): 'QUAD',
+    (3,4): 'TET',
+    (3,5): 'PYRAMID',
+    (3,6): 'WEDGE',
+    (3,8): 'HEX',
+    (3,10): 'TET',
+    (3,13): 'PYRAMID',
+    (3,15): 'WEDGE',
+    (3,20): 'HEX',
+    (3,27): 'HEX',
+}
+
+
+def get_elem_type(nodes_per_elem: int,
+                  spat_dim: int,
+                  elem_name: str | None = None) -> ElemType | None:
+
+    if elem_name is None:
+        family = ELEM_FAMILY_BY_NODES.get((spat_dim,nodes_per_elem),None)
+    else:
+        family = ELEM_FAMILIES.get(elem_name.strip().upper().rstrip('0123456789'),
+                                   None)
+
+    if family is None:
+        return None
+
+    return ELEM_TYPE_TABLE.get((family,nodes_per_elem),None)
+
+
+def read_exodus_elem_types(exodus_path: Path) -> dict[str,str]:
+    # NOTE: keys match the connectivity keys in mh.SimData e.g. 'connect1'
+    elem_types = dict()
+    with nc.Dataset(exodus_path) as exodus_data:
+        for kk,vv in exodus_data.variables.items():
+            if kk.startswith('connect') and 'elem_type' in vv.ncattrs():
+                elem_types[kk] = str(vv.elem_type)
+
+    return elem_types
+
+
+def conv_exodus_connect(connect: np.ndarray,
+                        elem_type: ElemType,
+                        corner_nodes_only: bool = False) -> np.ndarray:
+
+    # NOTE: exodus always lists the corner nodes first
+    if corner_nodes_only:
+        return connect[:elem_type.n_corners,:]
+
+    if elem_type.node_order is not None:
+        return connect[np.array(elem_type.node_order),:]
+
+    return connect
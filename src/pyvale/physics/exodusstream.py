@@ -0,0 +1,199 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from pathlib import Path
+
+import numpy as np
+import netCDF4 as nc
+
+import mooseherder as mh
+
+from pyvale.physics.field import FieldError
+from pyvale.physics.elemtypes import read_exodus_elem_types
+from pyvale.physics.fieldmesh import FieldMesh
+from pyvale.physics.lazyfield import LazyField, NodalStepStore
+from pyvale.physics.timeinterp import TimeInterpolator, TimeKernel
+
+
+class ExodusStepReader:
+    """Reads nodal variables from an exodus file a block of time steps at a
+    time so the full nodal history is never held in memory.
+    """
+    def __init__(self, exodus_path: Path) -> None:
+
+        if not exodus_path.is_file():
+            raise FileNotFoundError(f"Exodus file not found at: {exodus_path}")
+
+        self._exodus_path = exodus_path
+        self._data = nc.Dataset(str(exodus_path))
+
+        self._node_var_keys = dict()
+        if 'name_nod_var' in self._data.variables:
+            names = nc.chartostring(np.array(self._data.variables['name_nod_var']))
+            for ii,nn in enumerate(names):
+                self._node_var_keys[str(nn)] = f'vals_nod_var{ii+1:d}'
+
+    def get_exodus_path(self) -> Path:
+        return self._exodus_path
+
+    def get_node_var_names(self) -> tuple[str,...]:
+        return tuple(self._node_var_keys.keys())
+
+    def get_time_steps(self) -> np.ndarray:
+        return np.array(self._data.variables['time_whole'])
+
+    def get_num_time_steps(self) -> int:
+        return self._data.variables['time_whole'].shape[0]
+
+    def get_num_nodes(self) -> int:
+        return self._data.dimensions['num_nodes'].size
+
+    def get_elem_types(self) -> dict[str,str]:
+        return read_exodus_elem_types(self._exodus_path)
+
+    def read_mesh_sim_data(self) -> mh.SimData:
+        # NOTE: only the time steps, coordinates and connectivity are read
+        exodus_reader = mh.ExodusReader(self._exodus_path)
+        sim_data = mh.SimData()
+        sim_data.time = self.get_time_steps()
+        (sim_data.coords,sim_data.num_spat_dims) = exodus_reader.get_coords()
+        sim_data.connect = exodus_reader.get_connectivity()
+        return sim_data
+
+    def read_node_vars(self,
+                       components: tuple[str,...],
+                       step_start: int,
+                       step_end: int) -> dict[str,np.ndarray]:
+        # NOTE: returns (n_nodes,n_steps) arrays to match mh.SimData.node_vars
+        return self._read_node_vars(components,slice(step_start,step_end))
+
+    def read_node_vars_at_steps(self,
+                                components: tuple[str,...],
+                                steps: np.ndarray) -> dict[str,np.ndarray]:
+        # NOTE: steps must be increasing, only these time steps are read from
+        # the file however far apart they are
+        steps = np.asarray(steps,dtype=np.int64)
+        if steps.shape[0] > 0 and steps[-1]-steps[0]+1 == steps.shape[0]:
+            return self.read_node_vars(components,steps[0],steps[-1]+1)
+
+        return self._read_node_vars(components,steps)
+
+    def _read_node_vars(self,
+                        components: tuple[str,...],
+                        steps: slice | np.ndarray) -> dict[str,np.ndarray]:
+        node_vars = dict()
+        for cc in components:
+            if cc not in self._node_var_keys:
+                raise FieldError(f"Node variable '{cc}' not found in exodus "+
+                                 f"file: {self._exodus_path}")
+
+            node_vars[cc] = np.asarray(
+                self._data.variables[self._node_var_keys[cc]][steps,:]).T
+
+        return node_vars
+
+    def close(self) -> None:
+        self._data.close()
+
+    def __enter__(self) -> 'ExodusStepReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def create_lazy_field_from_exodus(exodus_path: Path,
+                                  field_key: str,
+                                  components: tuple[str,...],
+                                  spat_dim: int,
+                                  chunk_steps: int = 16,
+                                  store_dir: Path | None = None,
+                                  cache_steps: int = 8,
+                                  time_interp: str | TimeKernel = 'linear',
+                                  corner_nodes_only: bool = False,
+                                  mesh: FieldMesh | None = None) -> LazyField:
+
+    with ExodusStepReader(exodus_path) as step_reader:
+        sim_data = step_reader.read_mesh_sim_data()
+
+        store = NodalStepStore(components,
+                               step_reader.get_num_nodes(),
+                               step_reader.get_num_time_steps(),
+                               store_dir,
+                               cache_steps)
+
+        n_time_steps = step_reader.get_num_time_steps()
+        for ss in range(0,n_time_steps,chunk_steps):
+            step_end = min(ss+chunk_steps,n_time_steps)
+            node_vars = step_reader.read_node_vars(components,ss,step_end)
+            for cc in components:
+                store.set_steps(cc,ss,node_vars[cc])
+
+        store.flush()
+
+    return LazyField(sim_data,
+                     field_key,
+                     components,
+                     spat_dim,
+                     chunk_steps=chunk_steps,
+                     time_interp=time_interp,
+                     elem_types=read_exodus_elem_types(exodus_path),
+                     corner_nodes_only=corner_nodes_only,
+                     mesh=mesh,
+                     store=store)
+
+
+def stream_exodus_truth(exodus_path: Path,
+                        components: tuple[str,...],
+                        spat_dim: int,
+                        sample_points: np.ndarray,
+                        sample_times: np.ndarray | None = None,
+                        chunk_steps: int = 16,
+                        time_interp: str | TimeKernel = 'linear',
+                        mesh: FieldMesh | None = None) -> np.ndarray:
+    # NOTE: samples the exodus file directly without an on-disk store, if
+    # sample_times are given only the time steps required are read. At most
+    # chunk_steps time steps of the nodal data are held in memory at once.
+    with ExodusStepReader(exodus_path) as step_reader:
+        if mesh is None:
+            mesh = FieldMesh(step_reader.read_mesh_sim_data(),
+                             spat_dim,
+                             step_reader.get_elem_types())
+
+        if mesh.get_num_nodes() != step_reader.get_num_nodes():
+            raise FieldError("Field mesh does not have the same number of "+
+                             f"nodes as the exodus file: {exodus_path}")
+
+        sampler = mesh.get_sampler(sample_points)
+        time_steps = step_reader.get_time_steps()
+        n_time_steps = time_steps.shape[0]
+
+        if sample_times is None:
+            sample_steps = np.arange(n_time_steps)
+        else:
+            time_interpolator = TimeInterpolator(time_steps,
+                                                 sample_times,
+                                                 time_interp)
+            sample_steps = time_interpolator.get_required_steps()
+
+        sample_at_sim_time = np.zeros((sampler.get_num_points(),
+                                       len(components),
+                                       n_time_steps))
+
+        for ss in range(0,sample_steps.shape[0],chunk_steps):
+            chunk_steps_inds = sample_steps[ss:ss+chunk_steps]
+            node_vars = step_reader.read_node_vars_at_steps(components,
+                                                            chunk_steps_inds)
+
+            for ii,cc in enumerate(components):
+                sample_at_sim_time[:,ii,chunk_steps_inds] = sampler.sample(
+                    node_vars[cc])
+
+    if sample_times is None:
+        return sample_at_sim_time
+
+    return time_interpolator.interp(sample_at_sim_time)
@@ -8,10 +8,15 @@ Copyright (C) 2024 The Computer Aided Validation Team
 from abc import ABC, abstractmethod
 import numpy as np
 import pyvista as pv
-from pyvista import CellType
 
 import mooseherder as mh
 
+from pyvale.physics.elemtypes import (ElemType,
+                                      get_elem_type,
+                                      conv_exodus_connect)
+from pyvale.physics.fieldsampler import PointSampler
+from pyvale.physics.timeinterp import TimeInterpolator, TimeKernel
+
 
 class FieldError(Exception):
     pass
@@ -21,10 +26,22 @@ class IField(ABC):
     def get_time_steps(self) -> np.ndarray:
         pass
 
+    @abstractmethod
+    def get_time_interp(self) -> str | TimeKernel:
+        pass
+
+    @abstractmethod
+    def get_sampling_key(self) -> str:
+        pass
+
     @abstractmethod
     def get_visualiser(self) -> pv.UnstructuredGrid:
         pass
 
+    @abstractmethod
+    def get_visualiser_at_step(self, time_step: int) -> pv.UnstructuredGrid:
+        pass
+
     @abstractmethod
     def get_all_components(self) -> tuple[str,...]:
         pass
@@ -33,6 +50,10 @@ class IField(ABC):
     def get_component_index(self,comp: str) -> int:
         pass
 
+    @abstractmethod
+    def get_nodal_data(self, comp: str) -> np.ndarray:
+        pass
+
     @abstractmethod
     def sample_field(self,
                     sample_points: np.ndarray,
@@ -44,65 +65,203 @@ class IField(ABC):
 #-------------------------------------------------------------------------------
 def conv_simdata_to_pyvista(sim_data: mh.SimData,
                             components: tuple[str,...],
-                            spat_dim: int) -> pv.UnstructuredGrid:
-
-    flat_connect = np.array([],dtype=np.int64)
-    cell_types = np.array([],dtype=np.int64)
+                            spat_dim: int,
+                            elem_types: dict[str,str] | None = None,
+                            corner_nodes_only: bool = False,
+                            legacy_cells: bool = False
+                            ) -> pv.UnstructuredGrid:
 
-    if sim_data.connect is None:
-        raise FieldError("SimData does not have a connectivity table, unable to convert to pyvista")
     if sim_data.node_vars is None:
         raise FieldError("SimData does not contain node_vars.")
 
-    for cc in sim_data.connect:
-        # NOTE: need the -1 here to make element numbers 0 indexed!
-        temp_connect = sim_data.connect[cc]-1
-        (nodes_per_elem,n_elems) = temp_connect.shape
+    pv_grid = create_pyvista_mesh(sim_data,
+                                  spat_dim,
+                                  elem_types,
+                                  corner_nodes_only,
+                                  legacy_cells)
 
-        temp_connect = temp_connect.T.flatten()
-        idxs = np.arange(0,n_elems*nodes_per_elem,nodes_per_elem,dtype=np.int64)
-        temp_connect = np.insert(temp_connect,idxs,nodes_per_elem)
+    for cc in components:
+        pv_grid[cc] = sim_data.node_vars[cc]
+
+    return pv_grid
 
-        this_cell_type = get_cell_type(nodes_per_elem,spat_dim)
-        cell_types = np.hstack((cell_types,np.full(n_elems,this_cell_type)))
-        flat_connect = np.hstack((flat_connect,temp_connect),dtype=np.int64)
 
-    cells = flat_connect
+def create_pyvista_mesh(sim_data: mh.SimData,
+                        spat_dim: int,
+                        elem_types: dict[str,str] | None = None,
+                        corner_nodes_only: bool = False,
+                        legacy_cells: bool = False
+                        ) -> pv.UnstructuredGrid:
+
+    if sim_data.connect is None:
+        raise FieldError("SimData does not have a connectivity table, unable to convert to pyvista")
+
     points = sim_data.coords
-    pv_grid = pv.UnstructuredGrid(cells, cell_types, points)
 
-    for cc in components:
-        pv_grid[cc] = sim_data.node_vars[cc]
+    if legacy_cells:
+        (cells,cell_types) = create_legacy_cell_array(sim_data.connect,
+                                                      spat_dim,
+                                                      elem_types,
+                                                      corner_nodes_only)
+        pv_grid = pv.UnstructuredGrid(cells, cell_types, points)
+    else:
+        (offsets,connectivity,cell_types) = create_cell_arrays(
+            sim_data.connect,spat_dim,elem_types,corner_nodes_only)
+        pv_grid = pv.UnstructuredGrid()
+        pv_grid.points = points
+        pv_grid.SetCells(pv.convert_array(cell_types),
+                         pv.CellArray.from_arrays(offsets,connectivity))
 
     return pv_grid
 
 
-def get_cell_type(nodes_per_elem: int, spat_dim: int) -> int:
-    cell_type = 0
+def create_cell_arrays(connect: dict[str,np.ndarray],
+                       spat_dim: int,
+                       elem_types: dict[str,str] | None = None,
+                       corner_nodes_only: bool = False
+                       ) -> tuple[np.ndarray,np.ndarray,np.ndarray]:
 
-    if spat_dim == 2:
-        if nodes_per_elem == 4:
-            cell_type = CellType.QUAD
-        elif nodes_per_elem == 3:
-            cell_type = CellType.TRIANGLE
-        else:
-            cell_type = CellType.QUAD
-    else:
-        if nodes_per_elem == 8:
-            cell_type =  CellType.HEXAHEDRON
-        elif nodes_per_elem == 4:
-            cell_type = CellType.TETRA
+    connect = conv_connect_to_vtk(connect,
+                                  spat_dim,
+                                  elem_types,
+                                  corner_nodes_only)
+    (n_elems_tot,n_connect_tot) = _count_connect_entries(connect)
+
+    offsets = np.empty(n_elems_tot+1,dtype=np.int64)
+    offsets[0] = 0
+    connectivity = np.empty(n_connect_tot,dtype=np.int64)
+    cell_types = np.empty(n_elems_tot,dtype=np.uint8)
+
+    elem_start = 0
+    connect_start = 0
+    for (block_connect,cell_type) in connect:
+        (nodes_per_elem,n_elems) = block_connect.shape
+        elem_end = elem_start + n_elems
+        connect_end = connect_start + n_elems*nodes_per_elem
+
+        # NOTE: need the -1 here to make element numbers 0 indexed!
+        connectivity[connect_start:connect_end] = block_connect.T.ravel() - 1
+        offsets[elem_start+1:elem_end+1] = (connect_start
+            + nodes_per_elem*np.arange(1,n_elems+1,dtype=np.int64))
+        cell_types[elem_start:elem_end] = cell_type
+
+        elem_start = elem_end
+        connect_start = connect_end
+
+    return (offsets,connectivity,cell_types)
+
+
+def create_legacy_cell_array(connect: dict[str,np.ndarray],
+                             spat_dim: int,
+                             elem_types: dict[str,str] | None = None,
+                             corner_nodes_only: bool = False
+                             ) -> tuple[np.ndarray,np.ndarray]:
+
+    connect = conv_connect_to_vtk(connect,
+                                  spat_dim,
+                                  elem_types,
+                                  corner_nodes_only)
+    (n_elems_tot,n_connect_tot) = _count_connect_entries(connect)
+
+    # NOTE: legacy vtk cell array has the number of nodes before each element
+    cells = np.empty(n_connect_tot+n_elems_tot,dtype=np.int64)
+    cell_types = np.empty(n_elems_tot,dtype=np.uint8)
+
+    elem_start = 0
+    cells_start = 0
+    for (block_connect,cell_type) in connect:
+        (nodes_per_elem,n_elems) = block_connect.shape
+        elem_end = elem_start + n_elems
+        cells_end = cells_start + n_elems*(nodes_per_elem+1)
+
+        block_cells = cells[cells_start:cells_end].reshape(n_elems,
+                                                           nodes_per_elem+1)
+        block_cells[:,0] = nodes_per_elem
+        # NOTE: need the -1 here to make element numbers 0 indexed!
+        block_cells[:,1:] = block_connect.T - 1
+
+        cell_types[elem_start:elem_end] = cell_type
+
+        elem_start = elem_end
+        cells_start = cells_end
+
+    return (cells,cell_types)
+
+
+def conv_connect_to_vtk(connect: dict[str,np.ndarray],
+                        spat_dim: int,
+                        elem_types: dict[str,str] | None = None,
+                        corner_nodes_only: bool = False
+                        ) -> list[tuple[np.ndarray,int]]:
+
+    vtk_connect = list()
+    for cc in connect:
+        elem_name = None
+        if elem_types is not None:
+            elem_name = elem_types.get(cc,None)
+
+        elem_type = get_block_elem_type(connect[cc].shape[0],
+                                        spat_dim,
+                                        elem_name)
+
+        block_connect = conv_exodus_connect(connect[cc],
+                                            elem_type,
+                                            corner_nodes_only)
+        if corner_nodes_only:
+            vtk_connect.append((block_connect,elem_type.corner_cell_type))
         else:
-            cell_type = CellType.HEXAHEDRON
+            vtk_connect.append((block_connect,elem_type.cell_type))
+
+    return vtk_connect
+
+
+def _count_connect_entries(connect: list[tuple[np.ndarray,int]]
+                           ) -> tuple[int,int]:
+    n_elems_tot = 0
+    n_connect_tot = 0
+    for (block_connect,_) in connect:
+        n_elems_tot += block_connect.shape[1]
+        n_connect_tot += block_connect.size
+
+    return (n_elems_tot,n_connect_tot)
+
+
+def get_block_elem_type(nodes_per_elem: int,
+                        spat_dim: int,
+                        elem_name: str | None = None) -> ElemType:
+
+    elem_type = get_elem_type(nodes_per_elem,spat_dim,elem_name)
+
+    if elem_type is None:
+        raise FieldError(f"Element type '{elem_name}' with {nodes_per_elem} "+
+                         f"nodes in {spat_dim}D is not supported.")
+
+    return elem_type
 
-    return cell_type
+
+def get_cell_type(nodes_per_elem: int,
+                  spat_dim: int,
+                  elem_name: str | None = None) -> int:
+    return get_block_elem_type(nodes_per_elem,spat_dim,elem_name).cell_type
+
+
+def get_step_visualiser(pyvista_grid: pv.UnstructuredGrid,
+                        components: tuple[str,...],
+                        time_step: int) -> pv.UnstructuredGrid:
+
+    pv_grid = pyvista_grid.copy(deep=False)
+    for cc in components:
+        pv_grid[cc] = np.asarray(pyvista_grid[cc])[:,time_step]
+
+    return pv_grid
 
 
 def sample_pyvista(components: tuple,
                 pyvista_grid: pv.UnstructuredGrid,
                 time_steps: np.ndarray,
                 sample_points: np.ndarray,
-                sample_times: np.ndarray | None = None
+                sample_times: np.ndarray | None = None,
+                time_interp: str | TimeKernel = 'linear'
                 ) -> np.ndarray:
 
     pv_points = pv.PolyData(sample_points)
@@ -121,13 +280,42 @@ def sample_pyvista(components: tuple,
     if sample_times is None:
         return sample_at_sim_time
 
-    sample_time_interp = lambda x: np.interp(sample_times,time_steps,x) # type: ignore
+    return interp_sample_times(sample_at_sim_time,
+                               time_steps,
+                               sample_times,
+                               time_interp)
 
-    n_time_steps = sample_times.shape[0]
-    sample_at_spec_time = np.empty((n_sensors,n_comps,n_time_steps))
+
+def sample_pointsampler(components: tuple,
+                        pyvista_grid: pv.UnstructuredGrid,
+                        time_steps: np.ndarray,
+                        sampler: PointSampler,
+                        sample_times: np.ndarray | None = None,
+                        time_interp: str | TimeKernel = 'linear'
+                        ) -> np.ndarray:
+
+    n_comps = len(components)
+    n_sensors = sampler.get_num_points()
+    n_time_steps = time_steps.shape[0]
+    sample_at_sim_time = np.empty((n_sensors,n_comps,n_time_steps))
 
     for ii,cc in enumerate(components):
-        sample_at_spec_time[:,ii,:] = np.apply_along_axis(sample_time_interp,-1,
-                                                    sample_at_sim_time[:,ii,:])
+        sample_at_sim_time[:,ii,:] = sampler.sample(np.asarray(pyvista_grid[cc]))
+
+    if sample_times is None:
+        return sample_at_sim_time
+
+    return interp_sample_times(sample_at_sim_time,
+                               time_steps,
+                               sample_times,
+                               time_interp)
+
+
+def interp_sample_times(sample_at_sim_time: np.ndarray,
+                        time_steps: np.ndarray,
+                        sample_times: np.ndarray,
+                        time_interp: str | TimeKernel = 'linear'
+                        ) -> np.ndarray:
 
-    return sample_at_spec_time
+    time_interpolator = TimeInterpolator(time_steps,sample_times,time_interp)
+    return time_interpolator.interp(sample_at_sim_time)
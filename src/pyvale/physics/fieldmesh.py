@@ -0,0 +1,157 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pyvista as pv
+
+import mooseherder as mh
+
+from pyvale.physics.field import (FieldError,
+                                  create_pyvista_mesh)
+from pyvale.physics.cellindex import (CellIndex,
+                                      create_cell_index,
+                                      grid_hash)
+from pyvale.physics.fieldsampler import (PointSampler,
+                                         PointSamplerCache,
+                                         RectGrid,
+                                         find_rect_grid)
+
+
+class FieldMesh:
+    """Mesh topology and point location structures shared by any number of
+    fields built on the same simulation mesh. Each field holds a shallow copy
+    of the mesh grid with its own point data so the coordinates and
+    connectivity are only stored once. Structured grids of linear quads or
+    hexes are detected, or required with structured=True, so that sensors
+    are located by index arithmetic instead of a cell search. Other meshes
+    get a CellIndex that is built once, or loaded from index_file, and used
+    to locate every set of sensors. Sensors outside the mesh by at most
+    outside_tol take the value of the nearest node.
+    """
+    def __init__(self,
+                 sim_data: mh.SimData,
+                 spat_dim: int,
+                 elem_types: dict[str,str] | None = None,
+                 corner_nodes_only: bool = False,
+                 max_samplers: int = 8,
+                 structured: bool | None = None,
+                 outside_tol: float = 0.0,
+                 index_file: Path | None = None) -> None:
+
+        self._spat_dim = spat_dim
+        self._elem_types = elem_types
+        self._corner_nodes_only = corner_nodes_only
+        self._outside_tol = outside_tol
+        self._sampling_key = None
+        self._pyvista_grid = create_pyvista_mesh(sim_data,
+                                                 spat_dim,
+                                                 elem_types,
+                                                 corner_nodes_only)
+
+        self._rect_grid = None
+        if structured is None or structured:
+            self._rect_grid = find_rect_grid(self._pyvista_grid)
+
+        if structured and self._rect_grid is None:
+            raise FieldError("Mesh is not an axis aligned structured grid of "+
+                             "linear quad or hex elements.")
+
+        self._cell_index = None
+        if self._rect_grid is None or outside_tol > 0.0:
+            self._cell_index = create_cell_index(self._pyvista_grid,
+                                                 index_file)
+
+        self._sampler_cache = PointSamplerCache(self._pyvista_grid,
+                                                max_samplers,
+                                                self._rect_grid,
+                                                self._cell_index,
+                                                outside_tol)
+
+    def get_spat_dim(self) -> int:
+        return self._spat_dim
+
+    def get_num_nodes(self) -> int:
+        return self._pyvista_grid.n_points
+
+    def get_visualiser(self) -> pv.UnstructuredGrid:
+        return self._pyvista_grid
+
+    def get_rect_grid(self) -> RectGrid | None:
+        return self._rect_grid
+
+    def get_cell_index(self) -> CellIndex | None:
+        return self._cell_index
+
+    def get_outside_tol(self) -> float:
+        return self._outside_tol
+
+    def get_sampling_key(self) -> str:
+        # NOTE: identifies the mesh and every setting that changes the value
+        # sampled at a point, used as part of the key for cached truth values
+        if self._sampling_key is not None:
+            return self._sampling_key
+
+        key_hasher = hashlib.sha1(grid_hash(self._pyvista_grid).encode())
+        elem_types = (None if self._elem_types is None
+                      else sorted(self._elem_types.items()))
+        key_hasher.update(f'{self._spat_dim}{elem_types}'.encode())
+        key_hasher.update(f'{self._corner_nodes_only}'.encode())
+        key_hasher.update(f'{self._rect_grid is not None}'.encode())
+        key_hasher.update(f'{float(self._outside_tol)!r}'.encode())
+
+        self._sampling_key = key_hasher.hexdigest()
+        return self._sampling_key
+
+    def get_sampler(self, sample_points: np.ndarray) -> PointSampler:
+        return self._sampler_cache.get_sampler(sample_points)
+
+    def create_view(self,
+                    node_vars: dict[str,np.ndarray],
+                    components: tuple[str,...]) -> pv.UnstructuredGrid:
+
+        pv_grid = self._pyvista_grid.copy(deep=False)
+        for cc in components:
+            if node_vars[cc].shape[0] != self.get_num_nodes():
+                raise FieldError(f"Node variable '{cc}' does not have the "+
+                                 "same number of nodes as the field mesh.")
+
+            pv_grid[cc] = node_vars[cc]
+
+        return pv_grid
+
+
+def create_field_mesh(sim_data: mh.SimData,
+                      spat_dim: int,
+                      elem_types: dict[str,str] | None = None,
+                      corner_nodes_only: bool = False,
+                      mesh: FieldMesh | None = None) -> FieldMesh:
+
+    if mesh is not None:
+        return mesh
+
+    return FieldMesh(sim_data,spat_dim,elem_types,corner_nodes_only)
+
+
+def mesh_hash(sim_data: mh.SimData) -> str:
+    # NOTE: two simulations with the same hash can share a FieldMesh
+    if sim_data.coords is None or sim_data.connect is None:
+        raise FieldError("SimData does not contain coords and connectivity.")
+
+    mesh_hasher = hashlib.sha1()
+    coords = np.ascontiguousarray(sim_data.coords)
+    mesh_hasher.update(str(coords.shape).encode())
+    mesh_hasher.update(coords.tobytes())
+
+    for kk in sorted(sim_data.connect.keys()):
+        connect = np.ascontiguousarray(sim_data.connect[kk])
+        mesh_hasher.update(f'{kk}{connect.shape}'.encode())
+        mesh_hasher.update(connect.tobytes())
+
+    return mesh_hasher.hexdigest()
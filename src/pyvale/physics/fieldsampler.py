@@ -0,0 +1,572 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+import pyvista as pv
+import vtk
+from scipy import sparse
+
+from pyvale.physics.cellindex import (CELL_TOL,
+                                      CellIndex,
+                                      get_cell_offsets)
+
+
+class RectGrid:
+    """Axis aligned structured grid of linear quad or hex cells found in an
+    unstructured mesh. Points are located by index arithmetic on the grid
+    axes and nodal data is interpolated with multilinear weights, giving the
+    same sampling operator as the generic cell search and shape functions.
+    """
+    def __init__(self,
+                 grid_dims: tuple[int,...],
+                 axes: tuple[np.ndarray,...],
+                 bounds: np.ndarray,
+                 node_map: np.ndarray,
+                 cell_map: np.ndarray) -> None:
+
+        self._grid_dims = grid_dims
+        self._axes = axes
+        self._bounds = bounds
+        self._node_map = node_map
+        self._cell_map = cell_map
+        self._n_nodes = node_map.size
+
+        # NOTE: uniform axes are located with a division, others with a search
+        self._axis_spacing = list()
+        for aa in axes:
+            spacing = np.diff(aa)
+            if np.allclose(spacing,spacing[0],rtol=1e-12,atol=0.0):
+                self._axis_spacing.append(float(spacing[0]))
+            else:
+                self._axis_spacing.append(None)
+
+    def get_grid_dims(self) -> tuple[int,...]:
+        return self._grid_dims
+
+    def get_axes(self) -> tuple[np.ndarray,...]:
+        return self._axes
+
+    def get_node_map(self) -> np.ndarray:
+        return self._node_map
+
+    def get_cell_map(self) -> np.ndarray:
+        return self._cell_map
+
+    def calc_interp_weights(self, sample_points: np.ndarray
+                            ) -> tuple[np.ndarray,sparse.csr_array]:
+        # NOTE: returns the containing cell ids and the sparse weights, points
+        # outside the grid have a cell id of -1 and no weights
+        n_points = sample_points.shape[0]
+        n_dims = len(self._grid_dims)
+
+        # NOTE: no tolerance on the bounds of the grid axes, same as the vtk
+        # cell search, points off a flat grid by at most CELL_TOL of the cell
+        # size are in it as for the vtk probe filter
+        grid_dims = list(self._grid_dims)
+        inside = np.all((sample_points[:,grid_dims] >= self._bounds[grid_dims,0])
+                        & (sample_points[:,grid_dims] <= self._bounds[grid_dims,1]),
+                        axis=1)
+        cell_size2 = np.zeros(n_points,dtype=np.float64)
+
+        lower_inds = np.empty((n_points,n_dims),dtype=np.int64)
+        local_coords = np.empty((n_points,n_dims),dtype=np.float64)
+        for (ii,dd) in enumerate(self._grid_dims):
+            axis = self._axes[ii]
+            coord = sample_points[:,dd]
+            coord = np.clip(coord,axis[0],axis[-1])
+
+            if self._axis_spacing[ii] is not None:
+                cell_inds = np.floor((coord - axis[0])/self._axis_spacing[ii])
+                cell_inds = cell_inds.astype(np.int64)
+            else:
+                cell_inds = np.searchsorted(axis,coord,side='right') - 1
+            cell_inds = np.clip(cell_inds,0,axis.shape[0]-2)
+
+            lower_inds[:,ii] = cell_inds
+            cell_size2 += (axis[cell_inds+1] - axis[cell_inds])**2
+            local_coords[:,ii] = np.clip((coord - axis[cell_inds])
+                                         / (axis[cell_inds+1] - axis[cell_inds]),
+                                         0.0,1.0)
+
+        flat_dims = [dd for dd in range(sample_points.shape[1])
+                     if dd not in self._grid_dims]
+        if flat_dims:
+            off_grid = np.maximum(
+                np.maximum(self._bounds[flat_dims,0] - sample_points[:,flat_dims],
+                           sample_points[:,flat_dims] - self._bounds[flat_dims,1]),
+                0.0)
+            inside &= np.all(off_grid**2 <= (CELL_TOL**2*cell_size2)[:,np.newaxis],
+                             axis=1)
+
+        cell_ids = np.full(n_points,-1,dtype=np.int64)
+        cell_ids[inside] = self._cell_map[tuple(lower_inds[inside].T)]
+
+        in_inds = np.flatnonzero(inside)
+        lower_inds = lower_inds[inside]
+        local_coords = local_coords[inside]
+
+        n_corners = 2**n_dims
+        rows = np.repeat(in_inds,n_corners)
+        cols = np.empty((in_inds.shape[0],n_corners),dtype=np.int64)
+        vals = np.ones((in_inds.shape[0],n_corners),dtype=np.float64)
+        for cc in range(n_corners):
+            corner = [(cc >> ii) & 1 for ii in range(n_dims)]
+            cols[:,cc] = self._node_map[tuple((lower_inds + corner).T)]
+            for ii in range(n_dims):
+                if corner[ii]:
+                    vals[:,cc] *= local_coords[:,ii]
+                else:
+                    vals[:,cc] *= 1.0 - local_coords[:,ii]
+
+        weights = sparse.csr_array((vals.ravel(),(rows,cols.ravel())),
+                                   shape=(n_points,self._n_nodes))
+        return (cell_ids,weights)
+
+
+class PointSampler:
+    """Precomputed linear sampling operator for a fixed set of points on a
+    mesh. Each sample point stores the cell that contains it and the shape
+    function weights of that cell, so sampling nodal data is a sparse
+    matrix product with no point location search. If the mesh is a
+    structured grid the cells and weights are found on the RectGrid, if a
+    CellIndex is given cells are located with it, otherwise with the vtk cell
+    search and a CellIndex for any points it misses. Points outside the mesh by at most outside_tol take the value of
+    the nearest node.
+    """
+    def __init__(self,
+                 pyvista_grid: pv.UnstructuredGrid,
+                 sample_points: np.ndarray,
+                 rect_grid: RectGrid | None = None,
+                 cell_index: CellIndex | None = None,
+                 outside_tol: float = 0.0) -> None:
+
+        self._sample_points = np.array(sample_points,dtype=np.float64)
+
+        if rect_grid is not None:
+            (self._cell_ids,self._weights) = rect_grid.calc_interp_weights(
+                self._sample_points)
+        elif cell_index is not None:
+            (self._cell_ids,self._weights) = calc_index_interp_weights(
+                pyvista_grid,cell_index,self._sample_points)
+        else:
+            self._cell_ids = np.array(
+                pyvista_grid.find_containing_cell(self._sample_points),
+                dtype=np.int64)
+            self._weights = calc_interp_weights(pyvista_grid,
+                                                self._sample_points,
+                                                self._cell_ids)
+
+            # NOTE: the vtk cell search has no tolerance so points just out of
+            # surface cells are missed, these are located with a cell index
+            # using the same tolerance as the vtk probe filter
+            missed = np.flatnonzero(self._cell_ids < 0)
+            if missed.shape[0] > 0:
+                cell_index = CellIndex(pyvista_grid)
+                (missed_ids,missed_weights) = calc_index_interp_weights(
+                    pyvista_grid,cell_index,self._sample_points[missed])
+                self._cell_ids[missed] = missed_ids
+
+                missed_weights = sparse.coo_array(missed_weights)
+                self._weights = self._weights + sparse.csr_array(
+                    (missed_weights.data,
+                     (missed[missed_weights.row],missed_weights.col)),
+                    shape=self._weights.shape)
+
+        self._nearest_nodes = np.full(self._sample_points.shape[0],-1,
+                                      dtype=np.int64)
+        if outside_tol > 0.0 and np.any(self._cell_ids < 0):
+            if cell_index is None:
+                cell_index = CellIndex(pyvista_grid)
+
+            outside = np.flatnonzero(self._cell_ids < 0)
+            (dists,nodes) = cell_index.find_nearest_nodes(
+                self._sample_points[outside])
+            near = dists <= outside_tol
+            self._nearest_nodes[outside[near]] = nodes[near]
+            self._weights = self._weights + sparse.csr_array(
+                (np.ones(np.sum(near)),(outside[near],nodes[near])),
+                shape=self._weights.shape)
+
+    def get_sample_points(self) -> np.ndarray:
+        return self._sample_points
+
+    def get_cell_ids(self) -> np.ndarray:
+        return self._cell_ids
+
+    def get_weights(self) -> sparse.csr_array:
+        return self._weights
+
+    def get_nearest_nodes(self) -> np.ndarray:
+        # NOTE: node used for each point outside the mesh, -1 for points in
+        # the mesh or too far outside it
+        return self._nearest_nodes
+
+    def get_num_points(self) -> int:
+        return self._sample_points.shape[0]
+
+    def sample(self, nodal_data: np.ndarray) -> np.ndarray:
+        # NOTE: points outside the mesh have no weights so they sample as 0,
+        # consistent with the pyvista/vtk probe filter, unless they are within
+        # the outside tolerance of a node
+        if nodal_data.ndim == 1:
+            nodal_data = nodal_data[:,np.newaxis]
+
+        return np.asarray(self._weights @ nodal_data)
+
+
+class PointSamplerCache:
+    """Holds the most recently used point samplers for a mesh keyed by the
+    sample point coordinates.
+    """
+    def __init__(self,
+                 pyvista_grid: pv.UnstructuredGrid,
+                 max_samplers: int = 8,
+                 rect_grid: RectGrid | None = None,
+                 cell_index: CellIndex | None = None,
+                 outside_tol: float = 0.0) -> None:
+
+        self._pyvista_grid = pyvista_grid
+        self._rect_grid = rect_grid
+        self._cell_index = cell_index
+        self._outside_tol = outside_tol
+        self._max_samplers = max_samplers
+        self._samplers: OrderedDict[str,PointSampler] = OrderedDict()
+
+    def get_sampler(self, sample_points: np.ndarray) -> PointSampler:
+        key = points_hash(sample_points)
+
+        if key in self._samplers:
+            self._samplers.move_to_end(key)
+            return self._samplers[key]
+
+        sampler = PointSampler(self._pyvista_grid,
+                               sample_points,
+                               self._rect_grid,
+                               self._cell_index,
+                               self._outside_tol)
+        self._samplers[key] = sampler
+
+        if len(self._samplers) > self._max_samplers:
+            self._samplers.popitem(last=False)
+
+        return sampler
+
+    def clear(self) -> None:
+        self._samplers.clear()
+
+
+def points_hash(points: np.ndarray) -> str:
+    points = np.ascontiguousarray(points,dtype=np.float64)
+    points_hasher = hashlib.sha1(str(points.shape).encode())
+    points_hasher.update(points.tobytes())
+    return points_hasher.hexdigest()
+
+
+def find_rect_grid(pyvista_grid: pv.UnstructuredGrid,
+                   rel_tol: float = 1e-9) -> RectGrid | None:
+    # NOTE: returns None unless the mesh is made only of linear quads or hexes
+    # that exactly tile an axis aligned grid of its nodes
+    cell_types = np.unique(np.asarray(pyvista_grid.celltypes))
+    if cell_types.shape[0] != 1:
+        return None
+
+    if cell_types[0] in (pv.CellType.QUAD,pv.CellType.PIXEL):
+        n_dims = 2
+    elif cell_types[0] in (pv.CellType.HEXAHEDRON,pv.CellType.VOXEL):
+        n_dims = 3
+    else:
+        return None
+
+    points = np.asarray(pyvista_grid.points,dtype=np.float64)
+    extent = np.max(np.ptp(points,axis=0))
+    tol = rel_tol*extent if extent > 0.0 else rel_tol
+
+    grid_dims = list()
+    axes = list()
+    node_inds = list()
+    for dd in range(points.shape[1]):
+        # Coordinates closer than the tolerance are the same grid line
+        sorted_coords = np.sort(points[:,dd])
+        line_starts = np.concatenate(
+            ([True],np.diff(sorted_coords) > tol))
+        axis = sorted_coords[line_starts]
+
+        if axis.shape[0] == 1:
+            continue
+
+        grid_dims.append(dd)
+        axes.append(axis)
+        node_inds.append(np.searchsorted(axis,points[:,dd]+tol,side='right')-1)
+
+    if len(grid_dims) != n_dims:
+        return None
+
+    grid_shape = tuple(aa.shape[0] for aa in axes)
+    n_cells = pyvista_grid.n_cells
+    if (points.shape[0] != np.prod(grid_shape)
+        or n_cells != np.prod([nn-1 for nn in grid_shape])):
+        return None
+
+    node_inds = np.column_stack(node_inds)
+    node_map = np.full(grid_shape,-1,dtype=np.int64)
+    node_map[tuple(node_inds.T)] = np.arange(points.shape[0])
+    if np.any(node_map < 0):
+        return None
+
+    # Each cell must span exactly one grid step along every axis with one
+    # node on each corner
+    n_corners = 2**n_dims
+    cell_nodes = np.asarray(pyvista_grid.cell_connectivity).reshape(n_cells,
+                                                                    n_corners)
+    cell_node_inds = node_inds[cell_nodes]
+    lower_inds = np.min(cell_node_inds,axis=1)
+    corner_bits = cell_node_inds - lower_inds[:,np.newaxis,:]
+    if np.any(corner_bits > 1):
+        return None
+
+    corner_codes = np.sort(np.sum(corner_bits << np.arange(n_dims),axis=2),
+                           axis=1)
+    if np.any(corner_codes != np.arange(n_corners)):
+        return None
+
+    cell_map = np.full([nn-1 for nn in grid_shape],-1,dtype=np.int64)
+    cell_map[tuple(lower_inds.T)] = np.arange(n_cells)
+    if np.any(cell_map < 0):
+        return None
+
+    return RectGrid(tuple(grid_dims),
+                    tuple(axes),
+                    np.column_stack((np.min(points,axis=0),
+                                     np.max(points,axis=0))),
+                    node_map,
+                    cell_map)
+
+
+def calc_index_interp_weights(pyvista_grid: pv.UnstructuredGrid,
+                              cell_index: CellIndex,
+                              sample_points: np.ndarray
+                              ) -> tuple[np.ndarray,sparse.csr_array]:
+    # NOTE: returns the containing cell ids and the sparse weights, each point
+    # takes the first candidate cell it is inside in cell number order
+    n_points = sample_points.shape[0]
+    n_nodes = pyvista_grid.n_points
+    (cand_points,cand_cells) = cell_index.find_candidate_cells(sample_points)
+
+    cand_types = np.asarray(pyvista_grid.celltypes)[cand_cells]
+    is_tri = cand_types == pv.CellType.TRIANGLE
+    is_tet = cand_types == pv.CellType.TETRA
+    is_other = ~(is_tri | is_tet)
+
+    # Linear simplices are tested together with barycentric coordinates, any
+    # other cell is tested with its vtk shape functions
+    found = list()
+    for (cell_mask,calc_bary) in ((is_tri,calc_tri_bary_coords),
+                                  (is_tet,calc_tet_bary_coords)):
+        if not np.any(cell_mask):
+            continue
+
+        nodes_per_cell = 3 if calc_bary is calc_tri_bary_coords else 4
+        cell_nodes = get_cell_nodes(pyvista_grid,
+                                    cand_cells[cell_mask],
+                                    nodes_per_cell)
+        (inside,bary) = calc_bary(np.asarray(pyvista_grid.points),
+                                  cell_nodes,
+                                  sample_points[cand_points[cell_mask]])
+        found.append((cand_points[cell_mask][inside],
+                      cand_cells[cell_mask][inside],
+                      cell_nodes[inside],
+                      bary[inside]))
+
+    if np.any(is_other):
+        found.append(eval_vtk_cells(pyvista_grid,
+                                    sample_points,
+                                    cand_points[is_other],
+                                    cand_cells[is_other]))
+
+    cell_ids = np.full(n_points,-1,dtype=np.int64)
+    if not found:
+        return (cell_ids,sparse.csr_array((n_points,n_nodes)))
+
+    # Nodes and weights of each cell type are padded to the largest cell with
+    # zero weights on node 0, these are removed from the sparse weights
+    max_nodes = max(ff[2].shape[1] for ff in found)
+    found_points = np.concatenate([ff[0] for ff in found])
+    found_cells = np.concatenate([ff[1] for ff in found])
+    found_nodes = np.concatenate([np.pad(ff[2],((0,0),(0,max_nodes-ff[2].shape[1])))
+                                  for ff in found])
+    found_weights = np.concatenate([np.pad(ff[3],((0,0),(0,max_nodes-ff[3].shape[1])))
+                                    for ff in found])
+
+    order = np.lexsort((found_cells,found_points))
+    (points_in,first_inds) = np.unique(found_points[order],return_index=True)
+    first_found = order[first_inds]
+    cell_ids[points_in] = found_cells[first_found]
+
+    weights = sparse.csr_array((found_weights[first_found].ravel(),
+                                (np.repeat(points_in,max_nodes),
+                                 found_nodes[first_found].ravel())),
+                               shape=(n_points,n_nodes))
+    weights.eliminate_zeros()
+    return (cell_ids,weights)
+
+
+def get_cell_nodes(pyvista_grid: pv.UnstructuredGrid,
+                   cells: np.ndarray,
+                   nodes_per_cell: int) -> np.ndarray:
+    offsets = get_cell_offsets(pyvista_grid)[cells]
+    connectivity = np.asarray(pyvista_grid.cell_connectivity)
+    return connectivity[offsets[:,np.newaxis] + np.arange(nodes_per_cell)]
+
+
+def calc_tri_bary_coords(nodes: np.ndarray,
+                         tri_nodes: np.ndarray,
+                         points: np.ndarray,
+                         tol: float = 1e-12
+                         ) -> tuple[np.ndarray,np.ndarray]:
+    # NOTE: points out of the plane of the triangle by at most CELL_TOL of
+    # its size are in it and are projected onto the plane, same as vtk
+    v0 = nodes[tri_nodes[:,1]] - nodes[tri_nodes[:,0]]
+    v1 = nodes[tri_nodes[:,2]] - nodes[tri_nodes[:,0]]
+    v2 = points - nodes[tri_nodes[:,0]]
+
+    d00 = np.sum(v0*v0,axis=1)
+    d01 = np.sum(v0*v1,axis=1)
+    d11 = np.sum(v1*v1,axis=1)
+    d20 = np.sum(v2*v0,axis=1)
+    d21 = np.sum(v2*v1,axis=1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        denom = d00*d11 - d01*d01
+        bary = np.empty((points.shape[0],3))
+        bary[:,1] = (d11*d20 - d01*d21)/denom
+        bary[:,2] = (d00*d21 - d01*d20)/denom
+        bary[:,0] = 1.0 - bary[:,1] - bary[:,2]
+
+    tri_points = nodes[tri_nodes]
+    tri_size = np.linalg.norm(np.max(tri_points,axis=1)
+                              - np.min(tri_points,axis=1),axis=1)
+    normal = np.cross(v0,v1)
+    in_plane = (np.abs(np.sum(v2*normal,axis=1))
+                <= CELL_TOL*tri_size*np.linalg.norm(normal,axis=1))
+    inside = in_plane & np.all(bary >= -tol,axis=1)
+    return (inside,bary)
+
+
+def calc_tet_bary_coords(nodes: np.ndarray,
+                         tet_nodes: np.ndarray,
+                         points: np.ndarray,
+                         tol: float = 1e-12
+                         ) -> tuple[np.ndarray,np.ndarray]:
+    edges = np.stack((nodes[tet_nodes[:,1]] - nodes[tet_nodes[:,0]],
+                      nodes[tet_nodes[:,2]] - nodes[tet_nodes[:,0]],
+                      nodes[tet_nodes[:,3]] - nodes[tet_nodes[:,0]]),axis=2)
+    bary = np.full((points.shape[0],4),np.nan)
+
+    # NOTE: flat tets have no containing volume so they never contain a point
+    solvable = np.abs(np.linalg.det(edges)) > 0.0
+    bary[solvable,1:] = np.linalg.solve(
+        edges[solvable],
+        (points - nodes[tet_nodes[:,0]])[solvable][:,:,np.newaxis])[:,:,0]
+    bary[:,0] = 1.0 - np.sum(bary[:,1:],axis=1)
+
+    inside = np.all(bary >= -tol,axis=1)
+    return (inside,bary)
+
+
+def eval_vtk_cells(pyvista_grid: pv.UnstructuredGrid,
+                   sample_points: np.ndarray,
+                   cand_points: np.ndarray,
+                   cand_cells: np.ndarray
+                   ) -> tuple[np.ndarray,np.ndarray,np.ndarray,np.ndarray]:
+    # NOTE: candidates are sorted by point so once a point is inside a cell the
+    # rest of its candidates are skipped. Points out of the surface of 2D cells
+    # by at most CELL_TOL of the cell size are in them, same as vtk.
+    found_points = list()
+    found_cells = list()
+    found_nodes = list()
+    found_weights = list()
+
+    closest = [0.0,0.0,0.0]
+    pcoords = [0.0,0.0,0.0]
+    sub_id = vtk.reference(0)
+    dist2 = vtk.reference(0.0)
+
+    for (pp,cc) in zip(cand_points.tolist(),cand_cells.tolist()):
+        if found_points and found_points[-1] == pp:
+            continue
+
+        cell = pyvista_grid.GetCell(cc)
+        n_cell_nodes = cell.GetNumberOfPoints()
+        weights = [0.0]*n_cell_nodes
+
+        inside = cell.EvaluatePosition(sample_points[pp,:],
+                                       closest,
+                                       sub_id,
+                                       pcoords,
+                                       dist2,
+                                       weights)
+        if inside != 1 or dist2.get() > cell.GetLength2()*CELL_TOL**2:
+            continue
+
+        found_points.append(pp)
+        found_cells.append(cc)
+        found_nodes.append(np.array([cell.GetPointId(nn)
+                                     for nn in range(n_cell_nodes)]))
+        found_weights.append(np.array(weights))
+
+    max_nodes = max((nn.shape[0] for nn in found_nodes),default=0)
+    nodes = np.zeros((len(found_nodes),max_nodes),dtype=np.int64)
+    weights = np.zeros((len(found_nodes),max_nodes),dtype=np.float64)
+    for (ii,(nn,ww)) in enumerate(zip(found_nodes,found_weights)):
+        nodes[ii,:nn.shape[0]] = nn
+        weights[ii,:ww.shape[0]] = ww
+
+    return (np.array(found_points,dtype=np.int64),
+            np.array(found_cells,dtype=np.int64),
+            nodes,
+            weights)
+
+
+def calc_interp_weights(pyvista_grid: pv.UnstructuredGrid,
+                        sample_points: np.ndarray,
+                        cell_ids: np.ndarray) -> sparse.csr_array:
+
+    n_points = sample_points.shape[0]
+    n_nodes = pyvista_grid.n_points
+
+    rows = list()
+    cols = list()
+    vals = list()
+
+    closest = [0.0,0.0,0.0]
+    pcoords = [0.0,0.0,0.0]
+    sub_id = vtk.reference(0)
+    dist2 = vtk.reference(0.0)
+
+    for pp in range(n_points):
+        if cell_ids[pp] < 0:
+            continue
+
+        cell = pyvista_grid.GetCell(int(cell_ids[pp]))
+        n_cell_nodes = cell.GetNumberOfPoints()
+        weights = [0.0]*n_cell_nodes
+
+        cell.EvaluatePosition(sample_points[pp,:],
+                              closest,
+                              sub_id,
+                              pcoords,
+                              dist2,
+                              weights)
+
+        for nn in range(n_cell_nodes):
+            rows.append(pp)
+            cols.append(cell.GetPointId(nn))
+            vals.append(weights[nn])
+
+    return sparse.csr_array((vals,(rows,cols)),shape=(n_points,n_nodes))
@@ -0,0 +1,237 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from collections import OrderedDict
+from pathlib import Path
+import tempfile
+
+import numpy as np
+import pyvista as pv
+
+import mooseherder as mh
+
+from pyvale.physics.field import (IField,
+                                  FieldError)
+from pyvale.physics.fieldmesh import FieldMesh, create_field_mesh
+from pyvale.physics.timeinterp import TimeInterpolator, TimeKernel
+
+
+class NodalStepStore:
+    """On-disk store of nodal time histories with one memory mapped array per
+    component. Arrays are stored time step major so each time step is
+    contiguous on disk. Recently used time steps are held in an LRU cache.
+    """
+    def __init__(self,
+                 components: tuple[str,...],
+                 n_nodes: int,
+                 n_time_steps: int,
+                 store_dir: Path | None = None,
+                 cache_steps: int = 8) -> None:
+
+        # NOTE: the temporary directory is deleted with the store
+        self._temp_dir = None
+        if store_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory(prefix='pyvale_')
+            store_dir = Path(self._temp_dir.name)
+
+        if not store_dir.is_dir():
+            store_dir.mkdir(parents=True)
+
+        self._store_dir = store_dir
+        self._components = components
+        self._n_nodes = n_nodes
+        self._n_time_steps = n_time_steps
+        self._cache_steps = cache_steps
+        self._step_cache: OrderedDict[int,np.ndarray] = OrderedDict()
+
+        self._data = dict()
+        for cc in components:
+            self._data[cc] = np.lib.format.open_memmap(
+                store_dir / f'{cc}.npy',
+                mode='w+',
+                dtype=np.float64,
+                shape=(n_time_steps,n_nodes))
+
+    def get_store_dir(self) -> Path:
+        return self._store_dir
+
+    def get_components(self) -> tuple[str,...]:
+        return self._components
+
+    def get_num_nodes(self) -> int:
+        return self._n_nodes
+
+    def get_num_time_steps(self) -> int:
+        return self._n_time_steps
+
+    def set_steps(self,
+                  comp: str,
+                  step_start: int,
+                  step_data: np.ndarray) -> None:
+        # NOTE: step_data is (n_nodes,n_steps) to match mh.SimData.node_vars
+        if step_data.ndim == 1:
+            step_data = step_data[:,np.newaxis]
+
+        step_end = step_start + step_data.shape[1]
+        self._data[comp][step_start:step_end,:] = step_data.T
+
+        for ss in range(step_start,step_end):
+            self._step_cache.pop(ss,None)
+
+    def get_step(self, step: int) -> np.ndarray:
+        # NOTE: returns (n_nodes,n_comps) for the time step
+        step = step % self._n_time_steps
+        if step in self._step_cache:
+            self._step_cache.move_to_end(step)
+            return self._step_cache[step]
+
+        step_data = np.empty((self._n_nodes,len(self._components)))
+        for ii,cc in enumerate(self._components):
+            step_data[:,ii] = self._data[cc][step,:]
+
+        self._step_cache[step] = step_data
+        if len(self._step_cache) > self._cache_steps:
+            self._step_cache.popitem(last=False)
+
+        return step_data
+
+    def get_step_chunk(self,
+                       comp: str,
+                       step_start: int,
+                       step_end: int) -> np.ndarray:
+        # NOTE: bypasses the step cache, returns (n_nodes,n_steps)
+        return np.asarray(self._data[comp][step_start:step_end,:]).T
+
+    def flush(self) -> None:
+        for cc in self._components:
+            self._data[cc].flush()
+
+
+class LazyField(IField):
+    """Field that keeps the nodal data in a NodalStepStore on disk instead of
+    in the pyvista grid. Time steps are only read when sampled or visualised.
+    Works for scalar, vector and tensor fields through the components tuple.
+    """
+    def __init__(self,
+                 sim_data: mh.SimData,
+                 field_key: str,
+                 components: tuple[str,...],
+                 spat_dim: int,
+                 store_dir: Path | None = None,
+                 cache_steps: int = 8,
+                 chunk_steps: int = 16,
+                 time_interp: str | TimeKernel = 'linear',
+                 elem_types: dict[str,str] | None = None,
+                 corner_nodes_only: bool = False,
+                 mesh: FieldMesh | None = None,
+                 store: NodalStepStore | None = None) -> None:
+
+        self._field_key = field_key
+        self._components = components
+        self._chunk_steps = chunk_steps
+        self._time_interp = time_interp
+
+        if sim_data.time is None:
+            raise(FieldError("SimData.time is None. SimData does not have time steps"))
+        self._time_steps = sim_data.time
+
+        # NOTE: node_vars are not needed if a populated store is given
+        if sim_data.node_vars is None and store is None:
+            raise(FieldError("SimData does not contain node_vars."))
+
+        self._mesh = create_field_mesh(sim_data,
+                                       spat_dim,
+                                       elem_types,
+                                       corner_nodes_only,
+                                       mesh)
+        self._pyvista_grid = self._mesh.create_view(dict(),())
+
+        if store is not None:
+            if (store.get_num_nodes() != self._pyvista_grid.n_points or
+                store.get_num_time_steps() != self._time_steps.shape[0] or
+                store.get_components() != components):
+                raise(FieldError("Nodal step store does not match the "+
+                                 "components, number of nodes and time steps "+
+                                 "of the field."))
+            self._store = store
+            return
+
+        self._store = NodalStepStore(components,
+                                     self._pyvista_grid.n_points,
+                                     self._time_steps.shape[0],
+                                     store_dir,
+                                     cache_steps)
+        for cc in components:
+            self._store.set_steps(cc,0,sim_data.node_vars[cc]) # type: ignore
+        self._store.flush()
+
+    def get_time_steps(self) -> np.ndarray:
+        return self._time_steps
+
+    def get_time_interp(self) -> str | TimeKernel:
+        return self._time_interp
+
+    def get_mesh(self) -> FieldMesh:
+        return self._mesh
+
+    def get_sampling_key(self) -> str:
+        return self._mesh.get_sampling_key()
+
+    def get_visualiser(self) -> pv.UnstructuredGrid:
+        return self._pyvista_grid
+
+    def get_visualiser_at_step(self, time_step: int) -> pv.UnstructuredGrid:
+        pv_grid = self._pyvista_grid.copy(deep=False)
+        step_data = self._store.get_step(time_step)
+        for ii,cc in enumerate(self._components):
+            pv_grid[cc] = step_data[:,ii]
+
+        return pv_grid
+
+    def get_all_components(self) -> tuple[str, ...]:
+        return self._components
+
+    def get_component_index(self,comp: str) -> int:
+        return self._components.index(comp)
+
+    def get_nodal_data(self, comp: str) -> np.ndarray:
+        # NOTE: reads every time step of the component from the store
+        return self._store.get_step_chunk(comp,0,self._time_steps.shape[0])
+
+    def get_store(self) -> NodalStepStore:
+        return self._store
+
+    def sample_field(self,
+                sample_points: np.ndarray,
+                sample_times: np.ndarray | None = None
+                ) -> np.ndarray:
+
+        sampler = self._mesh.get_sampler(sample_points)
+
+        n_comps = len(self._components)
+        n_sensors = sampler.get_num_points()
+        n_time_steps = self._time_steps.shape[0]
+        sample_at_sim_time = np.zeros((n_sensors,n_comps,n_time_steps))
+
+        if sample_times is None:
+            for ss in range(0,n_time_steps,self._chunk_steps):
+                step_end = min(ss+self._chunk_steps,n_time_steps)
+                for ii,cc in enumerate(self._components):
+                    sample_at_sim_time[:,ii,ss:step_end] = sampler.sample(
+                        self._store.get_step_chunk(cc,ss,step_end))
+
+            return sample_at_sim_time
+
+        time_interpolator = TimeInterpolator(self._time_steps,
+                                             sample_times,
+                                             self._time_interp)
+
+        for ss in time_interpolator.get_required_steps():
+            sample_at_sim_time[:,:,ss] = sampler.sample(
+                self._store.get_step(ss))
+
+        return time_interpolator.interp(sample_at_sim_time)
@@ -0,0 +1,134 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from typing import Callable
+import numpy as np
+
+TimeKernel = Callable[[np.ndarray,np.ndarray],tuple[np.ndarray,np.ndarray]]
+
+
+class TimeInterpolator:
+    """Interpolates data from simulation time steps to sample times along the
+    last axis. The bracketing indices and weights are calculated once so
+    interpolating a whole (n_sensors,n_comps,n_time_steps) block is a single
+    gather and weighted sum.
+
+    The kernel is 'linear', 'nearest', 'cubic' or a callable taking
+    (time_steps,sample_times) and returning (indices,weights) arrays that
+    are both of shape (n_sample_times,n_kernel_points).
+    """
+    def __init__(self,
+                 time_steps: np.ndarray,
+                 sample_times: np.ndarray,
+                 kernel: str | TimeKernel = 'linear') -> None:
+
+        if isinstance(kernel,str):
+            kernel = _select_time_kernel(kernel)
+
+        (self._inds,self._weights) = kernel(time_steps,sample_times)
+
+    def get_indices(self) -> np.ndarray:
+        return self._inds
+
+    def get_weights(self) -> np.ndarray:
+        return self._weights
+
+    def get_required_steps(self) -> np.ndarray:
+        return np.unique(self._inds)
+
+    def interp(self, data: np.ndarray) -> np.ndarray:
+        return np.einsum('...tk,tk->...t',data[...,self._inds],self._weights)
+
+
+def linear_kernel(time_steps: np.ndarray,
+                  sample_times: np.ndarray
+                  ) -> tuple[np.ndarray,np.ndarray]:
+
+    # NOTE: sample times outside the simulation are clamped to the end values
+    # to be consistent with np.interp
+    n_time_steps = time_steps.shape[0]
+    if n_time_steps == 1:
+        inds = np.zeros((sample_times.shape[0],1),dtype=np.int64)
+        weights = np.ones((sample_times.shape[0],1))
+        return (inds,weights)
+
+    (ind_lo,ind_hi,weight_hi) = _bracket_times(time_steps,sample_times)
+    inds = np.column_stack((ind_lo,ind_hi))
+    weights = np.column_stack((1.0-weight_hi,weight_hi))
+    return (inds,weights)
+
+
+def nearest_kernel(time_steps: np.ndarray,
+                   sample_times: np.ndarray
+                   ) -> tuple[np.ndarray,np.ndarray]:
+
+    n_time_steps = time_steps.shape[0]
+    if n_time_steps == 1:
+        return linear_kernel(time_steps,sample_times)
+
+    (ind_lo,ind_hi,weight_hi) = _bracket_times(time_steps,sample_times)
+    inds = np.where(weight_hi < 0.5,ind_lo,ind_hi)[:,np.newaxis]
+    weights = np.ones(inds.shape)
+    return (inds,weights)
+
+
+def cubic_kernel(time_steps: np.ndarray,
+                 sample_times: np.ndarray
+                 ) -> tuple[np.ndarray,np.ndarray]:
+
+    # NOTE: Lagrange cubic through the 4 time steps around each sample time,
+    # the window is shifted inwards at the ends of the simulation
+    n_time_steps = time_steps.shape[0]
+    n_kernel = 4
+    if n_time_steps < n_kernel:
+        return linear_kernel(time_steps,sample_times)
+
+    sample_times = np.clip(sample_times,time_steps[0],time_steps[-1])
+    (ind_lo,_,_) = _bracket_times(time_steps,sample_times)
+
+    ind_start = np.clip(ind_lo-1,0,n_time_steps-n_kernel)
+    inds = ind_start[:,np.newaxis] + np.arange(n_kernel)
+    kernel_times = time_steps[inds]
+
+    weights = np.ones(inds.shape)
+    for jj in range(n_kernel):
+        for mm in range(n_kernel):
+            if mm == jj:
+                continue
+            weights[:,jj] *= ((sample_times - kernel_times[:,mm])
+                              / (kernel_times[:,jj] - kernel_times[:,mm]))
+
+    return (inds,weights)
+
+
+def _bracket_times(time_steps: np.ndarray,
+                   sample_times: np.ndarray
+                   ) -> tuple[np.ndarray,np.ndarray,np.ndarray]:
+
+    n_time_steps = time_steps.shape[0]
+    ind_hi = np.searchsorted(time_steps,sample_times,side='right')
+    ind_hi = np.clip(ind_hi,1,n_time_steps-1)
+    ind_lo = ind_hi - 1
+
+    time_lo = time_steps[ind_lo]
+    time_step = time_steps[ind_hi] - time_lo
+    time_step[time_step == 0.0] = 1.0
+
+    weight_hi = np.clip((sample_times - time_lo)/time_step,0.0,1.0)
+    return (ind_lo,ind_hi,weight_hi)
+
+
+def _select_time_kernel(kernel: str) -> TimeKernel:
+    if kernel == 'linear':
+        return linear_kernel
+    if kernel == 'nearest':
+        return nearest_kernel
+    if kernel == 'cubic':
+        return cubic_kernel
+
+    raise ValueError(f"Time interpolation kernel '{kernel}' is not supported, "+
+                     "use 'linear', 'nearest' or 'cubic'.")
@@ -12,18 +12,25 @@ import mooseherder as mh
 
 from pyvale.physics.field import (IField,
                                   FieldError,
-                                  conv_simdata_to_pyvista,
-                                  sample_pyvista)
+                                  get_step_visualiser,
+                                  sample_pointsampler)
+from pyvale.physics.fieldmesh import FieldMesh, create_field_mesh
+from pyvale.physics.timeinterp import TimeKernel
 
 class VectorField(IField):
     def __init__(self,
                  sim_data: mh.SimData,
                  field_key: str,
                  components: tuple[str,...],
-                 spat_dim: int) -> None:
+                 spat_dim: int,
+                 time_interp: str | TimeKernel = 'linear',
+                 elem_types: dict[str,str] | None = None,
+                 corner_nodes_only: bool = False,
+                 mesh: FieldMesh | None = None) -> None:
 
         self._field_key = field_key
         self._components = components
+        self._time_interp = time_interp
 
         self.all_components = self._components
 
@@ -31,30 +38,55 @@ class VectorField(IField):
             raise(FieldError("SimData.time is None. SimData does not have time steps"))
         self._time_steps = sim_data.time
 
-        self._pyvista_grid = conv_simdata_to_pyvista(sim_data,
-                                                    components,
-                                                    spat_dim)
+        if sim_data.node_vars is None:
+            raise(FieldError("SimData does not contain node_vars."))
+
+        self._mesh = create_field_mesh(sim_data,
+                                       spat_dim,
+                                       elem_types,
+                                       corner_nodes_only,
+                                       mesh)
+        self._pyvista_grid = self._mesh.create_view(sim_data.node_vars,
+                                                    components)
 
     def get_time_steps(self) -> np.ndarray:
         return self._time_steps
 
+    def get_time_interp(self) -> str | TimeKernel:
+        return self._time_interp
+
+    def get_mesh(self) -> FieldMesh:
+        return self._mesh
+
+    def get_sampling_key(self) -> str:
+        return self._mesh.get_sampling_key()
+
     def get_visualiser(self) -> pv.UnstructuredGrid:
         return self._pyvista_grid
 
+    def get_visualiser_at_step(self, time_step: int) -> pv.UnstructuredGrid:
+        return get_step_visualiser(self._pyvista_grid,
+                                   self._components,
+                                   time_step)
+
     def get_all_components(self) -> tuple[str, ...]:
         return self._components
 
     def get_component_index(self,comp: str) -> int:
         return self._components.index(comp)
 
+    def get_nodal_data(self, comp: str) -> np.ndarray:
+        return np.asarray(self._pyvista_grid[comp])
+
     def sample_field(self,
                 sample_points: np.ndarray,
                 sample_times: np.ndarray | None = None
                 ) -> np.ndarray:
 
-        return sample_pyvista(self._components,
-                                self._pyvista_grid,
-                                self._time_steps,
-                                sample_points,
-                                sample_times)
-
+        sampler = self._mesh.get_sampler(sample_points)
+        return sample_pointsampler(self._components,
+                                   self._pyvista_grid,
+                                   self._time_steps,
+                                   sampler,
+                                   sample_times,
+                                   self._time_interp)
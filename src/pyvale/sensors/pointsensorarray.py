@@ -5,12 +5,16 @@ License: MIT
 Copyright (C) 2024 The Computer Aided Validation Team
 ================================================================================
 '''
+from typing import Iterator
 import numpy as np
 import pyvista as pv
 
 from pyvale.physics.field import IField
 from pyvale.uncertainty.errorintegrator import ErrorIntegrator
 from pyvale.sensors.sensordescriptor import SensorDescriptor
+from pyvale.sensors.truthcache import (TruthCache,
+                                       calc_field_hash,
+                                       calc_truth_key)
 
 
 class PointSensorArray():
@@ -32,6 +36,9 @@ class PointSensorArray():
         self._truth = None
         self._measurements = None
 
+        self._truth_cache = None
+        self._sim_key = None
+
         self._pre_syserr_integ = None
         self._randerr_integ = None
         self._post_syserr_integ = None
@@ -66,10 +73,84 @@ class PointSensorArray():
 
     def get_truth_values(self) -> np.ndarray:
         if self._truth is None:
-            self._truth = self.calc_truth_values()
+            self._truth = self._load_or_calc_truth_values()
 
         return self._truth
 
+    def set_sensor_positions(self,
+                             sensor_inds: np.ndarray,
+                             positions: np.ndarray) -> None:
+        # NOTE: only the moved sensors are sampled again, the truth values,
+        # error buffers and measurements of the other sensors are kept so
+        # moving a few sensors costs the same as sampling a few sensors
+        sensor_inds = np.atleast_1d(np.asarray(sensor_inds,dtype=np.int64))
+        positions = np.atleast_2d(np.asarray(positions,dtype=np.float64))
+        if positions.shape != (sensor_inds.shape[0],self._positions.shape[1]):
+            raise ValueError("Number of new positions does not match the "+
+                             "number of sensors being moved.")
+
+        # Copied so the positions array given to the sensor array is unchanged
+        self._positions = np.array(self._positions,dtype=np.float64)
+        self._positions[sensor_inds,:] = positions
+
+        if self._truth is None:
+            self._measurements = None
+            return
+
+        truth = self._field.sample_field(positions,self._sample_times)
+        self._truth[sensor_inds,:,:] = truth
+
+        if self._measurements is None:
+            return
+
+        measurements = truth
+        if self._pre_syserr_integ is not None:
+            measurements = measurements + \
+                self._pre_syserr_integ.calc_errs_static_subset(truth,
+                                                               sensor_inds)
+
+        if self._randerr_integ is not None:
+            measurements = measurements + \
+                self._randerr_integ.calc_errs_static_subset(truth,
+                                                            sensor_inds)
+
+        if self._post_syserr_integ is not None:
+            measurements = measurements + \
+                self._post_syserr_integ.calc_errs_recursive_subset(
+                    measurements,sensor_inds)
+
+        self._measurements[sensor_inds,:,:] = measurements
+
+    def set_truth_cache(self,
+                        truth_cache: TruthCache | None,
+                        sim_key: str | None = None) -> None:
+        # NOTE: sim_key identifies the simulation, e.g. calc_file_hash of the
+        # output file, if it is None the field data is hashed instead
+        self._truth_cache = truth_cache
+        self._sim_key = sim_key
+
+    def get_truth_cache(self) -> TruthCache | None:
+        return self._truth_cache
+
+    def _load_or_calc_truth_values(self) -> np.ndarray:
+        if self._truth_cache is None:
+            return self.calc_truth_values()
+
+        if self._sim_key is None:
+            self._sim_key = calc_field_hash(self._field)
+
+        key = calc_truth_key(self._sim_key,
+                             self._field,
+                             self._positions,
+                             self._sample_times)
+
+        truth = self._truth_cache.load(key)
+        if truth is None or truth.shape != self.get_measurement_shape():
+            truth = self.calc_truth_values()
+            self._truth_cache.save(key,truth)
+
+        return truth
+
     #---------------------------------------------------------------------------
     # pre / independent / truth-based  systematic errors
     def set_indep_sys_err_integrator(self,
@@ -161,6 +242,39 @@ class PointSensorArray():
 
         return self._measurements
 
+    #---------------------------------------------------------------------------
+    # batched measurements for monte carlo sampling
+    def calc_measurements_batch(self, n_samples: int) -> np.ndarray:
+        # NOTE: output shape is (n_samples,n_sensors,n_comps,n_time_steps), the
+        # error integrator buffers and stored measurements are not modified
+        truth = self.get_truth_values()
+        truth_batch = np.broadcast_to(truth,(n_samples,)+truth.shape)
+        measurements = np.array(truth_batch)
+
+        if self._pre_syserr_integ is not None:
+            measurements += self._pre_syserr_integ.calc_errs_static_batch(
+                truth_batch)
+
+        if self._randerr_integ is not None:
+            measurements += self._randerr_integ.calc_errs_static_batch(
+                truth_batch)
+
+        if self._post_syserr_integ is not None:
+            measurements += self._post_syserr_integ.calc_errs_recursive_batch(
+                measurements)
+
+        return measurements
+
+
+    def iter_measurements_batch(self,
+                                n_samples: int,
+                                batch_size: int) -> Iterator[np.ndarray]:
+        if batch_size < 1:
+            raise ValueError("Batch size must be greater than 0.")
+
+        for ss in range(0,n_samples,batch_size):
+            yield self.calc_measurements_batch(min(batch_size,n_samples-ss))
+
     #---------------------------------------------------------------------------
     # visualisation tools
     def get_visualiser(self) -> pv.PolyData:
@@ -12,6 +12,7 @@ import mooseherder as mh
 from pyvale.physics.scalarfield import ScalarField
 from pyvale.physics.vectorfield import VectorField
 from pyvale.physics.tensorfield import TensorField
+from pyvale.physics.fieldmesh import FieldMesh
 from pyvale.sensors.sensordescriptor import SensorDescriptorFactory
 from pyvale.sensors.pointsensorarray import PointSensorArray
 from pyvale.uncertainty.errorintegrator import ErrorIntegrator
@@ -27,12 +28,13 @@ class SensorArrayFactory:
                                  positions: np.ndarray,
                                  field_name: str = "temperature",
                                  spat_dims: int = 3,
-                                 sample_times: np.ndarray | None = None
+                                 sample_times: np.ndarray | None = None,
+                                 mesh: FieldMesh | None = None
                                  ) -> PointSensorArray:
 
         descriptor = SensorDescriptorFactory.temperature_descriptor()
 
-        t_field = ScalarField(sim_data,field_name,spat_dims)
+        t_field = ScalarField(sim_data,field_name,spat_dims,mesh=mesh)
 
         sens_array = PointSensorArray(positions,
                                       t_field,
@@ -54,7 +56,8 @@ class SensorArrayFactory:
                             positions: np.ndarray,
                             field_name: str = "displacement",
                             spat_dims: int = 3,
-                            sample_times: np.ndarray | None = None
+                            sample_times: np.ndarray | None = None,
+                            mesh: FieldMesh | None = None
                             ) -> PointSensorArray:
 
         descriptor = SensorDescriptorFactory.displacement_descriptor()
@@ -62,7 +65,8 @@ class SensorArrayFactory:
         disp_field = VectorField(sim_data,
                                  field_name,
                                  ('disp_x','disp_y'),
-                                 spat_dims)
+                                 spat_dims,
+                                 mesh=mesh)
 
         sens_array = PointSensorArray(positions,
                                       disp_field,
@@ -78,7 +82,8 @@ class SensorArrayFactory:
                                 positions: np.ndarray,
                                 field_name: str = "strain",
                                 spat_dims: int = 3,
-                                sample_times: np.ndarray | None = None
+                                sample_times: np.ndarray | None = None,
+                                mesh: FieldMesh | None = None
                                 ) -> PointSensorArray:
 
         descriptor = SensorDescriptorFactory.strain_descriptor()
@@ -94,7 +99,8 @@ class SensorArrayFactory:
                                  field_name,
                                  norm_components,
                                  dev_components,
-                                 spat_dims)
+                                 spat_dims,
+                                 mesh=mesh)
 
         sens_array = PointSensorArray(positions,
                                       strain_field,
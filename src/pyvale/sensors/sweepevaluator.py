@@ -0,0 +1,157 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+import os
+
+import numpy as np
+
+import mooseherder as mh
+
+from pyvale.physics.elemtypes import read_exodus_elem_types
+from pyvale.physics.fieldmesh import FieldMesh, mesh_hash
+from pyvale.sensors.pointsensorarray import PointSensorArray
+from pyvale.sensors.measurementdata import MeasurementData
+
+# Called as array_builder(sim_data,mesh=mesh), must be picklable so use a
+# module level function or a functools.partial of one e.g. a
+# SensorArrayFactory method with the positions bound.
+SensorArrayBuilder = Callable[...,PointSensorArray]
+
+
+class SweepEvaluator:
+    """Evaluates the same sensor array template on every simulation output of
+    a parameter sweep using a process pool. Each worker keeps the field meshes
+    it has built keyed by a hash of the coordinates and connectivity, so
+    simulations on an identical mesh reuse the mesh and the sensor point
+    location.
+    """
+    def __init__(self,
+                 array_builder: SensorArrayBuilder,
+                 spat_dim: int,
+                 n_workers: int | None = None,
+                 n_samples: int | None = None,
+                 corner_nodes_only: bool = False,
+                 max_meshes: int = 4) -> None:
+
+        self._n_workers = n_workers
+        if n_workers is None:
+            self._n_workers = os.cpu_count() or 1
+
+        self._worker_args = (array_builder,
+                             spat_dim,
+                             n_samples,
+                             corner_nodes_only,
+                             max_meshes)
+
+    def get_num_workers(self) -> int:
+        return self._n_workers
+
+    def evaluate(self, sims: list[mh.SimData | Path]) -> MeasurementData:
+        # NOTE: truth is (n_sims,n_sensors,n_comps,n_time_steps), measurements
+        # have the same shape or (n_sims,n_samples,...) if n_samples is set
+        if len(sims) == 0:
+            raise ValueError("No simulations given to evaluate.")
+
+        n_workers = min(self._n_workers,len(sims))
+        if n_workers <= 1:
+            sweep_worker = SweepWorker(*self._worker_args)
+            results = [sweep_worker.evaluate(ss) for ss in sims]
+        else:
+            # NOTE: contiguous chunks keep sims from the same part of the sweep
+            # on the same worker, which is where identical meshes usually are
+            chunk_size = max(1,len(sims) // (4*n_workers))
+            with ProcessPoolExecutor(max_workers=n_workers,
+                                     initializer=_init_sweep_worker,
+                                     initargs=self._worker_args) as executor:
+                results = list(executor.map(_eval_sweep_worker,
+                                            sims,
+                                            chunksize=chunk_size))
+
+        truth_shapes = {rr[0].shape for rr in results}
+        if len(truth_shapes) > 1:
+            raise ValueError("Sensor arrays in the sweep do not have the same "+
+                             f"measurement shape: {truth_shapes}. Set "+
+                             "sample_times in the array builder.")
+
+        sweep_data = MeasurementData()
+        sweep_data.truth_values = np.stack([rr[0] for rr in results])
+        sweep_data.measurements = np.stack([rr[1] for rr in results])
+        return sweep_data
+
+
+class SweepWorker:
+    """Builds and evaluates sensor arrays for single simulations within one
+    process, holding an LRU cache of the field meshes.
+    """
+    def __init__(self,
+                 array_builder: SensorArrayBuilder,
+                 spat_dim: int,
+                 n_samples: int | None = None,
+                 corner_nodes_only: bool = False,
+                 max_meshes: int = 4) -> None:
+
+        self._array_builder = array_builder
+        self._spat_dim = spat_dim
+        self._n_samples = n_samples
+        self._corner_nodes_only = corner_nodes_only
+        self._max_meshes = max_meshes
+        self._meshes: OrderedDict[str,FieldMesh] = OrderedDict()
+
+    def get_mesh(self,
+                 sim_data: mh.SimData,
+                 elem_types: dict[str,str] | None = None) -> FieldMesh:
+
+        key = mesh_hash(sim_data) + str(elem_types)
+        if key in self._meshes:
+            self._meshes.move_to_end(key)
+            return self._meshes[key]
+
+        mesh = FieldMesh(sim_data,
+                         self._spat_dim,
+                         elem_types,
+                         self._corner_nodes_only)
+        self._meshes[key] = mesh
+
+        if len(self._meshes) > self._max_meshes:
+            self._meshes.popitem(last=False)
+
+        return mesh
+
+    def evaluate(self, sim: mh.SimData | Path
+                 ) -> tuple[np.ndarray,np.ndarray]:
+
+        elem_types = None
+        if isinstance(sim,Path):
+            elem_types = read_exodus_elem_types(sim)
+            sim = mh.ExodusReader(sim).read_all_sim_data()
+
+        mesh = self.get_mesh(sim,elem_types)
+        sens_array = self._array_builder(sim,mesh=mesh)
+
+        truth = sens_array.get_truth_values()
+        if self._n_samples is None:
+            return (truth,sens_array.get_measurements())
+
+        return (truth,sens_array.calc_measurements_batch(self._n_samples))
+
+
+# NOTE: each pool process holds a single worker so the mesh cache persists
+# between the simulations it is given
+_sweep_worker: SweepWorker | None = None
+
+def _init_sweep_worker(*worker_args) -> None:
+    global _sweep_worker
+    _sweep_worker = SweepWorker(*worker_args)
+
+
+def _eval_sweep_worker(sim: mh.SimData | Path
+                       ) -> tuple[np.ndarray,np.ndarray]:
+    return _sweep_worker.evaluate(sim) # type: ignore
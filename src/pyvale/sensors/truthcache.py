@@ -0,0 +1,170 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from pyvale.physics.field import IField
+
+
+class TruthCache:
+    """On-disk cache of sampled sensor truth values, one .npy file per key in
+    a user cache directory. Reading a file marks it as recently used and once
+    the files take more than max_bytes the least recently used are deleted.
+    """
+    def __init__(self,
+                 cache_dir: Path | None = None,
+                 max_bytes: int = 2**30) -> None:
+
+        if cache_dir is None:
+            cache_dir = get_user_cache_dir() / 'truth'
+
+        cache_dir.mkdir(parents=True,exist_ok=True)
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+
+    def get_cache_dir(self) -> Path:
+        return self._cache_dir
+
+    def get_max_bytes(self) -> int:
+        return self._max_bytes
+
+    def get_cache_file(self, key: str) -> Path:
+        return self._cache_dir / f'{key}.npy'
+
+    def load(self, key: str) -> np.ndarray | None:
+        cache_file = self.get_cache_file(key)
+        try:
+            truth = np.load(cache_file)
+        except (OSError,ValueError):
+            # NOTE: missing or partly deleted files are sampled again
+            return None
+
+        # Mark as recently used for the eviction order
+        try:
+            os.utime(cache_file)
+        except OSError:
+            pass
+
+        return truth
+
+    def save(self, key: str, truth: np.ndarray) -> None:
+        cache_file = self.get_cache_file(key)
+
+        # NOTE: written to a temporary file and moved so other processes
+        # sharing the cache never read a partial file
+        temp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(temp_file,'wb') as truth_file:
+                np.save(truth_file,truth)
+            os.replace(temp_file,cache_file)
+        except OSError:
+            temp_file.unlink(missing_ok=True)
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        cache_files = list()
+        for ff in self._cache_dir.glob('*.npy'):
+            try:
+                file_stat = ff.stat()
+            except OSError:
+                continue
+            cache_files.append((file_stat.st_mtime_ns,file_stat.st_size,ff))
+
+        total_bytes = sum(cc[1] for cc in cache_files)
+        for (_,file_size,ff) in sorted(cache_files,key=lambda cc: cc[0]):
+            if total_bytes <= self._max_bytes:
+                break
+
+            ff.unlink(missing_ok=True)
+            total_bytes -= file_size
+
+    def clear(self) -> None:
+        for ff in self._cache_dir.glob('*.npy'):
+            ff.unlink(missing_ok=True)
+
+
+def get_user_cache_dir() -> Path:
+    # NOTE: the PYVALE_CACHE_DIR environment variable overrides the platform
+    # default cache location
+    env_dir = os.environ.get('PYVALE_CACHE_DIR')
+    if env_dir:
+        return Path(env_dir)
+
+    if sys.platform == 'win32':
+        base_dir = os.environ.get('LOCALAPPDATA',Path.home()/'AppData'/'Local')
+        return Path(base_dir) / 'pyvale' / 'Cache'
+
+    if sys.platform == 'darwin':
+        return Path.home() / 'Library' / 'Caches' / 'pyvale'
+
+    base_dir = os.environ.get('XDG_CACHE_HOME',Path.home()/'.cache')
+    return Path(base_dir) / 'pyvale'
+
+
+def calc_file_hash(file_path: Path, chunk_bytes: int = 2**24) -> str:
+    # Hash of the simulation output file, cheaper than hashing the field data
+    file_hasher = hashlib.sha1()
+    with open(file_path,'rb') as sim_file:
+        while chunk := sim_file.read(chunk_bytes):
+            file_hasher.update(chunk)
+
+    return file_hasher.hexdigest()
+
+
+def calc_field_hash(field: IField) -> str:
+    # NOTE: hashes the mesh, time steps and the nodal data of every component
+    field_hasher = hashlib.sha1()
+    pv_grid = field.get_visualiser()
+    _update_hash(field_hasher,pv_grid.points)
+    _update_hash(field_hasher,pv_grid.cell_connectivity)
+    _update_hash(field_hasher,pv_grid.celltypes)
+    _update_hash(field_hasher,field.get_time_steps())
+
+    for cc in field.get_all_components():
+        field_hasher.update(cc.encode())
+        _update_hash(field_hasher,field.get_nodal_data(cc))
+
+    return field_hasher.hexdigest()
+
+
+def calc_truth_key(sim_key: str,
+                   field: IField,
+                   positions: np.ndarray,
+                   sample_times: np.ndarray | None) -> str:
+    # NOTE: the sampling key of the field covers the mesh and the settings
+    # used to sample it, e.g. the tolerance for sensors outside the mesh
+    key_hasher = hashlib.sha1(sim_key.encode())
+    key_hasher.update(type(field).__name__.encode())
+    key_hasher.update(str(field.get_all_components()).encode())
+    key_hasher.update(field.get_sampling_key().encode())
+
+    time_interp = field.get_time_interp()
+    if not isinstance(time_interp,str):
+        time_interp = (f'{time_interp.__module__}.'+
+                       f'{getattr(time_interp,"__qualname__",time_interp)}')
+    key_hasher.update(time_interp.encode())
+
+    _update_hash(key_hasher,np.asarray(positions,dtype=np.float64))
+    if sample_times is None:
+        key_hasher.update(b'sim_times')
+    else:
+        _update_hash(key_hasher,np.asarray(sample_times,dtype=np.float64))
+
+    return key_hasher.hexdigest()
+
+
+def _update_hash(hasher, arr) -> None:
+    arr = np.ascontiguousarray(arr)
+    hasher.update(f'{arr.dtype.str}{arr.shape}'.encode())
+    hasher.update(arr.tobytes())
@@ -45,6 +45,52 @@ class ErrorIntegrator():
         self._errs_tot = np.sum(self._errs_by_func,axis=0)
         return self._errs_tot
 
+    def calc_errs_static_subset(self,
+                                err_basis: np.ndarray,
+                                sensor_inds: np.ndarray) -> np.ndarray:
+        # NOTE: err_basis only has the rows of the given sensors, the buffers
+        # are patched for those sensors and the rest are left as they are
+        for ii,ff in enumerate(self._err_calcs):
+            self._errs_by_func[ii,sensor_inds,:,:] = ff.calc_errs(err_basis)
+
+        self._errs_tot[sensor_inds,:,:] = np.sum(
+            self._errs_by_func[:,sensor_inds,:,:],axis=0)
+        return self._errs_tot[sensor_inds,:,:]
+
+    def calc_errs_recursive_subset(self,
+                                   err_basis: np.ndarray,
+                                   sensor_inds: np.ndarray) -> np.ndarray:
+
+        current_basis = np.copy(err_basis)
+        for ii,ff in enumerate(self._err_calcs):
+            errs = ff.calc_errs(current_basis)
+            self._errs_by_func[ii,sensor_inds,:,:] = errs
+            current_basis = current_basis + errs
+
+        self._errs_tot[sensor_inds,:,:] = np.sum(
+            self._errs_by_func[:,sensor_inds,:,:],axis=0)
+        return self._errs_tot[sensor_inds,:,:]
+
+    def calc_errs_static_batch(self, err_basis: np.ndarray) -> np.ndarray:
+        # NOTE: err_basis has a leading samples axis so each calculator draws
+        # all samples in one call, only the total is kept to save memory
+        errs_tot = np.zeros(err_basis.shape)
+        for ff in self._err_calcs:
+            errs_tot += ff.calc_errs(err_basis)
+
+        return errs_tot
+
+    def calc_errs_recursive_batch(self, err_basis: np.ndarray) -> np.ndarray:
+
+        current_basis = np.copy(err_basis)
+        errs_tot = np.zeros(err_basis.shape)
+        for ff in self._err_calcs:
+            errs = ff.calc_errs(current_basis)
+            current_basis += errs
+            errs_tot += errs
+
+        return errs_tot
+
     def get_errs_by_func(self) -> np.ndarray:
         return self._errs_by_func
 
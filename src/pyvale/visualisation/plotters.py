@@ -22,7 +22,7 @@ def plot_sensors_on_sim(sensor_array: PointSensorArray,
                         time_step: int = -1,
                         ) -> Any:
 
-    pv_simdata = sensor_array.get_field().get_visualiser()
+    pv_simdata = sensor_array.get_field().get_visualiser_at_step(time_step)
     pv_sensdata = sensor_array.get_visualiser()
     comp_ind = sensor_array.get_field().get_component_index(component)
 
@@ -42,7 +42,7 @@ def plot_sensors_on_sim(sensor_array: PointSensorArray,
                             )
 
     pv_plot.add_mesh(pv_simdata,
-                     scalars=pv_simdata[component][:,time_step],
+                     scalars=component,
                      label='sim-data',
                      show_edges=True,
                      show_scalar_bar=False)
@@ -0,0 +1,171 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import numpy as np
+import pytest
+import pyvista as pv
+import vtk
+import mooseherder as mh
+
+from pyvale.physics.elemtypes import ELEM_TYPE_TABLE
+from pyvale.physics.field import create_pyvista_mesh
+
+
+# NOTE: nodes of each element in exodus order given as the corners they are
+# the centre of, from the node numbering in the exodus II manual
+HEX_CORNERS = ((0,),(1,),(2,),(3,),(4,),(5,),(6,),(7,))
+HEX_EDGES = ((0,1),(1,2),(2,3),(3,0),
+             (0,4),(1,5),(2,6),(3,7),
+             (4,5),(5,6),(6,7),(7,4))
+# Centre then the faces z-, z+, x-, x+, y-, y+
+HEX_CENTRE_FACES = ((0,1,2,3,4,5,6,7),
+                    (0,1,2,3),(4,5,6,7),
+                    (0,3,7,4),(1,2,6,5),
+                    (0,1,5,4),(3,2,6,7))
+
+EXODUS_NODES = {
+    ('BAR',3): ((0,),(1,),(0,1)),
+    ('TRI',6): ((0,),(1,),(2,),(0,1),(1,2),(2,0)),
+    ('TRI',7): ((0,),(1,),(2,),(0,1),(1,2),(2,0),(0,1,2)),
+    ('QUAD',8): ((0,),(1,),(2,),(3,),(0,1),(1,2),(2,3),(3,0)),
+    ('QUAD',9): ((0,),(1,),(2,),(3,),(0,1),(1,2),(2,3),(3,0),(0,1,2,3)),
+    ('TET',10): ((0,),(1,),(2,),(3,),
+                 (0,1),(1,2),(2,0),(0,3),(1,3),(2,3)),
+    ('PYRAMID',13): ((0,),(1,),(2,),(3,),(4,),
+                     (0,1),(1,2),(2,3),(3,0),(0,4),(1,4),(2,4),(3,4)),
+    ('WEDGE',15): ((0,),(1,),(2,),(3,),(4,),(5,),
+                   (0,1),(1,2),(2,0),(0,3),(1,4),(2,5),(3,4),(4,5),(5,3)),
+    ('HEX',20): HEX_CORNERS + HEX_EDGES,
+    ('HEX',27): HEX_CORNERS + HEX_EDGES + HEX_CENTRE_FACES,
+}
+
+# Corners of the reference elements, pyramid apex over the base centre
+REF_CORNERS = {
+    'BAR': ((0,0,0),(1,0,0)),
+    'TRI': ((0,0,0),(1,0,0),(0,1,0)),
+    'QUAD': ((0,0,0),(1,0,0),(1,1,0),(0,1,0)),
+    'TET': ((0,0,0),(1,0,0),(0,1,0),(0,0,1)),
+    'PYRAMID': ((0,0,0),(1,0,0),(1,1,0),(0,1,0),(0.5,0.5,1)),
+    'WEDGE': ((0,0,0),(1,0,0),(0,1,0),(0,0,1),(1,0,1),(0,1,1)),
+    'HEX': ((0,0,0),(1,0,0),(1,1,0),(0,1,0),(0,0,1),(1,0,1),(1,1,1),(0,1,1)),
+}
+
+SPAT_DIMS = {'BAR': 2, 'TRI': 2, 'QUAD': 2,
+             'TET': 3, 'PYRAMID': 3, 'WEDGE': 3, 'HEX': 3}
+
+
+# NOTE: fields are functions of the reference element coordinates so they are
+# in the span of the element shape functions after the affine map
+def quadratic_field(ref_points: np.ndarray) -> np.ndarray:
+    (x,y,z) = (ref_points[:,0],ref_points[:,1],ref_points[:,2])
+    return 1.0 + x - 2.0*y + 0.5*z + x*x - 0.7*x*y + 1.3*y*y + 0.4*y*z
+
+def biquadratic_field(ref_points: np.ndarray) -> np.ndarray:
+    (x,y) = (ref_points[:,0],ref_points[:,1])
+    return quadratic_field(ref_points) + 0.8*x*x*y*y - 0.6*x*x*y
+
+def triquadratic_field(ref_points: np.ndarray) -> np.ndarray:
+    (x,y,z) = (ref_points[:,0],ref_points[:,1],ref_points[:,2])
+    return (biquadratic_field(ref_points) + 1.1*x*x*y*y*z*z
+            - 0.9*x*y*z*z + 0.5*x*x*z)
+
+def pyramid_field(ref_points: np.ndarray) -> np.ndarray:
+    # The vtk quadratic pyramid does not span x^2 and y^2
+    (x,y,z) = (ref_points[:,0],ref_points[:,1],ref_points[:,2])
+    return 1.0 + x - 2.0*y + 0.5*z - 0.7*x*y + 0.4*y*z + 0.3*x*z + 0.6*z*z
+
+ELEM_FIELDS = {
+    ('QUAD',9): biquadratic_field,
+    ('PYRAMID',13): pyramid_field,
+    ('HEX',27): triquadratic_field,
+}
+
+HIGHER_ORDER_ELEMS = tuple(EXODUS_NODES.keys())
+
+# NOTE: vtk finds the parametric coordinates of a point in a higher order cell
+# iteratively so interpolation is only exact to about 1e-3
+INTERP_TOL = 1e-2
+
+
+def map_to_elem(ref_points: np.ndarray, spat_dim: int) -> np.ndarray:
+    # Affine map skewing the reference element so the element axes are not
+    # aligned with the global axes
+    affine = np.array(((1.5,0.3,0.2),
+                       (-0.2,1.2,0.1),
+                       (0.1,-0.3,0.9)))
+    offset = np.array((0.5,-1.0,2.0))
+    if spat_dim == 2:
+        affine[2,:] = 0.0
+        affine[:,2] = 0.0
+        offset[2] = 0.0
+
+    return ref_points @ affine.T + offset
+
+
+def get_ref_nodes(elem_key: tuple[str,int]) -> np.ndarray:
+    ref_corners = np.array(REF_CORNERS[elem_key[0]],dtype=np.float64)
+    return np.array([np.mean(ref_corners[list(nn),:],axis=0)
+                     for nn in EXODUS_NODES[elem_key]])
+
+
+def build_exodus_elem(elem_key: tuple[str,int]) -> pv.UnstructuredGrid:
+    # Single element mesh built from exodus connectivity as read from file
+    spat_dim = SPAT_DIMS[elem_key[0]]
+    coords = map_to_elem(get_ref_nodes(elem_key),spat_dim)
+
+    sim_data = mh.SimData()
+    sim_data.coords = coords
+    sim_data.connect = {'connect1':
+                        np.arange(1,coords.shape[0]+1)[:,np.newaxis]}
+
+    return create_pyvista_mesh(sim_data,
+                               spat_dim,
+                               {'connect1': elem_key[0]})
+
+
+def get_vtk_param_coords(cell_type: int) -> np.ndarray:
+    vtk_cell = vtk.vtkGenericCell()
+    vtk_cell.SetCellType(cell_type)
+    return np.array(vtk_cell.GetParametricCoords()).reshape(-1,3)
+
+
+@pytest.mark.parametrize('elem_key',HIGHER_ORDER_ELEMS)
+def test_exodus_nodes_at_vtk_param_coords(elem_key):
+    # NOTE: vtk parametric coordinates of the quadratic pyramid are those of a
+    # collapsed hex so its nodes are checked by interpolation only
+    if elem_key[0] == 'PYRAMID':
+        pytest.skip('Pyramid parametric coordinates are not affine.')
+
+    elem_type = ELEM_TYPE_TABLE[elem_key]
+    vtk_nodes = get_ref_nodes(elem_key)
+    if elem_type.node_order is not None:
+        vtk_nodes = vtk_nodes[np.array(elem_type.node_order),:]
+
+    assert np.allclose(vtk_nodes,get_vtk_param_coords(elem_type.cell_type))
+
+
+@pytest.mark.parametrize('elem_key',HIGHER_ORDER_ELEMS)
+def test_exodus_elem_interpolation(elem_key):
+    spat_dim = SPAT_DIMS[elem_key[0]]
+    pv_grid = build_exodus_elem(elem_key)
+    assert pv_grid.celltypes[0] == ELEM_TYPE_TABLE[elem_key].cell_type
+
+    field = ELEM_FIELDS.get(elem_key,quadratic_field)
+    pv_grid['field'] = field(get_ref_nodes(elem_key))
+
+    # Off centre points inside the element
+    ref_corners = np.array(REF_CORNERS[elem_key[0]],dtype=np.float64)
+    rng = np.random.default_rng(7)
+    weights = rng.dirichlet(np.full(ref_corners.shape[0],0.5),size=25)
+    ref_points = weights @ ref_corners
+
+    sample_data = pv.PolyData(map_to_elem(ref_points,spat_dim)).sample(pv_grid)
+    assert np.all(np.asarray(sample_data['vtkValidPointMask']))
+    assert np.allclose(np.asarray(sample_data['field']),
+                       field(ref_points),
+                       rtol=0.0,
+                       atol=INTERP_TOL)
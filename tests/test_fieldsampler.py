@@ -0,0 +1,126 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import numpy as np
+import pytest
+import pyvista as pv
+
+from pyvale.physics.field import sample_pyvista
+from pyvale.physics.cellindex import CellIndex
+from pyvale.physics.fieldsampler import PointSampler, find_rect_grid
+
+
+def rotate_x(points: np.ndarray, angle: float) -> np.ndarray:
+    rot = np.array(((1.0,0.0,0.0),
+                    (0.0,np.cos(angle),-np.sin(angle)),
+                    (0.0,np.sin(angle),np.cos(angle))))
+    return points @ rot.T
+
+
+def build_plane(tris: bool, angle: float = 0.0) -> pv.UnstructuredGrid:
+    plane = pv.Plane(i_resolution=10,j_resolution=10)
+    plane = plane.cast_to_unstructured_grid()
+    if tris:
+        plane = plane.triangulate()
+
+    return pv.UnstructuredGrid(plane.cells,
+                               plane.celltypes,
+                               rotate_x(np.asarray(plane.points),angle))
+
+
+def build_block(tets: bool) -> pv.UnstructuredGrid:
+    block = pv.ImageData(dimensions=(6,5,4),spacing=(0.2,0.25,0.3))
+    block = block.cast_to_unstructured_grid()
+    if tets:
+        block = block.triangulate()
+
+    return block
+
+
+def gen_plane_points(angle: float) -> np.ndarray:
+    # Points in the plane, some past its edges, and points off the plane by
+    # less and more than the vtk probe tolerance
+    rng = np.random.default_rng(11)
+    in_plane = np.zeros((60,3))
+    in_plane[:,:2] = rng.uniform(-0.6,0.6,(60,2))
+    normal = rotate_x(np.array(((0.0,0.0,1.0),)),angle)
+
+    return np.vstack((rotate_x(in_plane,angle),
+                      rotate_x(in_plane[:10],angle) + 1e-6*normal,
+                      rotate_x(in_plane[10:20],angle) + 1e-2*normal))
+
+
+def gen_block_points(pv_grid: pv.UnstructuredGrid) -> np.ndarray:
+    # Points inside the block, outside it and on its boundary faces
+    rng = np.random.default_rng(13)
+    bounds = np.array(pv_grid.bounds).reshape(3,2)
+    span = bounds[:,1] - bounds[:,0]
+    points = rng.uniform(bounds[:,0] - 0.1*span,
+                         bounds[:,1] + 0.1*span,
+                         (80,3))
+    on_face = rng.uniform(bounds[:,0],bounds[:,1],(20,3))
+    on_face[:10,0] = bounds[0,0]
+    on_face[10:,2] = bounds[2,1]
+    return np.vstack((points,on_face))
+
+
+MESH_CASES = {
+    'tri_2d': (lambda: build_plane(True),
+               lambda pv_grid: gen_plane_points(0.0)),
+    'quad_2d': (lambda: build_plane(False),
+                lambda pv_grid: gen_plane_points(0.0)),
+    'hex_3d': (lambda: build_block(False),
+               gen_block_points),
+    'tet_3d': (lambda: build_block(True),
+               gen_block_points),
+    'tri_surf': (lambda: build_plane(True,0.3),
+                 lambda pv_grid: gen_plane_points(0.3)),
+    'quad_surf': (lambda: build_plane(False,0.3),
+                  lambda pv_grid: gen_plane_points(0.3)),
+}
+
+
+def create_sampler(method: str,
+                   pv_grid: pv.UnstructuredGrid,
+                   sample_points: np.ndarray) -> PointSampler:
+    if method == 'rect':
+        rect_grid = find_rect_grid(pv_grid)
+        if rect_grid is None:
+            pytest.skip('Mesh is not a structured grid.')
+        return PointSampler(pv_grid,sample_points,rect_grid=rect_grid)
+
+    if method == 'index':
+        return PointSampler(pv_grid,sample_points,
+                            cell_index=CellIndex(pv_grid))
+
+    return PointSampler(pv_grid,sample_points)
+
+
+@pytest.mark.parametrize('method',('vtk','index','rect'))
+@pytest.mark.parametrize('mesh_case',tuple(MESH_CASES.keys()))
+def test_point_sampler_matches_probe(mesh_case,method):
+    (build_mesh,gen_points) = MESH_CASES[mesh_case]
+    pv_grid = build_mesh()
+    sample_points = gen_points(pv_grid)
+
+    # NOTE: linear so the value does not depend on which cell is taken for
+    # points on or within the vtk tolerance of a shared edge
+    nodes = np.asarray(pv_grid.points)
+    field = 1.0 + nodes[:,0] - 2.0*nodes[:,1] + 0.5*nodes[:,2]
+    pv_grid['field'] = np.stack((field,2.0*field - 1.0),axis=1)
+    time_steps = np.array((0.0,1.0))
+
+    probe_vals = sample_pyvista(('field',),pv_grid,time_steps,sample_points)
+    probe_found = np.asarray(pv.PolyData(sample_points).sample(pv_grid)
+                             ['vtkValidPointMask']).astype(bool)
+
+    sampler = create_sampler(method,pv_grid,sample_points)
+    sampler_vals = sampler.sample(np.asarray(pv_grid['field']))
+
+    assert np.any(~probe_found)
+    assert np.array_equal(sampler.get_cell_ids() >= 0,probe_found)
+    assert np.allclose(sampler_vals,probe_vals[:,0,:],rtol=0.0,atol=1e-9)
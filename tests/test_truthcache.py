@@ -0,0 +1,136 @@
+'''
+================================================================================
+pyvale: the python validation engine
+License: MIT
+Copyright (C) 2024 The Computer Aided Validation Team
+================================================================================
+'''
+import numpy as np
+import pytest
+import mooseherder as mh
+
+from pyvale.physics.fieldmesh import FieldMesh
+from pyvale.physics.scalarfield import ScalarField
+from pyvale.sensors.pointsensorarray import PointSensorArray
+from pyvale.sensors.truthcache import TruthCache, calc_truth_key
+
+
+SIM_KEY = 'plate_sim'
+
+
+def build_plate_sim_data(n_x: int = 6, n_y: int = 4) -> mh.SimData:
+    # Structured mesh of linear quads on [0,1]x[0,1] with a field varying in
+    # space and time
+    (x_grid,y_grid) = np.meshgrid(np.linspace(0.0,1.0,n_x),
+                                  np.linspace(0.0,1.0,n_y))
+    coords = np.zeros((n_x*n_y,3))
+    coords[:,0] = x_grid.ravel()
+    coords[:,1] = y_grid.ravel()
+
+    node_nums = np.arange(1,n_x*n_y+1).reshape(n_y,n_x)
+    connect = np.vstack((node_nums[:-1,:-1].ravel(),
+                         node_nums[:-1,1:].ravel(),
+                         node_nums[1:,1:].ravel(),
+                         node_nums[1:,:-1].ravel()))
+
+    time_steps = np.linspace(0.0,10.0,5)
+    temperature = (100.0 + 500.0*coords[:,0:1] + 200.0*coords[:,1:2]
+                   + 3.0*time_steps[np.newaxis,:])
+
+    sim_data = mh.SimData()
+    sim_data.num_spat_dims = 2
+    sim_data.time = time_steps
+    sim_data.coords = coords
+    sim_data.connect = {'connect1': connect}
+    sim_data.node_vars = {'temperature': temperature}
+    return sim_data
+
+
+def build_field(sim_data: mh.SimData,
+                time_interp: str = 'linear',
+                **mesh_kwargs) -> ScalarField:
+    mesh = FieldMesh(sim_data,2,**mesh_kwargs)
+    return ScalarField(sim_data,'temperature',2,time_interp,mesh=mesh)
+
+
+# NOTE: sensors inside the mesh and just outside its x=0 edge
+SENSOR_POS = np.array(((0.5,0.5,0.0),
+                       (0.25,0.75,0.0),
+                       (-0.1,0.5,0.0)))
+
+
+@pytest.fixture
+def sim_data() -> mh.SimData:
+    return build_plate_sim_data()
+
+
+@pytest.mark.parametrize('mesh_kwargs',
+                         ({'outside_tol': 0.5},
+                          {'corner_nodes_only': True},
+                          {'structured': False},
+                          {'elem_types': {'connect1': 'QUAD4'}}))
+def test_truth_key_changes_with_mesh_options(sim_data,mesh_kwargs):
+    ref_key = calc_truth_key(SIM_KEY,build_field(sim_data),SENSOR_POS,None)
+    key = calc_truth_key(SIM_KEY,
+                         build_field(sim_data,**mesh_kwargs),
+                         SENSOR_POS,
+                         None)
+    assert key != ref_key
+
+
+def test_truth_key_changes_with_sampling_options(sim_data):
+    field = build_field(sim_data)
+    sample_times = np.array((1.0,2.5,7.0))
+    ref_key = calc_truth_key(SIM_KEY,field,SENSOR_POS,sample_times)
+
+    assert ref_key == calc_truth_key(SIM_KEY,
+                                     build_field(sim_data),
+                                     SENSOR_POS.copy(),
+                                     sample_times.copy())
+    assert ref_key != calc_truth_key('other_sim',
+                                     field,
+                                     SENSOR_POS,
+                                     sample_times)
+    assert ref_key != calc_truth_key(SIM_KEY,
+                                     field,
+                                     SENSOR_POS + 0.01,
+                                     sample_times)
+    assert ref_key != calc_truth_key(SIM_KEY,field,SENSOR_POS,None)
+    assert ref_key != calc_truth_key(SIM_KEY,
+                                     field,
+                                     SENSOR_POS,
+                                     sample_times + 0.5)
+    assert ref_key != calc_truth_key(SIM_KEY,
+                                     build_field(sim_data,'nearest'),
+                                     SENSOR_POS,
+                                     sample_times)
+
+
+def test_cached_truth_not_reused_for_outside_tol(sim_data,tmp_path):
+    truth_cache = TruthCache(tmp_path)
+
+    ref_array = PointSensorArray(SENSOR_POS,build_field(sim_data))
+    ref_array.set_truth_cache(truth_cache,SIM_KEY)
+    ref_truth = ref_array.get_truth_values()
+
+    tol_field = build_field(sim_data,outside_tol=0.5)
+    tol_array = PointSensorArray(SENSOR_POS,tol_field)
+    tol_array.set_truth_cache(truth_cache,SIM_KEY)
+    tol_truth = tol_array.get_truth_values()
+
+    assert np.allclose(tol_truth,tol_field.sample_field(SENSOR_POS))
+    assert not np.allclose(tol_truth[-1,:,:],ref_truth[-1,:,:])
+    assert len(list(tmp_path.glob('*.npy'))) == 2
+
+
+def test_cached_truth_reused_for_same_setup(sim_data,tmp_path):
+    truth_cache = TruthCache(tmp_path)
+
+    ref_array = PointSensorArray(SENSOR_POS,build_field(sim_data))
+    ref_array.set_truth_cache(truth_cache,SIM_KEY)
+    ref_truth = ref_array.get_truth_values()
+
+    sensor_array = PointSensorArray(SENSOR_POS,build_field(sim_data))
+    sensor_array.set_truth_cache(truth_cache,SIM_KEY)
+    sensor_array.calc_truth_values = None # type: ignore
+    assert np.array_equal(sensor_array.get_truth_values(),ref_truth)